@@ -9,6 +9,7 @@ import re
 import shutil
 import json
 import io
+import threading
 
 # System and Third-party imports
 
@@ -93,6 +94,13 @@ try:
 except ImportError:
     srt_utils = None
 
+# Resident Whisper server shared by the transcription runs (see transcriber/transcribe_server.py)
+sys.path.append(os.path.join(TOOLS_DIR, "transcriber"))
+try:
+    import transcribe_server
+except ImportError:
+    transcribe_server = None
+
 # --- Robust FFmpeg/ffprobe Detection ---
 def find_tool(tool_name):
     """Finds a tool in PATH or common installation directories."""
@@ -233,6 +241,31 @@ def download_video(url, workdir, cookies=None):
         
     return max(vids, key=os.path.getmtime)
 
+def preload_transcriber(model, log=print):
+    """
+    Finds or starts the resident transcription server and loads `model` on it in
+    the background, so it is ready by the time transcription starts.
+    Returns (client, started_here), or (None, False) without a server.
+    """
+    if transcribe_server is None or not transcribe_server.SERVER_ENABLED:
+        return None, False
+    client = transcribe_server.find_server()
+    started = False
+    if client is None:
+        client = transcribe_server.connect_server()
+        started = client is not None
+    if client is None:
+        return None, False
+    client.export()
+
+    def load():
+        try:
+            client.load(model, log=lambda text: None)
+        except Exception as e:
+            log(f"⚠️ Preloading Whisper model {model} failed: {e}")
+    threading.Thread(target=load, daemon=True).start()
+    return client, started
+
 def transcribe_video(video_path, workdir, model="large-v3-turbo"):
     print(f"🎙️ Transcribing {os.path.basename(video_path)}...", flush=True)
     cmd = list(TRANSCRIBER_CMD) + [video_path, "--model", model, "--output", workdir, "--no-gui"]
@@ -247,7 +280,7 @@ def transcribe_video(video_path, workdir, model="large-v3-turbo"):
                 print(msg, flush=True)
         process.wait()
         res = os.path.join(workdir, os.path.splitext(os.path.basename(video_path))[0] + ".srt")
-        if os.path.exists(res):
+        if process.returncode == 0 and os.path.exists(res):
             en_res = res.replace(".srt", ".en.srt")
             if not os.path.exists(en_res):
                 shutil.copy2(res, en_res)
@@ -436,6 +469,8 @@ def main():
     print(f"📦 Found FFmpeg at: {FFMPEG_EXE}")
 
     if args.input.startswith("http"):
+        # The Whisper model loads while the video downloads
+        preload_transcriber(args.model)
         video_path = download_video(args.input, workdir, args.cookies)
     else:
         # For local files, copy them to workdir to keep project self-contained
@@ -503,8 +538,8 @@ def main():
         if os.path.exists(candidate_cn) and os.path.getsize(candidate_cn) > 500:
             if srt_utils:
                 try:
-                    src_count = len(srt_utils.parse_srt(src_srt))
-                    zh_count = len(srt_utils.parse_srt(candidate_cn))
+                    src_count = srt_utils.count_srt(src_srt)
+                    zh_count = srt_utils.count_srt(candidate_cn)
                     if zh_count >= src_count * 0.95:
                         print(f"✅ Found existing translation: {os.path.basename(candidate_cn)}")
                         zh_srt = candidate_cn
@@ -60,11 +60,17 @@ if CURRENT_DIR not in sys.path:
 
 try:
     import autosub
-    from autosub import get_video_duration, VDOWN_CMD, TRANSCRIBER_CMD, SMART_TRANSLATE_CMD, SUBTRANSLATOR_CMD, SRT2ASS_CMD, BURNSUB_CMD
+    from autosub import get_video_duration, VDOWN_CMD, TRANSCRIBER_CMD, SMART_TRANSLATE_CMD, SUBTRANSLATOR_CMD, SRT2ASS_CMD, BURNSUB_CMD, preload_transcriber
 except Exception as e:
     print(f"Failed to import autosub: {e}")
     sys.exit(1)
 
+try:
+    from llm_broker import LLMBroker
+    from llm_utils import tier_settings
+except ImportError:
+    LLMBroker = None
+
 def sanitize_filename(name):
     clean = re.sub(r'[\\/*?:"<>|]', '_', name)
     clean = clean.strip().strip('.')
@@ -158,7 +164,8 @@ def run_cmd_with_progress(cmd, progress, task_id, step_name, workdir, title):
             text=True, 
             encoding='utf-8', 
             errors='replace', 
-            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0,
+            env={**os.environ, "AUTOSUB_LLM_CLIENT": title}  # fair-share name at the LLM broker
         )
         active_processes[title] = process.pid
         if title in paused_videos: suspend_process_tree(process.pid)
@@ -518,6 +525,25 @@ def run_batch(args):
     translate_workers = max(1, int(args.max_api_calls) // 10)
     
     print(f"🚀 启动分布式动态批处理框架 (Workers={workers}, Translate Workers={translate_workers})")
+
+    # Shared by the smart_translate processes: one global LLM rate budget per provider,
+    # at most --max-api-calls requests in flight, identical in-flight calls made once.
+    # `python common/llm_broker.py status` shows queue depth while the batch runs.
+    broker = None
+    if LLMBroker is not None:
+        try:
+            broker = LLMBroker(default_rpm=tier_settings()[0], max_in_flight=args.max_api_calls).start()
+            broker.export()
+        except OSError as e:
+            print(f"⚠️ LLM broker unavailable: {e}")
+    
+    # One resident Whisper model for every transcription of the batch (transcribe_engine
+    # runs stream from it), loading while the first videos download.
+    # `python transcriber/transcribe_server.py status` shows loaded models and jobs.
+    def whisper_warning(msg):
+        global global_ui_log
+        global_ui_log = f"[yellow]{msg}[/yellow]"
+    whisper_server, whisper_started = preload_transcriber(args.model, log=whisper_warning)
     
     def key_listener(live_instance):
         global global_abort, global_ui_log
@@ -635,6 +661,22 @@ def run_batch(args):
         
         for t in bn_threads: t.join()
 
+    if broker is not None:
+        status = broker.status()
+        if status['coalesced']:
+            print(f"🔗 {status['coalesced']} identical LLM request(s) shared between videos")
+        throttled = {name: q['throttled'] for name, q in status['quotas'].items() if q['throttled']}
+        if throttled:
+            print("⏳ Rate limits hit: " + ", ".join(f"{name} x{n}" for name, n in throttled.items()))
+        broker.close()
+
+    if whisper_server is not None:
+        status = whisper_server.status() if whisper_server.alive() else None
+        if status and status['jobs']:
+            print(f"🎙️ {status['jobs']} transcription(s) served by one resident Whisper process")
+        if whisper_started:
+            whisper_server.shutdown()
+
     if global_abort:
         print("\n⚠️ 批量处理已被强制终止！已产出的字幕或文件将予以保留，发生中断的压制/下载在下次启动时需重新开始。")
     else:
@@ -2,10 +2,10 @@
 import os
 import sys
 import argparse
-import math
 import time
 import re
-from typing import List, Dict
+import threading
+from typing import List, Dict, Set, Tuple
 import io
 
 # Force UTF-8 for stdout/stderr to handle emojis in logs on Windows (essential for pythonw)
@@ -38,11 +38,18 @@ except ImportError as e:
 
 try:
     import srt_utils
+    from subtitle_track import SubtitleTrack
 except ImportError as e:
     print(f"❌ Error: srt_utils is mandatory and was not found: {e}")
     print(f"Current sys.path: {sys.path}")
     sys.exit(1)
 
+try:
+    import translation_memory
+except ImportError as e:
+    print(f"Warning: translation_memory not available ({e}). Every line goes to the LLM.")
+    translation_memory = None
+
 # --- SKILL INTEGRATION ---
 
 def load_skill_rules(tool_name):
@@ -72,6 +79,12 @@ except ImportError:
     pass
 
 import llm_utils
+from llm_stream import IDLineParser, parse_id_lines
+from chunk_planner import get_planner, block_tokens
+from rate_limits import estimate_tokens
+from translation_journal import open_journal
+from model_routing import resolve_fast_model, RoutingReport
+from humanize_rules import get_engine
 client = llm_utils.get_client()
 
 def get_context_window(blocks: List[Dict], index: int, window_size: int = 2) -> Dict:
@@ -134,15 +147,8 @@ OUTPUT FORMAT:
         if not translated_text:
             return chunk_blocks
             
-        # Parse the Output
-        translated_map = {}
-        for line in translated_text.split('\n'):
-            match = re.match(r'\[(\d+)\]\s*(.*)', line.strip())
-            if match:
-                idx = match.group(1)
-                content = match.group(2).strip()
-                if content:  # guard: reject empty translations
-                    translated_map[idx] = content
+        # Parse the Output (empty translations are rejected)
+        translated_map = parse_id_lines(translated_text)
         
         # Apply translations back to blocks
         translated_blocks = []
@@ -166,47 +172,24 @@ OUTPUT FORMAT:
 
 STYLE_GUIDE_PATH = os.path.join(TOOLS_DIR, "common", "HARD_CONSTRAINTS.md")
 
-def load_regex_rules(filepath):
-    rules = []
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("|") and not line.startswith("| Rule") and not line.startswith("| description") and not line.startswith("|---"):
-                    parts = [p.strip() for p in re.split(r'(?<!\\)\|', line) if p.strip()]
-                    if len(parts) >= 2:
-                        pattern = parts[1].strip('`').replace(r'\|', '|') # Remove markdown code ticks and unescape pipes
-                        replacement = parts[2].strip('`').replace(r'\|', '|') if len(parts) > 2 else ""
-                        rules.append((pattern, replacement))
-    return rules
-
-REGEX_RULES = load_regex_rules(STYLE_GUIDE_PATH)
+# Applied after the STYLE_GUIDE rules: common AI connectors (hardcoded fallbacks), then punctuation
+HUMANIZE_LITERALS = (
+    ("此外，", "另外，"),
+    ("总而言之，", "简单说，"),
+    ("不可或缺", "很重要"),
+    ("意味着", "说明"),
+    (",", "，"), ("?", "？"), ("!", "！"),
+)
+_WHITESPACE_RUN = re.compile(r'\s+')
 
 def humanize_text(text: str) -> str:
     """
     Applies configured Regex rules and basic Humanizer cleanup.
     """
-    # 0. Apply Regex Rules from STYLE_GUIDE.md
-    for pattern, replacement in REGEX_RULES:
-        try:
-            text = re.sub(pattern, replacement, text)
-        except Exception as e:
-            # print(f"Regex error: {e} pattern={pattern}")
-            pass
-
-    # 1. Remove common AI connectors (Hardcoded fallbacks)
-    text = text.replace("此外，", "另外，")
-    text = text.replace("总而言之，", "简单说，")
-    text = text.replace("不可或缺", "很重要")
-    text = text.replace("意味着", "说明")
-    
-    # 2. Fix punctuation
-    text = text.replace(",", "，").replace("?", "？").replace("!", "！")
-    
-    # 3. Trim extra spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+    # Rules from STYLE_GUIDE.md plus the fallbacks, compiled once (see humanize_rules)
+    text = get_engine(STYLE_GUIDE_PATH, HUMANIZE_LITERALS).apply(text)
+    # Trim extra spaces
+    return _WHITESPACE_RUN.sub(' ', text).strip()
 
 
 def is_untranslated(block: Dict) -> bool:
@@ -232,26 +215,33 @@ def is_untranslated(block: Dict) -> bool:
     return ascii_ratio > 0.7 and len(alpha) >= 8
 
 
-def translate_blocks(blocks: List[Dict], client, model: str, style: str,
-                     verbalizer_snippet: str, humanizer_snippet: str,
-                     knowledge_snippet: str, trans_mode_snippet: str = "") -> List[Dict]:
+def memory_lookup(blocks, style=None, trans_mode=None, exclude_dir=None) -> Dict[int, List[str]]:
     """
-    Translates a list of blocks (may be any size) using generate_batch.
-    Returns the blocks with translations applied. Does NOT apply humanize_text.
-    Original text is kept as fallback for any block whose translation is missing/empty.
+    Looks every block up in the translation memory built from finished projects,
+    reusing only lines made with the same style and mode outside `exclude_dir`.
+    Returns {position: [translation]} for the blocks it already knows.
     """
-    BATCH = 20
-    total = len(blocks)
-    tasks = []
+    if translation_memory is None or not len(blocks):
+        return {}
+    tm = translation_memory.get_memory()
+    if tm is None:
+        return {}
+    try:
+        texts = [" ".join(b['lines']).replace("\n", " ").strip() for b in blocks]
+        hits = tm.lookup_many(texts, style=style, trans_mode=trans_mode, exclude_dir=exclude_dir)
+    except Exception as e:
+        print(f"⚠️ Translation memory lookup failed: {e}")
+        return {}
+    return {pos: [text] for pos, text in hits.items()}
 
-    for i in range(0, total, BATCH):
-        chunk = blocks[i:i + BATCH]
-        input_text = ""
-        for block in chunk:
-            text = " ".join(block['lines']).replace("\n", " ").strip()
-            input_text += f"[{block['index']}] {text}\n"
 
-        prompt = f"""You are an expert subtitle translator and editor.
+def build_prompt_prefix(style: str, verbalizer_snippet: str, humanizer_snippet: str,
+                        knowledge_snippet: str, trans_mode_snippet: str = "") -> str:
+    """
+    Instructions shared by every chunk of a file. Sent as the system prefix so
+    providers can cache it (see context_cache.py); only the suffix varies.
+    """
+    return f"""You are an expert subtitle translator and editor.
 Translate the following English subtitles into Simplified Chinese.
 
 ### STEP 1: VERBALIZATION (Tone & Persona)
@@ -263,9 +253,12 @@ TARGET STYLE: {style}
 
 ### STEP 3: HUMANIZATION (De-AI)
 {humanizer_snippet}...
-{trans_mode_snippet}
+{trans_mode_snippet}"""
 
-### STEP 4: CONTEXT AWARENESS
+
+def build_prompt_suffix(input_text: str) -> str:
+    """The per-chunk part of a translation prompt: the blocks and the output format."""
+    return f"""### STEP 4: CONTEXT AWARENESS
 INPUT BLOCK:
 {input_text}
 
@@ -273,82 +266,224 @@ OUTPUT FORMAT (STRICT — one line per segment, no extra text):
 [ID] Translated Text
 ...
 """
-        tasks.append({'index': i // BATCH, 'chunk': chunk, 'prompt': prompt})
-
-    results = client.generate_batch(tasks, model)
-    results.sort(key=lambda x: x['index'])
-
-    # Build a map of all translations
-    translated_map = {}
-    for res in results:
-        result_text = res.get('result')
-        if result_text:
-            for line in result_text.split('\n'):
-                match = re.match(r'\[(\d+)\]\s*(.*)', line.strip())
-                if match:
-                    idx = match.group(1)
-                    content = match.group(2).strip()
-                    if content:  # guard: reject empty translations
-                        translated_map[idx] = content
-
-    # Apply translations; fall back to original text if missing
-    out = []
-    for block in blocks:
-        new_block = block.copy()
-        idx = str(block['index'])
-        if idx in translated_map:
-            new_block['lines'] = [translated_map[idx]]
-        # else: keep whatever was there (original EN or previous attempt)
-        out.append(new_block)
-    return out
-
-
-def postprocess_retry_loop(final_blocks: List[Dict], client, model: str, style: str,
+
+
+def input_line(block) -> str:
+    """One `[ID] text` line of a translation prompt."""
+    text = " ".join(block['lines']).replace("\n", " ").strip()
+    return f"[{block['index']}] {text}\n"
+
+
+def journal_results(journal, source: str = "chunk", accept=None):
+    """
+    on_result callback for generate_batch: records each finished chunk's
+    translations, or only those `accept(res)` approves (routing holds back
+    chunks that will be escalated).
+    """
+    if journal is None:
+        return None
+
+    def on_result(res):
+        if res.get('result') and (accept is None or accept(res)):
+            journal.record(parse_id_lines(res['result']), source)
+    return on_result
+
+
+# A fast-model chunk is escalated to the requested model when more than this
+# share of its IDs is missing, or of its returned lines is still untranslated
+ESCALATE_MISSING = 0.10
+ESCALATE_UNTRANSLATED = 0.10
+# Chinese characters per English character of the returned lines; outside
+# this range the chunk was likely truncated/summarized or padded with notes
+LENGTH_RATIO_RANGE = (0.12, 1.5)
+# Share of ASCII letters in the returned text (proper nouns stay in English)
+ESCALATE_ASCII = 0.5
+
+
+def escalation_reason(chunk, result_text) -> str:
+    """
+    Why a chunk translated by the fast model should go to the stronger one
+    ("" if it is acceptable). Cheap local checks: ID coverage, lines left
+    untranslated, length ratio against the source and leftover ASCII.
+    """
+    if not result_text:
+        return "call failed"
+    translated_map = parse_id_lines(result_text)
+    returned = [(block, translated_map[block['index']]) for block in chunk if block['index'] in translated_map]
+    missing = 1 - len(returned) / len(chunk)
+    if missing > ESCALATE_MISSING:
+        return f"{missing:.0%} of IDs missing"
+    untranslated = sum(1 for _, text in returned if is_untranslated({'lines': [text]}))
+    if untranslated > ESCALATE_UNTRANSLATED * len(returned):
+        return f"{untranslated} line(s) untranslated"
+    source_chars = sum(len(" ".join(block['lines'])) for block, _ in returned)
+    ratio = sum(len(text) for _, text in returned) / max(1, source_chars)
+    if not LENGTH_RATIO_RANGE[0] <= ratio <= LENGTH_RATIO_RANGE[1]:
+        return f"length ratio {ratio:.2f}"
+    letters = [c for _, text in returned for c in text if c.isalpha()]
+    ascii_share = sum(1 for c in letters if ord(c) < 128) / len(letters) if letters else 0.0
+    if ascii_share > ESCALATE_ASCII:
+        return f"{ascii_share:.0%} ASCII letters"
+    return ""
+
+
+# Repair requests: lines of speech shown before an isolated missing block
+REPAIR_CONTEXT = 1
+
+
+def repair_windows(positions: List[int], context: int = REPAIR_CONTEXT) -> List[Tuple[int, int]]:
+    """
+    The stretches of track one repair request shows, as (first, last)
+    positions, for its sorted missing `positions`. Runs of consecutive gaps
+    are shown as they are (each line is the others' context); only isolated
+    gaps get the `context` lines before them. Stretches that touch or
+    overlap are merged, so neighbouring gaps share their context lines.
+    """
+    spans = []
+    k = 0
+    while k < len(positions):
+        run_end = k
+        while run_end + 1 < len(positions) and positions[run_end + 1] == positions[run_end] + 1:
+            run_end += 1
+        first, last = positions[k], positions[run_end]
+        if first == last:
+            first -= context
+        if spans and first <= spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], last))
+        else:
+            spans.append((first, last))
+        k = run_end + 1
+    return spans
+
+
+def repair_window_text(blocks: SubtitleTrack, span: Tuple[int, int], targets: Set[int]) -> str:
+    """One window of a repair prompt: missing blocks as [ID] lines, the others as "~" context lines."""
+    lines = []
+    for pos in range(max(0, span[0]), min(len(blocks), span[1] + 1)):
+        if pos in targets:
+            lines.append(input_line(blocks[pos]).rstrip("\n"))
+        else:
+            lines.append("~ " + " ".join(blocks[pos]['lines']).replace("\n", " ").strip())
+    return "\n".join(lines)
+
+
+def build_repair_suffix(windows_text: List[str]) -> str:
+    """The per-request part of a repair prompt (the shared instructions stay the system prefix)."""
+    return """### STEP 4: REPAIR MISSING LINES
+Lines starting with "~" are neighbouring speech; do not output them.
+
+""" + "\n\n".join(windows_text) + """
+
+OUTPUT FORMAT (STRICT — one line per [ID] line only, no extra text):
+[ID] Translated Text
+"""
+
+
+def postprocess_retry_loop(final_blocks: SubtitleTrack, client, model: str, style: str,
                             verbalizer_snippet: str, humanizer_snippet: str,
-                            knowledge_snippet: str, trans_mode_snippet: str = "", max_iterations: int = 5) -> List[Dict]:
+                            knowledge_snippet: str, trans_mode_snippet: str = "", max_iterations: int = 5,
+                            journal=None, missing: List[int] = None) -> SubtitleTrack:
     """
-    Iteratively re-translates any untranslated/empty blocks until all are done
-    (or max_iterations is reached). Returns final_blocks with all translations filled.
+    Repairs untranslated/empty blocks by ID until all are done (or
+    max_iterations is reached). Only the missing blocks are sent, packed by
+    the model's chunk planner up to the budget of a first-pass chunk (context
+    lines are not counted: the budget bounds the translation a reply
+    carries); isolated gaps are shown after the line before them
+    (repair_windows).
+    `missing` (positions found by is_untranslated) is tracked incrementally:
+    after each pass only the blocks just repaired are checked again.
+    Returns a new track with all translations filled.
     Does NOT apply humanize_text — that is done in a single pass after this function.
     """
+    if missing is None:
+        missing = [i for i, b in enumerate(final_blocks) if is_untranslated(b)]
+    system = build_prompt_prefix(style, verbalizer_snippet, humanizer_snippet, knowledge_snippet,
+                                 trans_mode_snippet)
+    planner = get_planner(model)
+    overhead = estimate_tokens(system + build_repair_suffix([]))
+
     for iteration in range(1, max_iterations + 1):
-        missed_positions = [i for i, b in enumerate(final_blocks) if is_untranslated(b)]
-        if not missed_positions:
+        if not missing:
             print(f"✅ Post-processing complete after {iteration - 1} extra pass(es). All segments translated.")
             break
 
-        print(f"🔄 Post-processing pass {iteration}/{max_iterations}: "
-              f"{len(missed_positions)} untranslated segment(s) detected. Re-translating...")
-
-        missed_blocks = [final_blocks[i] for i in missed_positions]
-        retranslated = translate_blocks(
-            missed_blocks, client, model, style,
-            verbalizer_snippet, humanizer_snippet, knowledge_snippet, trans_mode_snippet
-        )
+        spans = planner.plan([block_tokens(input_line(final_blocks[pos])) for pos in missing], overhead,
+                             learn=False)
+        tasks, windows = [], 0
+        for i, span in enumerate(spans):
+            positions = [missing[k] for k in span]
+            shown = repair_windows(positions)
+            windows += len(shown)
+            tasks.append({'index': i, 'positions': positions, 'system': system,
+                          'prompt': build_repair_suffix([repair_window_text(final_blocks, w, set(positions))
+                                                         for w in shown])})
 
-        # Re-insert results at original positions
-        for pos, new_block in zip(missed_positions, retranslated):
-            final_blocks[pos] = new_block
+        print(f"🔄 Post-processing pass {iteration}/{max_iterations}: "
+              f"{len(missing)} untranslated segment(s) detected. "
+              f"Repairing in {windows} window(s), {len(tasks)} request(s)...")
 
-        # Report remaining
-        still_missed = [i for i, b in enumerate(final_blocks) if is_untranslated(b)]
-        resolved = len(missed_positions) - len(still_missed)
-        print(f"   ✔ Resolved: {resolved} | Still untranslated: {len(still_missed)}")
+        results = client.generate_batch(tasks, model, on_result=journal_results(journal, "repair"))
+        replacements = {}
+        for res in results:
+            translated_map = parse_id_lines(res.get('result') or "")
+            for pos in res['positions']:
+                idx = final_blocks[pos].index
+                if idx in translated_map:
+                    replacements[pos] = [translated_map[idx]]
+        final_blocks = final_blocks.with_lines(replacements)
+
+        # Only the blocks just repaired can have changed
+        still_missed = [pos for pos in missing if is_untranslated(final_blocks[pos])]
+        print(f"   ✔ Resolved: {len(missing) - len(still_missed)} | Still untranslated: {len(still_missed)}")
+        missing = still_missed
     else:
-        still_missed = [i for i, b in enumerate(final_blocks) if is_untranslated(b)]
-        if still_missed:
+        if missing:
             print(f"⚠️ Max iterations ({max_iterations}) reached. "
-                  f"{len(still_missed)} segment(s) still untranslated.")
+                  f"{len(missing)} segment(s) still untranslated.")
 
     return final_blocks
 
+def stream_progress(tasks: List[Dict]):
+    """
+    on_delta callback for generate_batch: parses each chunk's reply while it
+    streams, reports blocks as their lines complete and flags IDs the model
+    skipped (they are retried in post-processing) before the chunk finishes.
+    """
+    parsers = {task['index']: IDLineParser(block.index for block in task['chunk']) for task in tasks}
+    total = sum(len(parser.expected) for parser in parsers.values())
+    step = max(1, total // 10)
+    lock = threading.Lock()
+    state = {'blocks': 0, 'reported': 0}
+    flagged = set()
+    start = time.time()
+
+    def on_delta(task, text):
+        parser = parsers[task['index']]
+        new_blocks = parser.feed(text)
+        if not new_blocks:
+            return
+        with lock:
+            state['blocks'] += len(new_blocks)
+            if state['blocks'] - state['reported'] >= step:
+                state['reported'] = state['blocks']
+                print(f"   Streamed: {state['blocks']}/{total} block(s) in {time.time() - start:.1f}s", flush=True)
+            skipped = [i for i in parser.skipped() if (task['index'], i) not in flagged]
+            if skipped:
+                flagged.update((task['index'], i) for i in skipped)
+                print(f"⚠️ Chunk {task['index']}: no translation for [{', '.join(skipped)}] so far.")
+    return on_delta
+
 def main():
     parser = argparse.ArgumentParser(description="Smart Translation with Context & Style")
     parser.add_argument("input", help="Input English SRT file")
     parser.add_argument("--style", default="casual", choices=["casual", "formal", "edgy"])
     parser.add_argument("--model", default="gemini-3-flash", help="Gemini Model (e.g. gemini-3-flash)")
-    parser.add_argument("--chunk-size", type=int, default=50, help="Number of blocks per batch")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Fixed number of blocks per batch (default: sized by token budget, see chunk_planner.py)")
     parser.add_argument("--trans-mode", default="balanced", choices=["paraphrase", "balanced"], help="Translation Mode")
+    parser.add_argument("--fast-model", default=None,
+                        help="Cheap model for the first pass; failing chunks escalate to --model "
+                             "(default: the model's flash tier if known, see model_routing.py; 'none' disables)")
     
     args = parser.parse_args()
     
@@ -358,18 +493,29 @@ def main():
         return
 
     print(f"🚀 Starting Smart Translation for: {os.path.basename(input_path)}")
-    print(f"   Style: {args.style} | Chunk Size: {args.chunk_size}")
+    print(f"   Style: {args.style} | Chunk Size: {args.chunk_size or 'auto'}")
 
     # 1. Parse Input
-    blocks = srt_utils.parse_srt(input_path)
+    blocks = srt_utils.load_track(input_path)
     if not blocks:
         print("Error parsing SRT file.")
         return
 
-    total_chunks = math.ceil(len(blocks) / args.chunk_size)
-    print(f"   Total Blocks: {len(blocks)} -> {total_chunks} Chunks")
-
-    final_blocks = []
+    # track position -> translated lines; never this project's own earlier output
+    translated_lines = memory_lookup(blocks, args.style, args.trans_mode, os.path.dirname(input_path))
+    if translated_lines:
+        print(f"📚 Translation memory: {len(translated_lines)}/{len(blocks)} segment(s) reused.")
+
+    # Chunks finished by an interrupted run on this input are not sent again
+    journal = open_journal(input_path, model=args.model, style=args.style, trans_mode=args.trans_mode)
+    if journal is not None and journal.resumed:
+        resumed = 0
+        for pos, block in enumerate(blocks):
+            if block.index in journal.resumed:
+                translated_lines[pos] = [journal.resumed[block.index]]
+                resumed += 1
+        print(f"📓 Resuming: {resumed}/{len(blocks)} segment(s) restored from {os.path.basename(journal.path)}")
+    pending = [i for i in range(len(blocks)) if i not in translated_lines]
     
     # 2. Process Chunks Concurrenty
     # Prepare all tasks
@@ -403,45 +549,41 @@ def main():
 - Focus on sense-for-sense paraphrasing. Explain metaphors and add cultural/contextual background if it helps the domestic audience understand the subtext.
 """
     
+    # Static instructions, identical for every chunk (and the retry loop): cacheable by the provider
+    system = build_prompt_prefix(args.style, verbalizer_snippet, humanizer_snippet, knowledge_snippet,
+                                 trans_mode_snippet)
+
+    # Two-tier routing: a fast model takes the first pass, failing chunks escalate to --model
+    fast_model = resolve_fast_model(client, args.model, args.fast_model)
+    first_model = fast_model or args.model
+
+    # Chunk plan: a fixed --chunk-size, or blocks packed up to the model's token budget
+    input_lines = [input_line(blocks[p]) for p in pending]
+    planner = get_planner(first_model)
+    if args.chunk_size:
+        spans = [range(k, min(k + args.chunk_size, len(pending))) for k in range(0, len(pending), args.chunk_size)]
+    else:
+        overhead = estimate_tokens(system + build_prompt_suffix(""))
+        spans = planner.plan([block_tokens(line) for line in input_lines], overhead)
+        print(f"🧮 Chunk planner ({first_model}): {planner.describe(overhead)}")
+    total_chunks = len(spans)
+    print(f"   Total Blocks: {len(blocks)} -> {total_chunks} Chunks")
     print(f"📦 Preparing {total_chunks} chunks for parallel processing...")
     
-    for i in range(total_chunks):
-        start = i * args.chunk_size
-        end = min((i + 1) * args.chunk_size, len(blocks))
-        chunk = blocks[start:end]
+    for i, span in enumerate(spans):
+        positions = [pending[k] for k in span]
+        if positions[-1] - positions[0] + 1 == len(positions):
+            chunk = blocks[positions[0]:positions[-1] + 1] # Track view, no copy
+        else:
+            chunk = [blocks[p] for p in positions] # gaps left by memory hits
         
-        # Construct Prompt string here in main loop to be thread-safe/independent
-        input_text = ""
-        for block in chunk:
-            text = " ".join(block['lines']).replace("\n", " ").strip()
-            input_text += f"[{block['index']}] {text}\n"
-            
-        prompt = f"""
-You are an expert subtitle translator and editor.
-Translate the following English subtitles into Simplified Chinese.
-
-### STEP 1: VERBALIZATION (Tone & Persona)
-{verbalizer_snippet}...
-TARGET STYLE: {args.style}
-
-### STEP 2: DOMAIN KNOWLEDGE & ASR CORRECTION
-{knowledge_snippet}
-
-### STEP 3: HUMANIZATION (De-AI)
-{humanizer_snippet}...
-{trans_mode_snippet}
-
-### STEP 4: CONTEXT AWARENESS
-INPUT BLOCK:
-{input_text}
-
-OUTPUT FORMAT:
-[ID] Translated Text
-...
-"""
+        # Only the per-chunk suffix varies; the instructions go out as the shared system prefix
+        prompt = build_prompt_suffix("".join(input_lines[k] for k in span))
         tasks.append({
             'index': i,
+            'positions': positions,
             'chunk': chunk,
+            'system': system,
             'prompt': prompt
         })
 
@@ -449,63 +591,85 @@ OUTPUT FORMAT:
     try:
         # Use user-specified model, or default to gemini-1.5-flash.
         target_model = args.model
-        print(f"🚀 Using LLM: {target_model}...")
-        
-        results = client.generate_batch(tasks, target_model)
-        
+        if fast_model:
+            print(f"🚀 Using LLM: {fast_model} (first pass), escalating failing chunks to {target_model}...")
+        else:
+            print(f"🚀 Using LLM: {target_model}...")
+
+        accept = (lambda res: not escalation_reason(res['chunk'], res.get('result'))) if fast_model else None
+        started = time.time()
+        results = client.generate_batch(tasks, first_model, on_delta=stream_progress(tasks),
+                                        on_result=journal_results(journal, accept=accept)) if tasks else []
+
         # Sort results by index to ensure correct subtitle order
         results.sort(key=lambda x: x['index'])
+
+        # The planner learns how reliably the first-pass model returns every ID
+        for res in results:
+            if res.get('result'):
+                translated_map = parse_id_lines(res['result'])
+                planner.record(len(res['chunk']), sum(1 for block in res['chunk'] if block.index not in translated_map))
+
+        if fast_model and results:
+            routing = RoutingReport(fast_model, target_model)
+            routing.first_pass = list(results)
+            routing.fast_seconds = time.time() - started
+            escalate = []
+            for res in results:
+                reason = escalation_reason(res['chunk'], res.get('result'))
+                if reason:
+                    print(f"⬆️ Chunk {res['index']}: {reason}. Escalating to {target_model}.")
+                    # The fast reply still counts for its own blocks if the escalation fails
+                    escalate.append({key: value for key, value in res.items() if key not in ('result', 'error')})
+            if escalate:
+                started = time.time()
+                escalated = client.generate_batch(escalate, target_model,
+                                                  on_result=journal_results(journal, "escalated"))
+                routing.escalation_seconds = time.time() - started
+                routing.escalated = escalated
+                replies = {res['index']: res for res in escalated if res.get('result')}
+                results = [replies.get(res['index'], res) for res in results]
+            print(routing.summary(client))
         
         for res in results:
             result_text = res.get('result')
             chunk = res['chunk']
             
-            translated_chunk_blocks = []
-            
             if result_text:
-                # Parse output logic
-                translated_map = {}
-                for line in result_text.split('\n'):
-                    match = re.match(r'\[(\d+)\]\s*(.*)', line.strip())
-                    if match:
-                        idx = match.group(1)
-                        content = match.group(2).strip()
-                        if content:  # guard: reject empty translations
-                            translated_map[idx] = content
+                # The complete reply is authoritative; streamed lines were progress only
+                translated_map = parse_id_lines(result_text)
 
                 # Apply translations; keep original as fallback for missing/empty
-                for block in chunk:
-                    new_block = block.copy()
-                    idx = str(block['index'])
+                # (detected later by is_untranslated)
+                for k, block in enumerate(chunk):
+                    idx = block.index
                     if idx in translated_map:
-                        new_block['lines'] = [translated_map[idx]]
-                    # else: keep original English as fallback (detected by is_untranslated)
-                    translated_chunk_blocks.append(new_block)
+                        translated_lines[res['positions'][k]] = [translated_map[idx]]
             else:
                 print(f"❌ Chunk {res['index']} failed completely. Will retry in post-processing.")
-                translated_chunk_blocks = chunk  # keep original for retry
-
-            final_blocks.extend(translated_chunk_blocks)
             
     except Exception as e:
         print(f"❌ Parallel execution failed: {e}")
         return
 
+    final_blocks = blocks.with_lines(translated_lines)
+
     # 3. Post-Processing: retry all untranslated segments
-    untranslated_count = sum(1 for b in final_blocks if is_untranslated(b))
-    if untranslated_count > 0:
-        print(f"\n🔍 Post-processing: {untranslated_count} untranslated segment(s) found. Starting retry loop...")
+    missing = [i for i, b in enumerate(final_blocks) if is_untranslated(b)]
+    if missing:
+        print(f"\n🔍 Post-processing: {len(missing)} untranslated segment(s) found. Starting retry loop...")
         final_blocks = postprocess_retry_loop(
             final_blocks, client, target_model, args.style,
-            verbalizer_snippet, humanizer_snippet, knowledge_snippet, trans_mode_snippet
+            verbalizer_snippet, humanizer_snippet, knowledge_snippet, trans_mode_snippet,
+            journal=journal, missing=missing
         )
     else:
         print("\n✅ All segments translated on first pass. Skipping post-processing.", flush=True)
+    planner.save()
 
     # 4. Final Style-Guide Humanization (single pass over all blocks)
     print("\n✨ Applying style guide and humanization to all blocks...")
-    for block in final_blocks:
-        block['lines'] = [humanize_text(l) for l in block['lines']]
+    final_blocks = final_blocks.with_lines(lambda c: [humanize_text(l) for l in c.lines])
 
     # 5. Save Output
     if input_path.lower().endswith(".en.srt"):
@@ -529,6 +693,16 @@ OUTPUT FORMAT:
 
     srt_utils.write_srt(final_blocks, output_path)
     print(f"✅ Translation Saved to: {output_path}", flush=True)
+    if journal is not None:
+        journal.discard()
+
+    # Make this project's lines available to the next run
+    tm = translation_memory.get_memory() if translation_memory else None
+    if tm is not None:
+        try:
+            tm.add_file(output_path, input_path, style=args.style, trans_mode=args.trans_mode)
+        except Exception as e:
+            print(f"⚠️ Could not add translation to memory: {e}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+import time
+import random
+import tempfile
+import subprocess
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# smart_translate end to end against the mock provider: the fixed
+# `--chunk-size 50` vs the token-budget planner. Short and long lines with a
+# reliable model over three consecutive runs (calls per file; the planner
+# must never need more than fixed 50), then a model that loses IDs past the
+# 30th line of a chunk over five consecutive runs (the planner learns between
+# runs): LLM calls, post-processing passes and blocks left untranslated.
+# Usage: python bench_chunk_planner.py [blocks]
+
+SMART_TRANSLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "autosub", "smart_translate.py")
+WORDS = "so the agent reads the file then it plans the change and we review what it wrote".split()
+
+def write_srt(path, n, words):
+    rng = random.Random(n * words)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(words))
+            f.write(f"{i}\n00:{i // 60:02d}:{i % 60:02d},000 --> 00:{i // 60:02d}:{i % 60:02d},900\n{text}\n\n")
+
+def translate(server, srt, env, chunk_size=None):
+    server.reset_counters()
+    # Each mode learns on its own
+    env = {**env, "LLM_CHUNK_STATE": env["LLM_CHUNK_STATE"] + (f".fixed{chunk_size}" if chunk_size else "")}
+    start = time.perf_counter()
+    cmd = [sys.executable, SMART_TRANSLATE, srt, "--model", "gpt-mock"]
+    if chunk_size:
+        cmd += ["--chunk-size", str(chunk_size)]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, encoding="utf-8").stdout
+    chunks = int(re.search(r"-> (\d+) Chunks", out).group(1))
+    passes = len(re.findall(r"Post-processing pass \d+", out))
+    left = re.search(r"(\d+) segment\(s\) still untranslated", out)
+    return chunks, server.requests, passes, int(left.group(1)) if left else 0, time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    server = MockLLMServer(latency=0.5, line_delay=0.01).start()
+    folder = tempfile.mkdtemp()
+    env = {**os.environ, "OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "test", "LLM_RPM": "0",
+           "AUTOSUB_TM": "0", "LLM_CACHE": "0"}
+
+    print(f"{n} blocks, reliable model")
+    worst = 0
+    for words in (4, 12, 30):
+        srt = os.path.join(folder, f"w{words}.en.srt")
+        write_srt(srt, n, words)
+        env["LLM_CHUNK_STATE"] = os.path.join(folder, f"reliable{words}.json")
+        fixed = translate(server, srt, env, 50)
+        runs = [translate(server, srt, env) for _ in range(3)]
+        worst = max(worst, max(run[1] - fixed[1] for run in runs))
+        print(f"   {words:>2} words/line   fixed 50: {fixed[1]:>3} calls {fixed[4]:5.1f}s   planner runs 1-3: "
+              + ", ".join(f"{run[1]:>3} calls {run[4]:4.1f}s" for run in runs))
+    print(f"   planner vs fixed 50, worst run: {worst:+d} calls")
+
+    server.drop_after, server.drop_rate = 30, 0.15
+    srt = os.path.join(folder, "w12.en.srt")
+    print(f"{n} blocks, 12 words/line, model drops 15% of the IDs past line 30 of a chunk")
+    env["LLM_CHUNK_STATE"] = os.path.join(folder, "lossy.json")
+    for run in range(1, 6):
+        fixed = translate(server, srt, env, 50)
+        planned = translate(server, srt, env)
+        print(f"   run {run}   fixed 50: {fixed[1]:>3} calls, {fixed[2]} retry passes, {fixed[3]} left, {fixed[4]:4.1f}s   "
+              f"planner: {planned[1]:>3} calls, {planned[2]} retry passes, {planned[3]} left, {planned[4]:4.1f}s")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import re
+import sys
+import time
+import random
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(TOOLS_DIR, "common"))
+from humanize_rules import HARD_CONSTRAINTS_PATH, get_engine
+
+# humanize_text over a subtitle corpus: the previous implementation (table
+# parsed with a plain pipe split, re.sub per rule per line, then str.replace
+# fallbacks) vs. the compiled RuleEngine. Checks that the engine's staged
+# passes give exactly the result of applying its rules one by one, on the
+# corpus and on random strings built from the rules' own text (which is
+# where rules would interact); lines where the old loader's parsing bugs
+# changed the output are counted separately.
+# Usage: python bench_humanize_rules.py [lines]
+
+LITERALS = (("此外，", "另外，"), ("总而言之，", "简单说，"), ("不可或缺", "很重要"), ("意味着", "说明"),
+            (",", "，"), ("?", "？"), ("!", "！"))
+
+PHRASES = [
+    "我们用 Cloud Code 写了一个 agent", "此外，这个模型至关重要", "总而言之，这就是 vibe coding 的闭环",
+    "Forward Deployed Engineers 会来现场", "这意味着我们需要新的抓手", "他说——其实不是这样",
+    "（笑）然后我们就开始了", "[音乐] 好的, 我们继续", "真的吗?太好了!", "不得不说，这个结果前所未有的好",
+    "Anthropic 发布了 Claude 3 Opus", "有一说一，Gemini Flash 很快", "。，然后呢", "OpenClaw 是开源的",
+    "我们在深入探讨这个不断演变的格局", "这个 FDE 团队致力于赋能客户", "它们之间的相互作用", "见证了宝贵的时刻",
+    "the agent reads the file", "台湾政府和立法院", "这是啥意思", "跑起来真爽", "一个普通的句子，没有任何需要替换的内容",
+]
+
+def previous_rules(filepath):
+    """smart_translate.load_regex_rules before the shared loader."""
+    rules = []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("|") and not line.startswith("| Rule") and not line.startswith("| description") and not line.startswith("|---"):
+                parts = [p.strip() for p in re.split(r'(?<!\\)\|', line) if p.strip()]
+                if len(parts) >= 2:
+                    pattern = parts[1].strip('`').replace(r'\|', '|')
+                    replacement = parts[2].strip('`').replace(r'\|', '|') if len(parts) > 2 else ""
+                    rules.append((pattern, replacement))
+    return rules
+
+def previous_humanize(text, rules):
+    for pattern, replacement in rules:
+        try:
+            text = re.sub(pattern, replacement, text)
+        except Exception:
+            pass
+    text = text.replace("此外，", "另外，")
+    text = text.replace("总而言之，", "简单说，")
+    text = text.replace("不可或缺", "很重要")
+    text = text.replace("意味着", "说明")
+    text = text.replace(",", "，").replace("?", "？").replace("!", "！")
+    return re.sub(r'\s+', ' ', text).strip()
+
+def corpus(n):
+    rng = random.Random(n)
+    return [" ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 3))) for _ in range(n)]
+
+def fuzz(engine, n):
+    """Random strings of rule fragments, so neighbouring rules overlap, chain and join."""
+    rng = random.Random(0)
+    pieces = [r.pattern for r in engine.rules if r.literal or r.text] + [r.replacement for r in engine.rules]
+    pieces += list("，,。.!?！？—()（）[] \tabcAI")
+    mismatches = 0
+    for _ in range(n):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 12)))
+        expected = text
+        for rule in engine.rules:
+            expected = rule.apply(expected)
+        mismatches += engine.apply(text) != expected
+    return mismatches
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lines = corpus(n)
+
+    start = time.perf_counter()
+    rules = previous_rules(HARD_CONSTRAINTS_PATH)
+    old = [previous_humanize(line, rules) for line in lines]
+    old_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = get_engine(HARD_CONSTRAINTS_PATH, LITERALS)
+    whitespace = re.compile(r'\s+')
+    new = [whitespace.sub(' ', engine.apply(line)).strip() for line in lines]
+    new_seconds = time.perf_counter() - start
+
+    sequential = 0
+    for line, out in zip(lines, new):
+        expected = line
+        for rule in engine.rules:
+            expected = rule.apply(expected)
+        sequential += whitespace.sub(' ', expected).strip() != out
+    changed = sum(1 for a, b in zip(old, new) if a != b)
+
+    print(f"{n:,} lines, {len(rules)} table rows parsed by the previous loader, engine: {engine.describe()}")
+    print(f"   previous   {old_seconds:6.2f}s  ({n / old_seconds:>9,.0f} lines/s)")
+    print(f"   engine     {new_seconds:6.2f}s  ({n / new_seconds:>9,.0f} lines/s)  {old_seconds / new_seconds:.1f}x")
+    print(f"   engine vs. its rules applied one by one: {sequential} corpus line(s), "
+          f"{fuzz(engine, 20000)} of 20,000 random strings differ")
+    print(f"   engine vs. previous output: {changed:,} line(s) differ (rows the previous loader misparsed)")
+    for a, b in [(a, b) for a, b in zip(old, new) if a != b][:3]:
+        print(f"      {a!r}\n   -> {b!r}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import io
+import json
+import time
+import subprocess
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# autosub_batch scenario: one smart_translate process per video, all using the
+# same provider, which allows 600 RPM. Each process is configured for 600 RPM
+# on its own, so without coordination they overshoot together. With the
+# broker every process leases from one shared budget (and at most
+# --max-api-calls requests are in flight), round-robin between videos.
+# Usage: python bench_llm_broker.py [long_chunks] [short_chunks] [short_videos]
+
+RPM = 600
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def worker(n):
+    """Child process: one video's translation batch."""
+    import llm_utils
+    client = llm_utils.LLMClient()
+    tasks = [{'index': i, 'prompt': f"Translate:\n[{i}] line {i} of {os.environ.get('AUTOSUB_LLM_CLIENT')}"}
+             for i in range(n)]
+    start = time.perf_counter()
+    results = quiet(lambda: client.generate_batch(tasks, "gpt-mock"))
+    print(json.dumps({'elapsed': time.perf_counter() - start,
+                      'ok': sum(1 for r in results if r.get('result'))}))
+
+def main():
+    args = [int(a) for a in sys.argv[1:] if a.isdigit()]
+    long_n = args[0] if args else 150
+    short_n = args[1] if len(args) > 1 else 30
+    shorts = args[2] if len(args) > 2 else 3
+
+    server = MockLLMServer(latency=0.05, rpm=RPM, window=1.0).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = str(RPM)
+    import llm_broker
+
+    videos = [("long video", long_n)] + [(f"short video {i + 1}", short_n) for i in range(shorts)]
+    total = sum(n for _, n in videos)
+    print(f"{len(videos)} processes ({long_n} + {shorts}x{short_n} chunks), provider allows {RPM} RPM, "
+          f"each process configured for {RPM} RPM")
+
+    for use_broker in (False, True):
+        server.reset_counters()
+        broker = llm_broker.LLMBroker(default_rpm=RPM, max_in_flight=20).start() if use_broker else None
+        start = time.perf_counter()
+        children = []
+        for name, n in videos:
+            env = {**os.environ, "AUTOSUB_LLM_CLIENT": name}
+            if broker:
+                broker.export(env, state_file=None)
+            children.append(subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", str(n)],
+                                             env=env, stdout=subprocess.PIPE, text=True))
+        snapshot = None
+        if broker:
+            # First moment the children are competing for the budget
+            while time.perf_counter() - start < 10:
+                snapshot = broker.status()
+                if snapshot['queued']:
+                    break
+                time.sleep(0.05)
+            snapshot_at = time.perf_counter() - start
+        results = [json.loads(c.communicate()[0].strip().splitlines()[-1]) for c in children]
+        elapsed = time.perf_counter() - start
+        ok = sum(r['ok'] for r in results)
+        label = "shared broker" if broker else "independent processes"
+        print(f"{label:<22} {elapsed:6.2f}s  ok {ok}/{total}  429s {server.rejected:>4}  "
+              f"peak in flight {server.peak_in_flight:>3}")
+        print("   " + ", ".join(f"{name} {r['elapsed']:.1f}s" for (name, _), r in zip(videos, results)))
+        if snapshot:
+            q = next(iter(snapshot['quotas'].values()), {})
+            print(f"   status after {snapshot_at:.1f}s: {snapshot['in_flight']} in flight, {snapshot['queued']} queued "
+                  f"{q.get('queued_by_client')}")
+            broker.close()
+    server.stop()
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        worker(int(sys.argv[sys.argv.index("--worker") + 1]))
+    else:
+        main()
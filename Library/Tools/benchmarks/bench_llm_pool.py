@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import shutil
+import concurrent.futures
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# Per-request overhead of bare requests.post vs the pooled per-provider sessions
+# in LLMClient, against a local OpenAI-compatible stand-in server.
+# Usage: python bench_llm_pool.py [requests] [--tls]
+
+PROMPT = "Translate:\n" + "\n".join(f"[{i}] line {i}" for i in range(1, 21))
+
+def bare_post(base_url):
+    # Previous behaviour: new connection (and TLS handshake) per call
+    response = requests.post(
+        f"{base_url}/chat/completions",
+        headers={"Authorization": "Bearer test", "Content-Type": "application/json"},
+        json={"model": "mock-chat", "messages": [{"role": "user", "content": PROMPT}], "temperature": 0.3},
+        timeout=300,
+    )
+    response.raise_for_status()
+    return response.json()['choices'][0]['message']['content']
+
+def run(label, server, fn, n, workers):
+    server.reset_counters()
+    start = time.perf_counter()
+    if workers == 1:
+        for _ in range(n):
+            fn()
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(lambda _: fn(), range(n)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / n * 1000:>8.2f} ms/req   connections: {server.connections:>4}")
+    return elapsed
+
+def main():
+    n = int(next((a for a in sys.argv[1:] if a.isdigit()), 500))
+    tls = "--tls" in sys.argv and shutil.which("openssl")
+
+    server = MockLLMServer(tls=bool(tls)).start()
+    if server.certfile:
+        os.environ["REQUESTS_CA_BUNDLE"] = server.certfile
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"  # measure transport only
+    import llm_utils
+
+    client = llm_utils.LLMClient()
+
+    def pooled():
+        return client._call_openai_compatible("mock-chat", PROMPT, server.base_url, "test")
+
+    print(f"{n} requests to {server.base_url} (workers: {client.max_workers})")
+    for workers in (1, client.max_workers):
+        old = run(f"bare requests.post  x{workers}", server, lambda: bare_post(server.base_url), n, workers)
+        new = run(f"pooled session      x{workers}", server, pooled, n, workers)
+        print(f"   speedup: {old / new:.2f}x")
+
+    server.reset_counters()
+    models = client._list_openai_models(llm_utils.LLMProvider.OPENAI)
+    print(f"_list_openai_models -> {models} (new connections: {server.connections})")
+
+    client.close()
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import io
+import time
+import random
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer, answer
+
+# One smart_translate chunk against a slow model (the mock generates one reply
+# line every LINE_DELAY seconds): time until the first translated block and the
+# first skipped ID are known, streamed vs. waiting for the complete reply, for
+# OpenAI-compatible and Gemini endpoints, sync and asyncio.
+# Usage: python bench_llm_stream.py [blocks]
+
+LINE_DELAY = 0.1
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    server = MockLLMServer(line_delay=LINE_DELAY).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["GEMINI_API_BASE"] = server.gemini_base_url
+    os.environ["GEMINI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"
+    os.environ["LLM_COALESCE"] = "0"
+    import llm_utils
+    import async_llm_utils
+    from llm_stream import IDLineParser, parse_id_lines
+
+    # Block 7 is left out of the prompt: the model "skips" it
+    ids = [i for i in range(1, n + 1)]
+    prompt = "Translate:\n" + "\n".join(f"[{i}] line {i}" for i in ids if i != 7)
+    reply = answer(prompt)
+
+    pieces, rest = [], reply
+    while rest:
+        cut = random.randint(1, 12)
+        pieces.append(rest[:cut])
+        rest = rest[cut:]
+    parser = IDLineParser(ids)
+    streamed = [block for piece in pieces for block in parser.feed(piece)]
+    print(f"parser: {len(pieces)} random pieces -> {len(streamed)} blocks, "
+          f"matches full parse: {parser.finish() == parse_id_lines(reply)}, missing {parser.missing()}")
+
+    print(f"{n}-block chunk, {LINE_DELAY * 1000:.0f} ms per generated line")
+    client = llm_utils.LLMClient()
+
+    def run(label, call):
+        parser = IDLineParser(ids)
+        marks = {}
+        start = time.perf_counter()
+
+        def on_delta(text):
+            if parser.feed(text):
+                marks.setdefault('first', time.perf_counter() - start)
+            if parser.skipped():
+                marks.setdefault('skipped', time.perf_counter() - start)
+
+        result = quiet(lambda: call(on_delta))
+        total = time.perf_counter() - start
+        blocks = parser.finish(result)
+        skipped = marks.get('skipped', total)
+        print(f"{label:<30} first block {marks.get('first', total):5.2f}s  skipped ID known {skipped:5.2f}s  "
+              f"complete {total:5.2f}s  blocks {len(blocks)}  same reply: {result == reply}")
+
+    async_client = async_llm_utils.AsyncLLMClient.from_client(client)
+    import asyncio
+
+    async def agenerate(model, on_delta):
+        try:
+            return await async_client.generate_content(prompt, model, fallback=False, on_delta=on_delta)
+        finally:
+            await async_client.aclose()
+
+    # The sync client's non-streamed Gemini path needs the SDK; asyncio uses REST for both
+    for model in ("gpt-mock", "gemini-mock"):
+        run(f"{model}, complete reply", lambda cb: asyncio.run(agenerate(model, None)))
+        run(f"{model}, streamed", lambda cb: client.generate_content(prompt, model, fallback=False, on_delta=cb))
+        run(f"{model}, asyncio streamed", lambda cb: asyncio.run(agenerate(model, cb)))
+
+    tasks = [{'index': i, 'prompt': prompt + f"\n[{1000 + i}] batch task {i}"} for i in range(8)]
+    first = {}
+    start = time.perf_counter()
+    results = quiet(lambda: client.generate_batch(
+        tasks, "gpt-mock", on_delta=lambda task, text: first.setdefault(task['index'], time.perf_counter() - start)))
+    print(f"batch of {len(tasks)} streamed chunks: first text after {min(first.values()):.2f}s, "
+          f"all {sum(1 for r in results if r.get('result'))} complete after {time.perf_counter() - start:.2f}s")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
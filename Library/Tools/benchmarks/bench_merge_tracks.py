@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import contextlib
+import io
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import srt_utils
+from subtitle_track import format_srt_time
+
+# Benchmark: srt_utils.merge_tracks scaling with cue count (interval-join engine).
+# Usage: python bench_merge_tracks.py [max_cues]
+
+def write_synthetic(path, n, text, seed):
+    rnd = random.Random(seed)
+    t = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(1, n + 1):
+            t += rnd.randint(200, 1500)
+            d = rnd.randint(800, 4000)
+            f.write(f"{i}\n{format_srt_time(t)} --> {format_srt_time(t + d)}\n{text} {i}\n\n")
+            t += d
+
+def main():
+    max_cues = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sizes = [n for n in (1000, 10000, 100000, 1000000) if n <= max_cues]
+
+    print(f"{'cues':>8} | {'merge (s)':>10} | {'us/cue':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            master = os.path.join(tmp, "master.srt")
+            source = os.path.join(tmp, "source.srt")
+            out = os.path.join(tmp, "merged.srt")
+            write_synthetic(master, n, "翻译 (note)", seed=1)
+            write_synthetic(source, n, "source line", seed=2)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                srt_utils.merge_tracks(master, source, out)
+            elapsed = time.perf_counter() - start
+            print(f"{n:>8} | {elapsed:>10.3f} | {elapsed / n * 1e6:>8.1f}")
+
+if __name__ == "__main__":
+    main()
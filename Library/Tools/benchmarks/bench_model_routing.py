@@ -0,0 +1,63 @@
+import os
+import re
+import sys
+import time
+import random
+import tempfile
+import subprocess
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# smart_translate end to end with --model gpt-4o: every chunk on the strong
+# model (--fast-model none) vs. two-tier routing (first pass on gpt-4o-mini,
+# failing chunks escalated). The mock's mini model answers in a third of the
+# time but leaves 40% of a chunk in English in SLOPPY of its replies.
+# Reports wall-clock time, requests, chunks escalated, blocks left
+# untranslated and the routing summary's cost estimate.
+# Usage: python bench_model_routing.py [blocks]
+
+SMART_TRANSLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "autosub", "smart_translate.py")
+WORDS = "so the agent reads the file then it plans the change and we review what it wrote".split()
+SLOPPY = 0.2
+
+def write_srt(path, n):
+    rng = random.Random(n)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(12))
+            f.write(f"{i}\n00:{i // 60:02d}:{i % 60:02d},000 --> 00:{i // 60:02d}:{i % 60:02d},900\n{text}\n\n")
+
+def translate(server, srt, env, fast):
+    server.reset_counters()
+    start = time.perf_counter()
+    cmd = [sys.executable, SMART_TRANSLATE, srt, "--model", "gpt-4o", "--fast-model", fast, "--chunk-size", "20"]
+    out = subprocess.run(cmd, env=env, capture_output=True, text=True, encoding="utf-8").stdout
+    seconds = time.perf_counter() - start
+    escalated = len(re.findall(r"Escalating to", out))
+    left = re.search(r"(\d+) segment\(s\) still untranslated", out)
+    passes = len(re.findall(r"Post-processing pass \d+", out))
+    cost = re.search(r"Cost: (.*)", out)
+    return seconds, server.requests, escalated, passes, int(left.group(1)) if left else 0, cost.group(1) if cost else ""
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    server = MockLLMServer(model_latency={"mini": 0.5, "gpt-4o": 1.5}, sloppy={"mini": SLOPPY}).start()
+    folder = tempfile.mkdtemp()
+    srt = os.path.join(folder, "talk.en.srt")
+    write_srt(srt, n)
+    env = {**os.environ, "OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "test", "LLM_RPM": "0",
+           "AUTOSUB_TM": "0", "LLM_CACHE": "0", "AUTOSUB_JOURNAL": "0", "LLM_ASYNC_CONCURRENCY": "8",
+           "LLM_CHUNK_STATE": os.path.join(folder, "planner.json")}
+
+    print(f"{n} blocks in chunks of 20, 8 in flight; gpt-4o 1.5s per call, gpt-4o-mini 0.5s "
+          f"with {SLOPPY:.0%} bad chunks")
+    for label, fast in (("gpt-4o only", "none"), ("routed", "gpt-4o-mini")):
+        seconds, calls, escalated, passes, left, cost = translate(server, srt, env, fast)
+        print(f"   {label:<12} {seconds:5.1f}s  {calls:>3} requests  {escalated:>2} escalated  "
+              f"{passes} repair pass(es)  {left} left  {cost}")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(TOOLS_DIR, "transcriber"))
+import transcribe_engine
+import parallel_transcribe
+
+# CPU transcription of one media file: a single model.transcribe stream using
+# every core vs. VAD-partitioned spans on 2, 4, ... worker processes
+# (parallel_transcribe). Wall-clock includes loading the model in each worker.
+# Reports time, speed against real time, segments and words (the word count
+# should stay within a few percent of the single stream; span edges fall in
+# silences) and how evenly speech was spread over the spans.
+# Needs faster-whisper and the model; runs on CPU regardless of CUDA.
+# Usage: python bench_parallel_transcribe.py <media file> [model] [workers ...]
+
+def single_stream(path, model_path, download_root):
+    from faster_whisper import WhisperModel
+    model = WhisperModel(model_path, device="cpu", compute_type="int8", cpu_threads=os.cpu_count() or 1,
+                         download_root=download_root)
+    segments, info = model.transcribe(path, **transcribe_engine.TRANSCRIBE_OPTIONS)
+    return list(segments), info
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python bench_parallel_transcribe.py <media file> [model] [workers ...]")
+        sys.exit(1)
+    path = sys.argv[1]
+    model = sys.argv[2] if len(sys.argv) > 2 else "large-v3-turbo"
+    counts = [int(n) for n in sys.argv[3:]] or [n for n in (2, 4, 8, 16) if n <= (os.cpu_count() or 1)]
+    model_path, download_root = transcribe_engine.find_model(model, log=lambda text: None)
+
+    from faster_whisper.audio import decode_audio
+    audio = decode_audio(path, sampling_rate=parallel_transcribe.SAMPLE_RATE)
+    regions = parallel_transcribe.speech_regions(audio)
+    duration = len(audio) / parallel_transcribe.SAMPLE_RATE
+    print(f"{os.path.basename(path)}: {duration:.0f}s, {len(regions)} speech region(s), "
+          f"{os.cpu_count()} core(s), model {model} int8")
+
+    start = time.perf_counter()
+    segments, _ = single_stream(path, model_path, download_root)
+    base = time.perf_counter() - start
+    base_words = sum(len(s.words or ()) for s in segments)
+    print(f"   1 stream    {base:7.1f}s  {duration / base:5.1f}x real time  {len(segments):>5} segments  {base_words:>6} words")
+
+    for workers in counts:
+        spans = parallel_transcribe.partition(regions, len(audio), workers * parallel_transcribe.SPANS_PER_WORKER)
+        speech = [sum(e - s for s, e in r) / parallel_transcribe.SAMPLE_RATE for _, _, r in spans]
+        start = time.perf_counter()
+        segments, _ = parallel_transcribe.transcribe_parallel(path, model_path, download_root, workers=workers,
+                                                             options=transcribe_engine.TRANSCRIBE_OPTIONS,
+                                                             log=lambda text: None)
+        segments = list(segments)
+        seconds = time.perf_counter() - start
+        words = sum(len(s.words) for s in segments)
+        ordered = all(a.start <= b.start for a, b in zip(segments, segments[1:]))
+        print(f"   {workers:>2} workers  {seconds:7.1f}s  {duration / seconds:5.1f}x real time  {len(segments):>5} segments  "
+              f"{words:>6} words ({(words - base_words) / max(1, base_words):+.1%})  {base / seconds:4.1f}x  "
+              f"{len(spans)} spans of {min(speech):.0f}-{max(speech):.0f}s speech x {parallel_transcribe.worker_threads(workers)} thread(s)"
+              + ("" if ordered else "  NOT IN ORDER"))
+
+if __name__ == "__main__":
+    main()
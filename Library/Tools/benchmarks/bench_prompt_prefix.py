@@ -0,0 +1,70 @@
+import os
+import sys
+import io
+import time
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# A file's worth of smart_translate chunks sharing one large instruction
+# preamble, sent the old way (preamble inline in the user prompt) and as a
+# system prefix (context_cache.py). The mock bills prompt caches like the
+# providers: automatic prefix caching for OpenAI-compatible endpoints,
+# explicit `cachedContents` for Gemini, and spends PREFILL seconds per 1000
+# uncached input tokens before the first output token.
+# Usage: python bench_prompt_prefix.py [chunks]
+
+PREFILL = 0.2
+RULE = "- Keep spoken rhythm; never merge segments across time boundaries; prefer short clauses.\n"
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def chunk(n):
+    lines = "\n".join(f"[{n * 40 + i}] and then the agent reads line {i} of chunk {n}" for i in range(1, 41))
+    return f"### STEP 4: CONTEXT AWARENESS\nINPUT BLOCK:\n{lines}\n\nOUTPUT FORMAT (STRICT):\n[ID] Translated Text\n"
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    server = MockLLMServer(prefill_per_1k=PREFILL).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["GEMINI_API_BASE"] = server.gemini_base_url
+    os.environ["GEMINI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"
+    os.environ["LLM_CACHE"] = "0"
+    os.environ["LLM_COALESCE"] = "0"
+    import llm_utils
+
+    preamble = "You are an expert subtitle translator and editor.\n" + RULE * 100
+    print(f"{n} chunks, {len(preamble) // 4} token preamble, {PREFILL * 1000:.0f} ms prefill per 1k uncached tokens")
+    for model in ("gpt-mock", "gemini-mock"):
+        for layout in ("inline", "system"):
+            if layout == "inline":
+                tasks = [{'index': i, 'prompt': f"{preamble}\n\n{chunk(i)}"} for i in range(n)]
+            else:
+                tasks = [{'index': i, 'system': preamble, 'prompt': chunk(i)} for i in range(n)]
+            server.clear_prompt_caches()
+            server.reset_counters()
+            client = llm_utils.LLMClient()
+            first = {}
+
+            def on_delta(task, text):
+                first.setdefault(task['index'], time.perf_counter())
+            # generate_batch starts every task at once; time to first token is measured from there
+            start = time.perf_counter()
+            results = quiet(lambda: client.generate_batch(tasks, model, on_delta=on_delta))
+            total = time.perf_counter() - start
+            ttft = sorted(t - start for t in first.values())
+            ok = sum(1 for r in results if r.get('result'))
+            uncached = server.prompt_tokens - server.cached_tokens
+            print(f"   {model:<12} {layout:<7} {ok}/{n} ok  input {server.prompt_tokens:>7,}  "
+                  f"cached {server.cached_tokens / max(1, server.prompt_tokens):4.0%}  uncached {uncached:>7,}  "
+                  f"median TTFT {ttft[len(ttft) // 2]:5.2f}s  total {total:5.2f}s  "
+                  f"(client saw {client.usage.cached_tokens:,} cached)")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
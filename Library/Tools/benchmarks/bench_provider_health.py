@@ -0,0 +1,76 @@
+import os
+import sys
+import io
+import time
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# Cascade behaviour when the preferred provider is down: 50 chunks ask for a
+# model whose server answers 503 after a delay, with a healthy fallback
+# provider configured. Compares the old "try every target on every call"
+# behaviour with circuit breakers, then lets the dead provider recover and
+# shows the background probe closing the circuit again.
+# Usage: python bench_provider_health.py [chunks] [delay]
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("-")]
+    n = int(args[0]) if args else 50
+    delay = float(args[1]) if len(args) > 1 else 2.0
+
+    down = MockLLMServer(latency=delay, error_status=503).start()
+    backup = MockLLMServer(latency=0.05).start()
+    os.environ["OPENAI_API_BASE"] = down.base_url
+    os.environ["DEEPSEEK_API_BASE"] = backup.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["DEEPSEEK_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"
+    os.environ["LLM_ASYNC"] = "0"  # waves of max_workers threads, as on machines without aiohttp
+    import llm_utils
+    import provider_health
+
+    tasks = [{'index': i, 'prompt': f"Translate:\n[{i}] line {i}"} for i in range(n)]
+
+    def run(label):
+        down.reset_counters()
+        backup.reset_counters()
+        client = llm_utils.LLMClient()
+        client.ordered_configs = [(llm_utils.LLMProvider.DEEPSEEK, "test", "deepseek-mock")]
+        start = time.perf_counter()
+        results = quiet(lambda: client.generate_batch(tasks, "gpt-mock"))
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r.get('result'))
+        print(f"{label:<22} {elapsed:6.2f}s   ok {ok}/{n}   calls to dead provider: {down.requests:>3}")
+        return client, elapsed
+
+    print(f"{n} chunks, preferred provider fails after {delay:.1f}s, fallback answers in 0.05s")
+    failures, error_rate = provider_health.BREAKER_FAILURES, provider_health.BREAKER_ERROR_RATE
+    provider_health.BREAKER_FAILURES, provider_health.BREAKER_ERROR_RATE = 10 ** 9, 0
+    _, t_old = run("no circuit breaker")
+    provider_health.BREAKER_FAILURES, provider_health.BREAKER_ERROR_RATE = failures, error_rate
+
+    provider_health.BREAKER_COOLDOWN = 2.0
+    client, t_new = run("circuit breaker")
+    print(f"   speedup: {t_old / t_new:.1f}x")
+
+    health = client.health.get(llm_utils.LLMProvider.OPENAI, "gpt-mock")
+    print(f"state after batch: {health.state} (last error: {health.last_error})")
+    down.error_status = None
+    down.latency = 0.05
+    deadline = time.monotonic() + 10
+    while health.state == "open" and time.monotonic() < deadline:
+        time.sleep(0.1)
+    print(f"provider back, probe ran: {health.state}")
+    quiet(lambda: client.generate_content("[1] hi", "gpt-mock"))
+    print(f"after next call: {health.state}, latency EWMA {health.latency * 1000:.0f} ms")
+
+    down.stop()
+    backup.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import io
+import time
+import contextlib
+import concurrent.futures
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# Rate limiter scenarios against the local mock server:
+#  1. Two providers with the same RPM budget: the old global RateLimiter paces
+#     them together, per-provider buckets run each at its own limit.
+#  2. Configured budget 10x above the server's real limit: the limiter learns
+#     the limit from x-ratelimit headers (or Retry-After alone) and backs off.
+# Usage: python bench_rate_limits.py
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def tasks_for(n):
+    return [{'index': i, 'prompt': f"Translate:\n[{i}] line {i}"} for i in range(n)]
+
+def main():
+    server = MockLLMServer(latency=0.05).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["DEEPSEEK_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["DEEPSEEK_API_KEY"] = "test"
+    import llm_utils
+
+    # --- 1. Provider isolation ---
+    rpm, per_provider = 600, 60
+    print(f"1) {per_provider} calls each to two providers, budget {rpm} RPM per provider")
+    models = ["gpt-mock", "deepseek-mock"]
+
+    os.environ["LLM_RPM"] = "0"
+    legacy = llm_utils.LLMClient()
+    shared = llm_utils.RateLimiter(rpm)
+    def legacy_call(model):
+        shared.wait()
+        return legacy.generate_content("[1] hi", model, fallback=False)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as ex:
+        quiet(lambda: list(ex.map(legacy_call, models * per_provider)))
+    t_old = time.perf_counter() - start
+    print(f"   global RateLimiter          {t_old:6.2f}s")
+
+    os.environ["LLM_RPM"] = str(rpm)
+    client = llm_utils.LLMClient()
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as ex:
+        quiet(lambda: list(ex.map(lambda m: client.generate_content("[1] hi", m, fallback=False), models * per_provider)))
+    t_new = time.perf_counter() - start
+    print(f"   per-provider buckets        {t_new:6.2f}s   ({t_old / t_new:.1f}x)")
+    server.stop()
+
+    # --- 2. Adapting to the real limit ---
+    n = 100
+    for headers in (True, False):
+        server = MockLLMServer(latency=0.05, rpm=600, window=1.0, rate_headers=headers).start()
+        os.environ["OPENAI_API_BASE"] = server.base_url
+        os.environ["LLM_RPM"] = "6000"
+        client = llm_utils.LLMClient()
+        start = time.perf_counter()
+        results = quiet(lambda: client.generate_batch(tasks_for(n), "gpt-mock"))
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r.get('result'))
+        limit = client.limits.get(llm_utils.LLMProvider.OPENAI, "gpt-mock")
+        label = "x-ratelimit + Retry-After" if headers else "Retry-After only"
+        print(f"2) {n} chunks, configured 6000 RPM, server allows 600 RPM ({label})")
+        print(f"   {ok}/{n} succeeded in {elapsed:.2f}s, 429s: {server.rejected}, "
+              f"limiter now at {limit.requests.per_minute:.0f} RPM")
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(TOOLS_DIR, "transcriber"))
+import transcribe_engine
+from transcribe_server import Segment, Word
+from word_timeline import WordTimeline
+
+# Changing the chunking used to mean a full ASR run. This builds a synthetic
+# 2h transcript (word timestamps as Whisper emits them), saves and reloads its
+# word timeline, and rechunks it: the rechunked SRT must be byte-identical to
+# chunking the in-memory segments. Reports save/load/rechunk time and file size.
+# Usage: python bench_rechunk.py [hours]
+
+VOCAB = ("the", "model", "and", "we", "it's", "going", "to", "really", "data", "so", "that", "is",
+         "training", "of", "you", "know", "right", "okay", "then", "a", "very", "interesting", "question")
+
+def iter_segments(hours, seed=7):
+    rng = random.Random(seed)
+    t = 0.0
+    while t < hours * 3600:
+        words = []
+        for _ in range(rng.randint(4, 30)):
+            start = t + rng.uniform(0.0, 0.9 if rng.random() < 0.05 else 0.08)
+            end = start + rng.uniform(0.12, 0.5)
+            token = rng.choice(VOCAB) + ("." if rng.random() < 0.08 else "," if rng.random() < 0.08 else "")
+            words.append(Word(start, end, " " + token, rng.uniform(0.3, 1.0)))
+            t = end
+        yield Segment(words[0].start, words[-1].end, "".join(w.word for w in words), words)
+        t += rng.uniform(0.2, 2.0)
+
+def synthetic_segments(hours, seed=7):
+    return list(iter_segments(hours, seed))
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    segments = synthetic_segments(hours)
+    words = sum(len(s.words) for s in segments)
+    print(f"Synthetic transcript: {hours:g}h, {len(segments)} segments, {words} words")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        direct_srt = os.path.join(tmp, "direct.srt")
+        start = time.perf_counter()
+        cues = transcribe_engine.write_srt(direct_srt, segments, content_type="spoken")
+        chunk_ms = (time.perf_counter() - start) * 1000
+
+        timeline = WordTimeline()
+        start = time.perf_counter()
+        for s in segments:
+            timeline.append_segment(s)
+        timeline.meta = {'style': "spoken"}
+        path = os.path.join(tmp, "talk.words.bin")
+        timeline.save(path)
+        save_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        loaded = list(WordTimeline.load(path).segments())
+        load_ms = (time.perf_counter() - start) * 1000
+
+        rechunked_srt = os.path.join(tmp, "talk.srt")
+        start = time.perf_counter()
+        transcribe_engine.rechunk(path, rechunked_srt)
+        rechunk_ms = (time.perf_counter() - start) * 1000
+
+        with open(direct_srt, 'rb') as a, open(rechunked_srt, 'rb') as b:
+            identical = a.read() == b.read()
+        print(f"   chunk in memory   {chunk_ms:8.0f} ms  {cues} cues")
+        print(f"   save timeline     {save_ms:8.0f} ms  {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"   load timeline     {load_ms:8.0f} ms  {len(loaded)} segments")
+        print(f"   rechunk (total)   {rechunk_ms:8.0f} ms  SRT {'identical' if identical else 'DIFFERS'}")
+
+if __name__ == "__main__":
+    main()
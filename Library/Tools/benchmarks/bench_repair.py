@@ -0,0 +1,136 @@
+import os
+import sys
+import io
+import re
+import time
+import random
+import contextlib
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(TOOLS_DIR, "common"))
+sys.path.append(os.path.join(TOOLS_DIR, "autosub"))
+from mock_llm_server import MockLLMServer
+
+# Post-processing of a first pass that left blocks untranslated (scattered
+# single IDs plus a few runs of neighbours): the previous loop (re-check every
+# block, re-send the missing ones as fresh planned chunks) vs. the ID-level
+# repair in postprocess_retry_loop. The mock model skips 30% of the [ID]
+# lines past the 10th of a request, like the long-chunk losses seen in
+# practice. Reports passes (sequential round trips), requests, input tokens
+# (and how many miss the provider's prefix cache) and is_untranslated calls.
+# Usage: python bench_repair.py [blocks] [missing]
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def first_pass(n, missing):
+    """A translated track with `missing` blocks left in English."""
+    from subtitle_track import SubtitleTrack
+    rng = random.Random(n)
+    blocks = [{'index': str(i), 'start': i, 'end': i + 0.9, 'lines': [f"translated line {i} 译文"]}
+              for i in range(1, n + 1)]
+    left = set()
+    while len(left) < missing:
+        pos = rng.randrange(n)
+        run = rng.choice((1, 1, 1, 2, 4))
+        left.update(range(pos, min(n, pos + run)))
+    for pos in left:
+        blocks[pos]['lines'] = [f"and then the agent reads line {pos + 1} of the file"]
+    return SubtitleTrack.from_cues(blocks)
+
+def resend_blocks(st, blocks, client, model, style, verbalizer_snippet, humanizer_snippet,
+                  knowledge_snippet, trans_mode_snippet=""):
+    """
+    The retry path before ID-level repair: the missing blocks are re-planned
+    into chunks like a first pass and sent without context. Returns the blocks
+    with the translations that came back (others unchanged).
+    """
+    input_lines = [st.input_line(b) for b in blocks]
+    system = st.build_prompt_prefix(style, verbalizer_snippet, humanizer_snippet, knowledge_snippet,
+                                    trans_mode_snippet)
+    planner = st.get_planner(model)
+    overhead = st.estimate_tokens(system + st.build_prompt_suffix(""))
+    spans = planner.plan([st.block_tokens(line) for line in input_lines], overhead)
+    tasks = [{'index': i, 'chunk': [blocks[k] for k in span], 'system': system,
+              'prompt': st.build_prompt_suffix("".join(input_lines[k] for k in span))}
+             for i, span in enumerate(spans)]
+    results = client.generate_batch(tasks, model) if tasks else []
+
+    translated_map = {}
+    for res in results:
+        if res.get('result'):
+            chunk_map = st.parse_id_lines(res['result'])
+            planner.record(len(res['chunk']), sum(1 for b in res['chunk'] if str(b['index']) not in chunk_map))
+            translated_map.update(chunk_map)
+
+    out = []
+    for block in blocks:
+        new_block = block.copy()
+        if str(block['index']) in translated_map:
+            new_block['lines'] = [translated_map[str(block['index'])]]
+        out.append(new_block)
+    return out
+
+def previous_loop(st, final_blocks, client, model, snippets, max_iterations=5):
+    """The post-processing loop before ID-level repair."""
+    passes = 0
+    for iteration in range(1, max_iterations + 1):
+        missed = [i for i, b in enumerate(final_blocks) if st.is_untranslated(b)]
+        if not missed:
+            break
+        passes += 1
+        out = resend_blocks(st, [final_blocks[i] for i in missed], client, model, "casual", *snippets)
+        final_blocks = final_blocks.with_lines({pos: b['lines'] for pos, b in zip(missed, out)})
+        [i for i, b in enumerate(final_blocks) if st.is_untranslated(b)]  # its progress report
+    return final_blocks, passes
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    missing = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    server = MockLLMServer(latency=0.3, drop_after=int(os.environ.get("DROP_AFTER", 10)), drop_rate=0.3).start()
+    os.environ.update({"OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "test", "LLM_RPM": "0",
+                       "AUTOSUB_TM": "0", "LLM_CACHE": "0", "LLM_COALESCE": "0", "LLM_STREAM": "0",
+                       "LLM_CHUNK_STATE": os.devnull + ".missing"})
+    import smart_translate as st
+    import chunk_planner
+
+    checks = [0]
+    is_untranslated = st.is_untranslated
+
+    def counted(block):
+        checks[0] += 1
+        return is_untranslated(block)
+    st.is_untranslated = counted
+
+    # The instructions smart_translate sends with every request
+    knowledge = re.search(r'(## Domain Knowledge & ASR Correction.*)', st.SUBTRANSLATOR_RULES, re.DOTALL)
+    snippets = (st.VERBALIZER_RULES[:1500] or "Translate naturally.", st.HUMANIZER_RULES[:1500] or "Do not sound robotic.",
+                knowledge.group(1).strip() if knowledge else "", "")
+    model = "gpt-mock"
+    print(f"{n} blocks, {missing}+ left untranslated by the first pass")
+    for label in ("previous loop", "ID-level repair"):
+        track = first_pass(n, missing)
+        before = sum(1 for b in track if is_untranslated(b))
+        server.reset_counters()
+        server.clear_prompt_caches()
+        checks[0] = 0
+        # Each path starts from an untrained planner
+        chunk_planner._PLANNERS.clear()
+        client = st.llm_utils.LLMClient()
+        start = time.perf_counter()
+        if label == "previous loop":
+            out, passes = quiet(lambda: previous_loop(st, track, client, model, snippets))
+        else:
+            log = io.StringIO()
+            with contextlib.redirect_stdout(log):
+                out = st.postprocess_retry_loop(track, client, model, "casual", *snippets)
+            passes = log.getvalue().count("Post-processing pass")
+        seconds = time.perf_counter() - start
+        left = sum(1 for b in out if is_untranslated(b))
+        print(f"   {label:<16} {before} missing -> {left} left  {passes} pass(es)  {server.requests:>3} requests  "
+              f"{server.prompt_tokens:>7,} input tokens ({server.prompt_tokens - server.cached_tokens:>6,} uncached)  {checks[0]:>6,} is_untranslated calls  {seconds:4.1f}s")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import io
+import time
+import tempfile
+import contextlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# Rerunning a translation with the response cache: the first run fills the
+# cache, a rerun (fresh cache instance on the same database, as in a new
+# process) answers every chunk locally. Also checks LRU eviction under a
+# small size budget and TTL expiry.
+# Usage: python bench_response_cache.py [chunks]
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = MockLLMServer(latency=0.25).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"
+    import llm_utils
+    import response_cache
+
+    folder = tempfile.mkdtemp()
+    db = os.path.join(folder, "llm_cache.db")
+    tasks = [{'index': i, 'prompt': "Translate:\n" + "\n".join(f"[{j}] line {j}" for j in range(i * 20, i * 20 + 20))}
+             for i in range(n)]
+
+    def run(label, cache):
+        server.reset_counters()
+        client = llm_utils.LLMClient()
+        client.cache = cache
+        start = time.perf_counter()
+        results = quiet(lambda: client.generate_batch(tasks, "gpt-mock"))
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r.get('result'))
+        stats = cache.stats() if cache else {}
+        print(f"{label:<12} {elapsed:7.3f}s  ok {ok}/{n}  provider calls {server.requests:>4}  "
+              f"hits {stats.get('hits', '-'):>4}  misses {stats.get('misses', '-'):>4}")
+        return results
+
+    print(f"{n} chunks of 20 lines, mock latency 250 ms")
+    run("no cache", None)
+    first = run("first run", response_cache.ResponseCache(db))
+    rerun = run("rerun", response_cache.ResponseCache(db))
+    same = sorted((r['index'], r['result']) for r in first) == sorted((r['index'], r['result']) for r in rerun)
+    print(f"   rerun answers identical: {same}")
+
+    cache = response_cache.ResponseCache(db)
+    prompt = tasks[0]['prompt']
+    rounds = 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        cache._seen.clear()
+        cache.get("openai", "gpt-mock", llm_utils.TEMPERATURE, prompt)
+    print(f"   lookup: {(time.perf_counter() - start) / rounds * 1000:.3f} ms per hit")
+    print(f"   same prompt again in one process is treated as a retry (bypassed): "
+          f"{cache.get('openai', 'gpt-mock', llm_utils.TEMPERATURE, prompt) is None}")
+
+    small = response_cache.ResponseCache(os.path.join(folder, "small.db"), max_bytes=64 * 1024)
+    for i, task in enumerate(tasks):
+        small.put("openai", "gpt-mock", llm_utils.TEMPERATURE, task['prompt'], first[0]['result'] + f" #{i}")
+    stats = small.stats()
+    print(f"   64 KB budget after {n} stores: {stats['entries']} entries, {stats['bytes']} bytes, "
+          f"{stats['evictions']} evicted")
+
+    expiring = response_cache.ResponseCache(os.path.join(folder, "ttl.db"), ttl_days=1e-5)
+    expiring.put("openai", "gpt-mock", llm_utils.TEMPERATURE, "x", "y")
+    expiring._seen.clear()
+    time.sleep(1.0)
+    print(f"   entry past its TTL is a miss: "
+          f"{expiring.get('openai', 'gpt-mock', llm_utils.TEMPERATURE, 'x') is None}")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
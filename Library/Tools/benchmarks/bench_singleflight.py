@@ -0,0 +1,79 @@
+import os
+import sys
+import io
+import time
+import subprocess
+import contextlib
+import concurrent.futures
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# Identical prompts sent at the same moment (as when several videos retry the
+# same short missing blocks): provider calls made with and without request
+# coalescing, across threads, asyncio tasks and processes sharing a broker.
+# Usage: python bench_singleflight.py [processes]
+
+PROMPTS = [f"Translate:\n[{i}] Thanks for watching!\n[{i + 1}] See you next time." for i in range(10)]
+COPIES = 4
+
+def quiet(fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn()
+
+def worker():
+    """Child process: sends every prompt once, all at the same time."""
+    import llm_utils
+    client = llm_utils.LLMClient()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(PROMPTS)) as ex:
+        quiet(lambda: list(ex.map(lambda p: client.generate_content(p, "gpt-mock", fallback=False), PROMPTS)))
+    stats = client.flights.stats() if client.flights else {}
+    print(stats.get('coalesced_remote', 0))
+
+def main():
+    procs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    server = MockLLMServer(latency=0.5).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["LLM_RPM"] = "0"
+    import llm_utils
+    import llm_broker
+
+    tasks = [{'index': i, 'prompt': p} for i, p in enumerate(PROMPTS * COPIES)]
+    print(f"{len(PROMPTS)} distinct prompts x {COPIES} copies, mock latency 500 ms")
+
+    def calls(label, fn):
+        server.reset_counters()
+        start = time.perf_counter()
+        quiet(fn)
+        print(f"{label:<32} provider calls {server.requests:>3}   {time.perf_counter() - start:5.2f}s")
+
+    for coalesce in (False, True):
+        client = llm_utils.LLMClient()
+        if not coalesce:
+            client.flights = None
+        tag = "coalesced" if coalesce else "no coalescing"
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(tasks)) as ex:
+            calls(f"threads, {tag}", lambda: list(ex.map(
+                lambda t: client.generate_content(t['prompt'], "gpt-mock", fallback=False), tasks)))
+        calls(f"asyncio batch, {tag}", lambda: client.generate_batch(tasks, "gpt-mock"))
+
+    broker = llm_broker.LLMBroker().start()
+    for use_broker in (False, True):
+        env = dict(os.environ)
+        if use_broker:
+            broker.export(env)
+        def run_children():
+            children = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker"], env=env,
+                                         stdout=subprocess.PIPE, text=True) for _ in range(procs)]
+            return [int(c.communicate()[0].strip().splitlines()[-1]) for c in children]
+        calls(f"{procs} processes, {'broker' if use_broker else 'no broker'}", run_children)
+    print(f"   broker: {broker.stats()}")
+    broker.close()
+    server.stop()
+
+if __name__ == "__main__":
+    if "--worker" in sys.argv:
+        worker()
+    else:
+        main()
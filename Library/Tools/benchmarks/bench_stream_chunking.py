@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(TOOLS_DIR, "transcriber"))
+import transcribe_engine
+from bench_rechunk import iter_segments
+
+# Chunking a transcript held in memory (the old run path: every Segment and
+# Word kept in segments_list, then flattened) vs. streaming segments through
+# chunk_segments as they are produced. Reports peak traced memory and how many
+# segments are consumed before the first cue comes out; cue lists must match.
+# Cue tuples are kept in both runs for the comparison, so streaming is not
+# quite flat here; run writes each cue out instead.
+# Usage: python bench_stream_chunking.py [hours ...]
+
+def measure(run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    cues = run()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cues, seconds, peak
+
+def main():
+    for hours in [float(h) for h in sys.argv[1:]] or [1.0, 10.0]:
+        # Segments are generated lazily, like Whisper's generator
+        def in_memory():
+            segments_list = list(iter_segments(hours))
+            print(f"{hours:g}h: {len(segments_list)} segments, {sum(len(s.words) for s in segments_list)} words")
+            return [(c.start, c.end, c.text) for c in transcribe_engine.chunk_segments(segments_list, 'spoken')]
+
+        consumed, first_cue_at = [0], []
+        def streaming():
+            def counted():
+                for s in iter_segments(hours):
+                    consumed[0] += 1
+                    yield s
+            out = []
+            for c in transcribe_engine.chunk_segments(counted(), 'spoken'):
+                if not first_cue_at:
+                    first_cue_at.append(consumed[0])
+                out.append((c.start, c.end, c.text))  # kept only to compare; run writes them out
+            return out
+
+        a, a_s, a_peak = measure(in_memory)
+        b, b_s, b_peak = measure(streaming)
+        print(f"   in memory   {a_s * 1000:7.0f} ms  peak {a_peak / 1e6:6.1f} MB")
+        print(f"   streaming   {b_s * 1000:7.0f} ms  peak {b_peak / 1e6:6.1f} MB  "
+              f"first cue after {first_cue_at[0]} segment(s)  cues {'identical' if a == b else 'DIFFER'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import subprocess
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from mock_llm_server import MockLLMServer
+
+# smart_translate killed after half of its chunks returned, then run again:
+# LLM calls and wall-clock time of the second run with the chunk journal
+# (translation_journal.py) vs. without it (AUTOSUB_JOURNAL=0). Also checks the
+# resumed output matches an uninterrupted run.
+# Usage: python bench_translation_journal.py [blocks]
+
+SMART_TRANSLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "autosub", "smart_translate.py")
+WORDS = "so the agent reads the file then it plans the change and we review what it wrote".split()
+CHUNK = 10
+
+def write_srt(path, n):
+    rng = random.Random(n)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(10))
+            f.write(f"{i}\n00:{i // 60:02d}:{i % 60:02d},000 --> 00:{i // 60:02d}:{i % 60:02d},900\n{text}\n\n")
+
+def command(srt):
+    return [sys.executable, SMART_TRANSLATE, srt, "--model", "gpt-mock", "--chunk-size", str(CHUNK)]
+
+def run(server, srt, env, kill_after=None):
+    """(LLM calls, seconds, output path); kills the process after `kill_after` finished chunks."""
+    server.reset_counters()
+    start = time.perf_counter()
+    proc = subprocess.Popen(command(srt), env=env, stdout=subprocess.PIPE, text=True, encoding="utf-8")
+    output, done = None, 0
+    for line in proc.stdout:
+        if "Progress:" in line:
+            done += 1
+            if kill_after and done >= kill_after:
+                proc.kill()
+                break
+        if "Translation Saved to:" in line:
+            output = line.split("Translation Saved to:")[1].strip()
+    proc.wait()
+    return server.requests, time.perf_counter() - start, output
+
+def read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1200
+    chunks = n // CHUNK
+    server = MockLLMServer(latency=0.3).start()
+    env = {**os.environ, "OPENAI_API_BASE": server.base_url, "OPENAI_API_KEY": "test", "LLM_RPM": "0",
+           "AUTOSUB_TM": "0", "LLM_CACHE": "0", "LLM_ASYNC_CONCURRENCY": "8"}
+    print(f"{n} blocks, {chunks} chunks, 8 in flight, killed after {chunks // 2} chunks")
+
+    folder = tempfile.mkdtemp()
+    srt = os.path.join(folder, "talk.en.srt")
+    write_srt(srt, n)
+    calls, seconds, reference = run(server, srt, env)
+    print(f"   uninterrupted          {calls:>4} calls  {seconds:5.1f}s")
+    expected = read_text(reference)
+    os.remove(reference)
+
+    for label, journal in (("no journal", "0"), ("journal", "1")):
+        env["AUTOSUB_JOURNAL"] = journal
+        killed = run(server, srt, env, kill_after=chunks // 2)
+        calls, seconds, output = run(server, srt, env)
+        same = output is not None and read_text(output) == expected
+        print(f"   {label:<11} killed run {killed[0]:>4} calls, restart {calls:>4} calls  {seconds:5.1f}s  "
+              f"output matches: {same}")
+        os.remove(output)
+    server.stop()
+
+if __name__ == "__main__":
+    main()
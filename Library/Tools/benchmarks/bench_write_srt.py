@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from subtitle_format import write_subtitles, format_timestamp, seconds_to_ms
+from subtitle_track import SubtitleTrack
+
+# Micro-benchmark: shared buffered serializer vs the previous per-line writer.
+# Usage: python bench_write_srt.py [cues]
+
+def legacy_fmt(t):
+    hours = int(t // 3600)
+    minutes = int((t % 3600) // 60)
+    seconds = int(t % 60)
+    milliseconds = int((t - int(t)) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def legacy_write_srt(subs, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, sub in enumerate(subs):
+            f.write(f"{i+1}\n")
+            f.write(f"{legacy_fmt(sub['start'])} --> {legacy_fmt(sub['end'])}\n")
+            for line in sub['lines']:
+                f.write(f"{line}\n")
+            f.write("\n")
+
+def bench(label, fn, repeat=3):
+    best = min(_timed(fn) for _ in range(repeat))
+    print(f"{label:<34} {best * 1000:>9.1f} ms")
+    return best
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    blocks = [{'index': str(i + 1), 'start': i * 2.1, 'end': i * 2.1 + 1.7,
+               'lines': [f"translated line {i}", f"source line {i}"]} for i in range(n)]
+    track = SubtitleTrack.from_cues(blocks)
+    times = [b['start'] for b in blocks]
+
+    print(f"{n} cues")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "out.srt")
+        old = bench("legacy per-line writer (dicts)", lambda: legacy_write_srt(blocks, path))
+        new = bench("buffered writer (dicts)", lambda: write_subtitles(blocks, path))
+        bench("buffered writer (SubtitleTrack)", lambda: write_subtitles(track, path))
+        print(f"speedup (dicts): {old / new:.2f}x")
+
+    print()
+    old = bench("legacy float fmt()", lambda: [legacy_fmt(t) for t in times])
+    new = bench("format_timestamp(ms)", lambda: [format_timestamp(seconds_to_ms(t)) for t in times])
+    print(f"speedup (timestamps): {old / new:.2f}x")
+
+    # Rounding check: the float path truncates, e.g. 0.29s -> 289ms
+    wrong = sum(1 for t in times if legacy_fmt(t) != format_timestamp(seconds_to_ms(t)))
+    print(f"timestamps the legacy path mis-rounds: {wrong}/{n}")
+
+if __name__ == "__main__":
+    main()
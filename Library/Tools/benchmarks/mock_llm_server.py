@@ -0,0 +1,408 @@
+import json
+import random
+import hashlib
+import ssl
+import socket
+import time
+import threading
+import subprocess
+import tempfile
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for an OpenAI-compatible endpoint (and Gemini REST), used by
+# the LLM benchmarks. Answers /chat/completions and models/<m>:generateContent
+# by echoing every "[ID] text" line of the prompt as "[ID] <translated>" (about
+# a third of the source length, like English -> Chinese), and
+# /models with a fixed list. Counts TCP connections and peak in-flight requests.
+# With `rpm` set, enforces a per-model request budget (rpm * window / 60 per
+# sliding `window` seconds) and answers 429 with Retry-After and x-ratelimit-*
+# headers when it is exceeded. With `error_status` set (can be changed while
+# running), every POST fails with that status after the usual latency.
+# Streams server-sent events for `"stream": true` chat requests and
+# :streamGenerateContent, splitting every reply line across two events; with
+# `line_delay` each reply line takes that long to "generate" (streamed or not).
+# With `drop_after` set, every [ID] line past that position of the prompt is
+# left out of the reply with probability `drop_rate` (a model losing IDs in
+# long chunks).
+# Prompt caches are simulated as providers bill them: chat prompts reuse the
+# longest previously seen prefix (OpenAI-style, from 1024 tokens in 128-token
+# steps), Gemini requests naming a `cachedContents` handle get its system
+# instruction cached. With `prefill_per_1k`, every 1000 uncached input tokens
+# delay the reply by that many seconds. Input tokens are counted either way.
+# `model_latency` maps model name fragments to their own latency (first match
+# wins, else `latency`). `sloppy` maps fragments to the probability that a
+# reply leaves 40% of its lines in English (a weak model's bad chunk).
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; avoid delayed-ACK stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count_connection()
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events):
+        """Server-sent events with chunked transfer encoding (keeps the connection alive)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path.endswith("/models"):
+            self._send_json({"data": [{"id": "mock-chat"}, {"id": "mock-embedding"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        req = json.loads(self.rfile.read(length) or b"{}")
+        self.server.begin_request()
+        try:
+            if self.path.endswith("/cachedContents"):
+                self._send_json(self.server.create_context(req))
+                return
+            model = req.get("model") or self.path.rsplit("/", 1)[-1].split(":")[0]
+            allowed, headers = self.server.admit(model)
+            if not allowed:
+                self._send_json({"error": {"message": "rate limited"}}, 429, headers)
+                return
+            latency = self.server.latency_for(model)
+            if latency:
+                time.sleep(latency)
+            if self.server.error_status:
+                self._send_json({"error": {"message": "unavailable"}}, self.server.error_status)
+                return
+            path = self.path.split("?")[0]
+            req = self.server.degrade(model, self.server.forget(req))
+            delay = self.server.line_delay
+            if path.endswith("/chat/completions"):
+                prompt = req.get("messages", [{}])[-1].get("content", "")
+                usage = self.server.prompt_usage(path, req)
+                if req.get("stream"):
+                    self._send_events(completion_events(prompt, req.get("model", "mock-chat"), delay, usage))
+                    return
+                time.sleep(delay * len(answer(prompt).splitlines()))
+                self._send_json(completion(prompt, req.get("model", "mock-chat"), usage), headers=headers)
+            elif path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+                prompt = "".join(p.get("text", "") for p in req.get("contents", [{}])[-1].get("parts", []))
+                usage = self.server.prompt_usage(path, req)
+                if path.endswith(":streamGenerateContent"):
+                    self._send_events(gemini_events(prompt, delay, usage))
+                    return
+                time.sleep(delay * len(answer(prompt).splitlines()))
+                self._send_json(gemini_completion(prompt, usage), headers=headers)
+            else:
+                self._send_json({"error": "not found"}, 404)
+        finally:
+            self.server.end_request()
+
+# Marks a prompt line the (sloppy) model answers without translating
+UNTRANSLATED = "\x00"
+
+def answer(prompt):
+    lines = []
+    for line in prompt.splitlines():
+        line = line.strip()
+        if line.startswith("[") and "]" in line and line[1:line.index("]")].isdigit():
+            text = line[line.index("]") + 1:].strip()
+            if text.startswith(UNTRANSLATED):
+                lines.append(f"{line[:line.index(']') + 1]} {text[1:]}")
+            else:
+                lines.append(f"{line[:line.index(']') + 1]} {'译文' * max(1, len(text) // 6)}")
+    return "\n".join(lines) or "好的"
+
+def completion(prompt, model, usage=None):
+    """`usage`: (input tokens, cached input tokens); by default the prompt, uncached."""
+    text = answer(prompt)
+    prompt_tokens, cached = usage or (len(prompt) // 4, 0)
+    result = {
+        "id": "mock",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text), "total_tokens": prompt_tokens + len(text)},
+    }
+    if cached:
+        result["usage"]["prompt_tokens_details"] = {"cached_tokens": cached}
+    return result
+
+def gemini_completion(prompt, usage=None):
+    text = answer(prompt)
+    prompt_tokens, cached = usage or (len(prompt) // 4, 0)
+    result = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text)},
+    }
+    if cached:
+        result["usageMetadata"]["cachedContentTokenCount"] = cached
+    return result
+
+def _stream_pieces(text, delay):
+    """Each reply line in two pieces (split mid-line), one line per `delay` seconds."""
+    for line in text.splitlines(keepends=True):
+        if delay:
+            time.sleep(delay)
+        half = len(line) // 2
+        yield line[:half]
+        yield line[half:]
+
+def completion_events(prompt, model, delay=0.0, usage=None):
+    text = answer(prompt)
+    for piece in _stream_pieces(text, delay):
+        yield json.dumps({"id": "mock", "object": "chat.completion.chunk", "model": model,
+                          "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+    yield json.dumps({"id": "mock", "object": "chat.completion.chunk", "model": model,
+                      "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                      "usage": completion(prompt, model, usage)["usage"]})
+    yield "[DONE]"
+
+def gemini_events(prompt, delay=0.0, usage=None):
+    text = answer(prompt)
+    for piece in _stream_pieces(text, delay):
+        yield json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]})
+    yield json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": ""}]}, "finishReason": "STOP"}],
+                      "usageMetadata": gemini_completion(prompt, usage)["usageMetadata"]})
+
+# Automatic prefix caching: prompts from ~1024 tokens, in ~128-token steps
+PREFIX_MIN_CHARS = 4096
+PREFIX_STEP_CHARS = 512
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.0, tls=False, handler=_Handler, rpm=None, window=60.0, rate_headers=True,
+                 error_status=None, line_delay=0.0, drop_after=None, drop_rate=0.0, prefill_per_1k=0.0,
+                 model_latency=None, sloppy=None):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.line_delay = line_delay
+        self.drop_after = drop_after
+        self.drop_rate = drop_rate
+        self._random = random.Random(0)
+        self.prefill_per_1k = prefill_per_1k
+        self.model_latency = model_latency or {}
+        self.sloppy = sloppy or {}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._prefixes = set()  # digests of prompt prefixes seen (automatic prefix cache)
+        self._contexts = {}  # cachedContents name -> system text
+        self.rpm = rpm
+        self.window = window
+        self.rate_headers = rate_headers
+        self.error_status = error_status
+        self.rejected = 0
+        self._windows = {}  # model -> timestamps of admitted requests in the last minute
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self.certfile = None
+        if tls:
+            self.certfile = _self_signed_cert()
+            ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ctx.load_cert_chain(self.certfile)
+            self.socket = ctx.wrap_socket(self.socket, server_side=True)
+        self._thread = None
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def begin_request(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def admit(self, model):
+        """Sliding window per model. Returns (allowed, response headers)."""
+        if not self.rpm:
+            return True, {}
+        budget = max(1, int(self.rpm * self.window / 60))
+        with self._lock:
+            now = time.monotonic()
+            window = [t for t in self._windows.get(model, []) if now - t < self.window]
+            allowed = len(window) < budget
+            if allowed:
+                window.append(now)
+            else:
+                self.rejected += 1
+            self._windows[model] = window
+            reset = self.window - (now - window[0]) if window else 0
+            headers = {}
+            if self.rate_headers:
+                headers = {
+                    "x-ratelimit-limit-requests": str(self.rpm),
+                    "x-ratelimit-remaining-requests": str(max(0, budget - len(window))),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                }
+            if not allowed:
+                headers["Retry-After"] = f"{max(reset, 0.001):.3f}"
+            return allowed, headers
+
+    def latency_for(self, model):
+        for fragment, latency in self.model_latency.items():
+            if fragment in model:
+                return latency
+        return self.latency
+
+    @staticmethod
+    def _map_prompt(req, fn):
+        """Copy of `req` with fn applied to the text of its last message."""
+        req = json.loads(json.dumps(req))
+        for message in req.get("messages", [])[-1:]:
+            message["content"] = fn(message.get("content", ""))
+        for content in req.get("contents", [])[-1:]:
+            for part in content.get("parts", []):
+                part["text"] = fn(part.get("text", ""))
+        return req
+
+    def degrade(self, model, req):
+        """For a sloppy model, sometimes the request with 40% of its [ID] lines marked to stay English."""
+        rate = next((p for fragment, p in self.sloppy.items() if fragment in model), 0.0)
+        with self._lock:
+            if not rate or self._random.random() >= rate:
+                return req
+        def mark(text):
+            out = []
+            for line in text.split("\n"):
+                if answer(line) != "好的" and self._random.random() < 0.4:
+                    head, _, rest = line.partition("]")
+                    line = f"{head}] {UNTRANSLATED}{rest.strip()}"
+                out.append(line)
+            return "\n".join(out)
+        with self._lock:
+            return self._map_prompt(req, mark)
+
+    def forget(self, req):
+        """The request with the [ID] lines the model will skip removed from its prompt."""
+        if self.drop_after is None:
+            return req
+        def thin(text):
+            kept, seen = [], 0
+            for line in text.split("\n"):
+                if answer(line) != "好的":  # an [ID] line
+                    seen += 1
+                    with self._lock:
+                        if seen > self.drop_after and self._random.random() < self.drop_rate:
+                            continue
+                kept.append(line)
+            return "\n".join(kept)
+        return self._map_prompt(req, thin)
+
+    def create_context(self, req):
+        system = "".join(p.get("text", "") for p in (req.get("systemInstruction") or {}).get("parts", []))
+        with self._lock:
+            name = f"cachedContents/mock{len(self._contexts) + 1}"
+            self._contexts[name] = system
+        return {"name": name, "model": req.get("model"), "usageMetadata": {"totalTokenCount": len(system) // 4}}
+
+    def _prefix_cached(self, text):
+        """Characters of `text` served from the automatic prefix cache; remembers its prefixes."""
+        hit = 0
+        with self._lock:
+            for end in range(PREFIX_MIN_CHARS, len(text) + 1, PREFIX_STEP_CHARS):
+                digest = hashlib.sha1(text[:end].encode("utf-8")).digest()
+                if digest in self._prefixes:
+                    hit = end
+                self._prefixes.add(digest)
+        return hit
+
+    def prompt_usage(self, path, req):
+        """(input tokens, cached input tokens) of a request; sleeps for the uncached prefill."""
+        if path.endswith("/chat/completions"):
+            text = "\n".join(m.get("content", "") for m in req.get("messages", []))
+            cached = self._prefix_cached(text) // 4
+        else:
+            system = "".join(p.get("text", "") for p in (req.get("systemInstruction") or {}).get("parts", []))
+            cached = 0
+            if req.get("cachedContent"):
+                with self._lock:
+                    system = self._contexts.get(req["cachedContent"], "")
+                cached = len(system) // 4
+            text = system + "".join(p.get("text", "") for c in req.get("contents", []) for p in c.get("parts", []))
+        tokens = len(text) // 4
+        with self._lock:
+            self.prompt_tokens += tokens
+            self.cached_tokens += cached
+        if self.prefill_per_1k:
+            time.sleep((tokens - cached) / 1000 * self.prefill_per_1k)
+        return tokens, cached
+
+    def clear_prompt_caches(self):
+        with self._lock:
+            self._prefixes.clear()
+            self._contexts.clear()
+
+    def end_request(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = 0
+            self.requests = 0
+            self.peak_in_flight = 0
+            self.rejected = 0
+            self._windows = {}
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+
+    @property
+    def base_url(self):
+        scheme = "https" if self.certfile else "http"
+        return f"{scheme}://localhost:{self.server_address[1]}/v1"
+
+    @property
+    def gemini_base_url(self):
+        scheme = "https" if self.certfile else "http"
+        return f"{scheme}://localhost:{self.server_address[1]}/v1beta"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # Clients killed mid-reply (benchmarks interrupting a run) are expected
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def _self_signed_cert():
+    """Creates a throwaway localhost certificate with the openssl CLI."""
+    path = os.path.join(tempfile.mkdtemp(), "mock.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+         "-keyout", path, "-out", path],
+        check=True, capture_output=True,
+    )
+    return path
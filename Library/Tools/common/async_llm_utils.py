@@ -0,0 +1,257 @@
+"""
+Asyncio LLM client.
+
+Same provider matrix and fallback cascade as LLMClient (OpenAI-compatible
+endpoints plus Gemini over REST), but every request is a coroutine on a
+single event loop, so a batch can keep hundreds of requests in flight
+without a thread per request. LLMClient.generate_batch delegates here when
+aiohttp is installed.
+
+Requests in flight default to the tier's batch workers (LLM_TIER, see
+tier_settings), the same cap the thread pool had; providers that limit
+concurrent requests answer a larger burst with 429s.
+
+Environment:
+    LLM_ASYNC_CONCURRENCY=N      maximum requests in flight per batch (default: the tier's max_workers)
+"""
+import os
+import time
+import asyncio
+from typing import List, Dict, Optional
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    aiohttp = None
+    HAS_AIOHTTP = False
+
+from singleflight import flight_key
+from llm_stream import StreamCollector, STREAM_ENABLED
+from context_cache import full_prompt, gemini_request
+from llm_utils import (LLMClient, LLMProvider, get_base_url, reserve_tokens, usage_tokens, is_rate_limit_error,
+                       openai_request, RATE_LIMIT_RETRIES, RATE_LIMIT_MAX_WAIT, GEMINI_API_BASE)
+
+# None: use the client's max_workers
+ASYNC_CONCURRENCY = int(os.environ["LLM_ASYNC_CONCURRENCY"]) if os.environ.get("LLM_ASYNC_CONCURRENCY") else None
+
+class AsyncLLMClient(LLMClient):
+    """
+    Coroutine version of LLMClient. `generate_content` and `generate_batch`
+    are async; configuration (.env cascade, tiers, timeouts) is inherited.
+    Use as `async with AsyncLLMClient() as client:` or call `aclose()`.
+    """
+    def __init__(self, api_key: Optional[str] = None, provider: Optional[LLMProvider] = None,
+                 concurrency: Optional[int] = ASYNC_CONCURRENCY):
+        super().__init__(api_key=api_key, provider=provider)
+        self._init_async(concurrency)
+
+    @classmethod
+    def from_client(cls, client: LLMClient, concurrency: Optional[int] = ASYNC_CONCURRENCY) -> "AsyncLLMClient":
+        """Async view of an existing LLMClient, sharing its keys, cascade and settings."""
+        self = cls.__new__(cls)
+        self.__dict__.update(client.__dict__)
+        self._init_async(concurrency)
+        return self
+
+    def _init_async(self, concurrency: Optional[int]):
+        if not HAS_AIOHTTP:
+            raise ImportError("AsyncLLMClient requires aiohttp (pip install aiohttp)")
+        self.concurrency = max(1, self.max_workers if concurrency is None else concurrency)
+        self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    def _get_http(self) -> "aiohttp.ClientSession":
+        """One keep-alive connection pool for all providers, sized to the concurrency limit."""
+        if self._http is None or self._http.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._http = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    async def _apost(self, provider: LLMProvider, model_name: str, url: str, headers: dict, data: dict,
+                     reserved: int, on_delta=None) -> dict:
+        """Coroutine version of LLMClient._post (rate limit, 429 retries, health, streaming)."""
+        limit = self._limit(provider, model_name)
+        try:
+            http = self._get_http()
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                await limit.acquire_async(reserved)
+                sent_at = time.monotonic()
+                async with http.post(url, headers=headers, json=data) as response:
+                    blocked = await limit.observe_async(response.status, response.headers, sent_at)
+                    if response.status == 429 and attempt < RATE_LIMIT_RETRIES and blocked <= RATE_LIMIT_MAX_WAIT:
+                        print(f"⏳ {limit.name} rate limited, retrying in {blocked:.1f}s...")
+                        continue
+                    response.raise_for_status()
+                    if on_delta is None:
+                        res_json = await response.json(content_type=None)
+                    else:
+                        collector = StreamCollector(on_delta, gemini=provider == LLMProvider.GEMINI)
+                        async for line in response.content:
+                            collector.feed_line(line.decode('utf-8'))
+                        res_json = collector.result()
+                break
+        except Exception as e:
+            limit.finish()
+            if not is_rate_limit_error(e):
+                self.health.record_failure(provider, model_name, e)
+            raise
+        self.health.record_success(provider, model_name, time.monotonic() - sent_at)
+        await limit.settle_async(reserved, usage_tokens(res_json))
+        self.usage.add(res_json)
+        return res_json
+
+    async def _acall_openai_compatible(self, model_name: str, prompt: str, base_url: str, api_key: str,
+                                       provider: LLMProvider = LLMProvider.OPENAI, on_delta=None,
+                                       system: Optional[str] = None) -> Optional[str]:
+        if not api_key:
+            print(f"❌ Error: API Key for {model_name} not found.")
+            return None
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        data = openai_request(provider, model_name, prompt, system, stream=on_delta is not None)
+
+        try:
+            res_json = await self._apost(provider, model_name, f"{base_url}/chat/completions", headers, data,
+                                         reserve_tokens(full_prompt(prompt, system)), on_delta)
+            return res_json['choices'][0]['message']['content'].strip()
+        except Exception as e:
+            print(f"❌ OpenAI-compatible API error ({model_name}): {e}")
+            return None
+
+    async def _agemini_context(self, model_name: str, system: Optional[str], api_key: str) -> Optional[str]:
+        """Coroutine version of LLMClient._gemini_context."""
+        if not system or self.context_caches is None:
+            return None
+
+        async def create():
+            async with self._get_http().post(f"{GEMINI_API_BASE}/cachedContents", headers={"x-goog-api-key": api_key},
+                                             json=self.context_caches.create_request(model_name, system)) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        return await self.context_caches.aget(model_name, system, create)
+
+    async def _acall_gemini(self, model_name: str, prompt: str, api_key: str, on_delta=None,
+                            system: Optional[str] = None) -> Optional[str]:
+        if not api_key:
+            print("❌ Error: Gemini API Key not found.")
+            return None
+
+        if on_delta is not None:
+            url = f"{GEMINI_API_BASE}/models/{model_name}:streamGenerateContent?alt=sse"
+        else:
+            url = f"{GEMINI_API_BASE}/models/{model_name}:generateContent"
+        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        cached = await self._agemini_context(model_name, system, api_key)
+        data = gemini_request(prompt, system, cached)
+
+        try:
+            res_json = await self._apost(LLMProvider.GEMINI, model_name, url, headers, data,
+                                         reserve_tokens(full_prompt(prompt, system)), on_delta)
+            parts = res_json['candidates'][0]['content']['parts']
+            text = "".join(p.get('text', '') for p in parts).strip()
+            return text or None
+        except Exception as e:
+            if cached:
+                self.context_caches.invalidate(model_name, system)
+            print(f"❌ Gemini API error: {e}")
+            # Raise exception to allow cascade catching
+            raise Exception(f"Gemini API Error: {e}")
+
+    async def _aexecute_provider_call(self, provider: LLMProvider, model_name: str, prompt: str, api_key: str,
+                                      on_delta=None, system: Optional[str] = None) -> Optional[str]:
+        if provider == LLMProvider.GEMINI:
+            return await self._acall_gemini(model_name, prompt, api_key, on_delta, system)
+        base_url = get_base_url(provider)
+        if base_url:
+            return await self._acall_openai_compatible(model_name, prompt, base_url, api_key, provider, on_delta,
+                                                       system)
+        return None
+
+    async def generate_content(self, prompt: str, model_name: Optional[str] = None, fallback: bool = True,
+                               on_delta=None, system: Optional[str] = None) -> Optional[str]:
+        on_delta = on_delta if STREAM_ENABLED else None
+        if self.flights is None:
+            return await self._agenerate_content(prompt, model_name, fallback, on_delta, system)
+        return await self.flights.ado(flight_key(full_prompt(prompt, system), model_name, fallback),
+                                      lambda: self._agenerate_content(prompt, model_name, fallback, on_delta, system))
+
+    async def _agenerate_content(self, prompt: str, model_name: Optional[str], fallback: bool,
+                                 on_delta=None, system: Optional[str] = None) -> Optional[str]:
+        cached = self._cache_lookup(full_prompt(prompt, system), model_name, fallback)
+        if cached is not None:
+            return cached
+        errors = []
+        # Queue depths are probed up front, concurrently and off the loop when a broker answers them
+        targets = self._rank_targets(self._build_targets(model_name, fallback), model_name)
+        probed = targets[:-1]  # the last target is tried regardless
+        waits = await asyncio.gather(*(self._limit(p, m).pending_delay_async() for p, _, m in probed))
+        delays = {(p, m): w for (p, _, m), w in zip(probed, waits)}
+        for provider, api_key, m_name in self._cascade(model_name, fallback, errors, targets, delays):
+            print(f"🔄 Executing LLM Call -> Provider: {provider.value}, Model: {m_name}")
+            try:
+                result = await self._aexecute_provider_call(provider, m_name, prompt, api_key, on_delta, system)
+                if result:
+                    self._cache_store(provider, m_name, full_prompt(prompt, system), result)
+                    return result
+                else:
+                    errors.append(f"{provider.value}: Returned empty or controlled failure.")
+            except Exception as e:
+                print(f"⚠️ Cascade Fallback Triggered. {provider.value} failed: {e}")
+                errors.append(f"{provider.value}: {str(e)}")
+                continue
+
+        raise Exception(f"❌ All LLM API fallbacks exhausted. Errors: {errors}")
+
+    async def generate_batch(self, tasks: List[Dict], model_name: str = "gemini-3.1-pro-preview",
+                             on_delta=None, on_result=None) -> List[Dict]:
+        total = len(tasks)
+        print(f"🚀 Starting batch generation for {total} items (In flight: {min(total, self.concurrency)}, Model: {model_name})...")
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def run(task):
+            async with slots:
+                try:
+                    stream = on_delta and (lambda text: on_delta(task, text))
+                    result = await self.generate_content(task['prompt'], model_name, on_delta=stream,
+                                                         system=task.get('system'))
+                    return {**task, 'result': result}
+                except Exception as e:
+                    return {**task, 'result': None, 'error': str(e)}
+
+        results = []
+        for completed, next_done in enumerate(asyncio.as_completed([run(t) for t in tasks]), 1):
+            results.append(await next_done)
+            if on_result:
+                on_result(results[-1])
+            print(f"   Progress: {completed}/{total} (chunks)", flush=True)
+
+        self._report_batch()
+        return results
+
+def run_batch(client: LLMClient, tasks: List[Dict], model_name: str, on_delta=None,
+              on_result=None) -> List[Dict]:
+    """Runs an async batch to completion for a sync LLMClient (used by LLMClient.generate_batch)."""
+    async_client = AsyncLLMClient.from_client(client)
+
+    async def _run():
+        try:
+            return await async_client.generate_batch(tasks, model_name, on_delta, on_result)
+        finally:
+            await async_client.aclose()
+
+    return asyncio.run(_run())
@@ -0,0 +1,210 @@
+"""
+Token-budget chunk planning for batch translation.
+
+Instead of a fixed number of subtitle blocks per LLM call, blocks are packed
+into chunks by estimated tokens (rate_limits.estimate_tokens) up to a budget
+per model. At scale 1.0 the budget is LLM_CHUNK_BLOCKS blocks of the batch's
+average length, where the old fixed `--chunk-size 50` stood, so typical text
+never needs more calls than before. It never exceeds what the model's context
+window and output limit allow once the prompt preamble and the expected
+translation are accounted for.
+
+The budget adapts to how reliably each model returns every `[ID]`. Each
+planned batch is one episode (like a throttling episode in rate_limits): if
+its chunks together lost more than DROP_TOLERANCE of their IDs, the model's
+scale shrinks by DECREASE_FACTOR; if all came back complete and the chunks
+actually filled the budget, it grows by INCREASE_FACTOR, so a model recovers
+from a bad run within a few batches; a few lost IDs leave it as it is.
+Scales persist between runs, so a model that drops lines gets smaller chunks
+from the start next time, and a reliable one is trusted with larger chunks
+and fewer calls.
+
+Environment:
+    LLM_CHUNK_BLOCKS=50          blocks of average length per chunk at scale 1.0
+    LLM_CHUNK_STATE              file the per-model scales persist to
+                                 (default ~/.cache/autosub/chunk_planner.json)
+"""
+import os
+import json
+import math
+import threading
+from typing import Dict, List, Optional
+
+from rate_limits import estimate_tokens
+
+BASE_BLOCKS = int(os.environ.get("LLM_CHUNK_BLOCKS", "50"))
+STATE_FILE = os.environ.get("LLM_CHUNK_STATE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "autosub", "chunk_planner.json")
+
+# Translated text costs about this many tokens per input token (English -> Chinese)
+OUTPUT_RATIO = 1.3
+# Share of the model's output limit a chunk's translation may use
+OUTPUT_FILL = 0.8
+# Tokens of one `[ID] text` line before any batch has been planned (about 12 words)
+TYPICAL_BLOCK_TOKENS = 20
+MIN_BLOCKS = 5
+MAX_BLOCKS = 200
+# A batch missing more than this share of its IDs counts as unreliable; a few
+# scattered gaps are cheaper to repair by ID than smaller chunks are to send
+DROP_TOLERANCE = 0.05
+DECREASE_FACTOR = 0.85
+INCREASE_FACTOR = 1.25
+MIN_SCALE = 0.25
+MAX_SCALE = 2.0
+# Weight of the newest chunk in the reported drop rate
+DROP_ALPHA = 0.2
+
+# (model name fragment, context window, max output tokens); first match wins.
+# Conservative published figures; unknown models get the last entry.
+MODEL_LIMITS = [
+    ("gemini-1.5", 1_000_000, 8_192),
+    ("gemini", 1_000_000, 65_536),
+    ("gpt-4o", 128_000, 16_384),
+    ("gpt-4", 128_000, 4_096),
+    ("gpt-3.5", 16_385, 4_096),
+    ("moonshot-v1-8k", 8_192, 4_096),
+    ("moonshot-v1-32k", 32_768, 8_192),
+    ("moonshot", 131_072, 8_192),
+    ("kimi", 131_072, 8_192),
+    ("qwen-max", 32_768, 8_192),
+    ("qwen", 131_072, 8_192),
+    ("glm", 128_000, 4_096),
+    ("deepseek", 64_000, 8_192),
+    ("", 32_768, 4_096),
+]
+
+def model_limits(model: Optional[str]) -> tuple:
+    """(context window, max output tokens) of a model."""
+    name = (model or "").lower()
+    for fragment, context, output in MODEL_LIMITS:
+        if fragment in name:
+            return context, output
+    return MODEL_LIMITS[-1][1:]
+
+class ChunkPlanner:
+    """Per-model chunk budget with persisted reliability scaling."""
+    def __init__(self, model: Optional[str], state_file: Optional[str] = STATE_FILE):
+        self.model = model or "default"
+        self.state_file = state_file
+        self.context, self.max_output = model_limits(model)
+        self._lock = threading.Lock()
+        state = self._load().get(self.model, {})
+        self.scale = min(MAX_SCALE, max(MIN_SCALE, float(state.get('scale', 1.0))))
+        self.drop_rate = float(state.get('drop_rate', 0.0))
+        self.chunks = int(state.get('chunks', 0))
+        # Average block cost of the last planned batch
+        self.typical = TYPICAL_BLOCK_TOKENS
+        # Current episode: [IDs expected, IDs missing, whether its chunks filled the budget]
+        self._episode = [0, 0, False]
+
+    def _load(self) -> Dict:
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Writes this model's scale back, keeping other models' entries (atomic replace)."""
+        if not self.state_file:
+            return
+        with self._lock:
+            self._settle()
+            state = self._load()
+            state[self.model] = {'scale': round(self.scale, 4), 'drop_rate': round(self.drop_rate, 4),
+                                 'chunks': self.chunks}
+            try:
+                os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+                tmp = f"{self.state_file}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f, indent=1)
+                os.replace(tmp, self.state_file)
+            except OSError as e:
+                print(f"⚠️ Could not save chunk planner state: {e}")
+
+    def budget(self, overhead: int = 0, typical: Optional[float] = None) -> int:
+        """
+        Input tokens of subtitle text per chunk, given `overhead` prompt tokens
+        around it and the `typical` tokens of one block (default: the average
+        of the last planned batch).
+        """
+        return max(1, int(self._budget(overhead, typical)))
+
+    def _budget(self, overhead: int, typical: Optional[float]) -> float:
+        by_blocks = BASE_BLOCKS * (typical or self.typical) * self.scale
+        by_output = self.max_output * OUTPUT_FILL / OUTPUT_RATIO
+        by_context = (self.context - overhead) / (1 + OUTPUT_RATIO)
+        return max(1.0, min(by_blocks, by_output, by_context))
+
+    def plan(self, costs: List[int], overhead: int = 0, learn: bool = True) -> List[range]:
+        """
+        Splits blocks with the given token costs into consecutive chunks
+        (ranges of indexes into `costs`). The chunk count is what the budget
+        requires; blocks are then spread evenly by tokens across the chunks.
+        With `learn` off (repairs of a few blocks) the chunks get the budget of
+        the last planned batch and are not an episode: their outcome is not
+        recorded.
+        """
+        if not costs:
+            return []
+        with self._lock:
+            self._settle()
+            total = sum(costs)
+            if learn:
+                self.typical = total / len(costs)
+            budget = self._budget(overhead, None)
+            # Rounded so that a budget of exactly N average blocks never yields an extra chunk
+            count = max(math.ceil(round(total / budget, 6)), math.ceil(len(costs) / MAX_BLOCKS))
+            count = min(count, max(1, len(costs) // MIN_BLOCKS))
+            target = total / count
+            # Small batches (retries of a few blocks) say nothing about larger chunks
+            self._episode[2] = learn and target >= budget / 2
+        chunks, start, filled = [], 0, 0
+        for i, cost in enumerate(costs):
+            size = i - start
+            if size and (size >= MAX_BLOCKS or (filled + cost / 2 > target and len(chunks) < count - 1)):
+                chunks.append(range(start, i))
+                start, filled = i, 0
+            filled += cost
+        chunks.append(range(start, len(costs)))
+        return chunks
+
+    def record(self, expected: int, missing: int):
+        """Outcome of one chunk whose call returned: `missing` of `expected` IDs absent."""
+        if expected <= 0:
+            return
+        rate = missing / expected
+        with self._lock:
+            self.chunks += 1
+            self.drop_rate += DROP_ALPHA * (rate - self.drop_rate)
+            self._episode[0] += expected
+            self._episode[1] += missing
+
+    def _settle(self):
+        """Applies the finished episode to the scale (caller holds the lock)."""
+        expected, missing, filled = self._episode
+        if missing > expected * DROP_TOLERANCE:
+            self.scale = max(MIN_SCALE, self.scale * DECREASE_FACTOR)
+        elif expected and not missing and filled:
+            self.scale = min(MAX_SCALE, self.scale * INCREASE_FACTOR)
+        self._episode = [0, 0, False]
+
+    def describe(self, overhead: int = 0) -> str:
+        return (f"~{self.budget(overhead)} tokens per chunk (model scale {self.scale:.2f}, "
+                f"ID drop rate {self.drop_rate:.1%})")
+
+def block_tokens(line: str) -> int:
+    """Estimated tokens of one `[ID] text` input line."""
+    return estimate_tokens(line) + 1
+
+_PLANNERS = {}
+_PLANNERS_LOCK = threading.Lock()
+
+def get_planner(model: Optional[str]) -> ChunkPlanner:
+    with _PLANNERS_LOCK:
+        planner = _PLANNERS.get(model)
+        if planner is None:
+            planner = _PLANNERS[model] = ChunkPlanner(model)
+        return planner
@@ -0,0 +1,163 @@
+"""
+Provider-side caching of the static part of a prompt.
+
+Callers that repeat a large instruction preamble (smart_translate's rule
+snippets) pass it as `system` and only the per-chunk text as the prompt.
+OpenAI-compatible providers get it as an identical leading system message,
+which their automatic prefix caches (OpenAI, DeepSeek, DashScope, ...)
+serve at a discount and without re-reading it. For Gemini the preamble is
+uploaded once as an explicit context cache (`cachedContents`) that every
+chunk references by name; if the model rejects it (too short, unsupported),
+calls fall back to an inline `systemInstruction`.
+
+Usage reported by the providers (cached vs. uncached input tokens) is
+summed per client and printed at the end of a batch.
+
+Environment:
+    LLM_CONTEXT_CACHE=0          no explicit Gemini caches (the system layout stays)
+    LLM_CONTEXT_CACHE_TTL=600    lifetime of a Gemini context cache, seconds
+"""
+import os
+import time
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+from rate_limits import estimate_tokens
+from singleflight import SingleFlight
+
+CONTEXT_CACHE_ENABLED = os.environ.get("LLM_CONTEXT_CACHE", "1") != "0"
+CONTEXT_CACHE_TTL = int(os.environ.get("LLM_CONTEXT_CACHE_TTL", "600"))
+# Gemini refuses explicit caches below this size (the smallest published minimum)
+GEMINI_MIN_CACHE_TOKENS = 1024
+# Handles are renewed this long before the provider expires them
+EXPIRY_MARGIN = 30
+
+def full_prompt(prompt: str, system: Optional[str]) -> str:
+    """The whole text a call sends, for cache keys and token estimates."""
+    return f"{system}\n\n{prompt}" if system else prompt
+
+def usage_breakdown(res_json: dict) -> Tuple[int, int]:
+    """(input tokens, of which served from the provider's prompt cache) of a response."""
+    usage = res_json.get('usage') or {}
+    if usage:
+        details = usage.get('prompt_tokens_details') or {}
+        cached = details.get('cached_tokens') or usage.get('prompt_cache_hit_tokens') or usage.get('cached_tokens') or 0
+        return usage.get('prompt_tokens') or 0, cached
+    meta = res_json.get('usageMetadata') or {}
+    return meta.get('promptTokenCount') or 0, meta.get('cachedContentTokenCount') or 0
+
+def gemini_request(prompt: str, system: Optional[str] = None, cached_content: Optional[str] = None) -> dict:
+    """generateContent body; a context cache already carries the system instruction."""
+    data = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if cached_content:
+        data["cachedContent"] = cached_content
+    elif system:
+        data["systemInstruction"] = {"parts": [{"text": system}]}
+    return data
+
+class GeminiContextCaches:
+    """
+    Explicit Gemini context caches, one per (model, system text). Concurrent
+    chunks wait for a single creation call; a failed creation is not retried
+    for that preamble.
+    """
+    def __init__(self, ttl: int = CONTEXT_CACHE_TTL):
+        self.ttl = ttl
+        self._handles = {}  # key -> (cache name, monotonic expiry)
+        self._unsupported = set()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.created = 0
+
+    @staticmethod
+    def _key(model: str, system: str) -> str:
+        return hashlib.sha256(f"{model}\n{system}".encode('utf-8')).hexdigest()
+
+    def create_request(self, model: str, system: str) -> dict:
+        return {"model": f"models/{model}", "systemInstruction": {"parts": [{"text": system}]},
+                "ttl": f"{self.ttl}s"}
+
+    def _usable(self, key: str, system: str) -> bool:
+        return key not in self._unsupported and estimate_tokens(system) >= GEMINI_MIN_CACHE_TOKENS
+
+    def _current(self, key: str) -> Optional[str]:
+        with self._lock:
+            handle = self._handles.get(key)
+        if handle and time.monotonic() < handle[1]:
+            return handle[0]
+        return None
+
+    def _store(self, key: str, res_json: dict) -> str:
+        name = res_json['name']
+        with self._lock:
+            self._handles[key] = (name, time.monotonic() + self.ttl - EXPIRY_MARGIN)
+            self.created += 1
+        return name
+
+    def _failed(self, key: str, model: str, error: Exception):
+        with self._lock:
+            if key in self._unsupported:
+                return  # coalesced callers share the leader's error
+            self._unsupported.add(key)
+        print(f"⚠️ Gemini context cache unavailable for {model}, sending the instructions inline: {error}")
+
+    def get(self, model: str, system: str, create) -> Optional[str]:
+        """Cache name for `system`; `create()` returns the cachedContents creation response."""
+        key = self._key(model, system)
+        if not self._usable(key, system):
+            return None
+        name = self._current(key)
+        if name:
+            return name
+        try:
+            return self._flights.do(key, lambda: self._current(key) or self._store(key, create()))
+        except Exception as e:
+            self._failed(key, model, e)
+            return None
+
+    async def aget(self, model: str, system: str, create) -> Optional[str]:
+        """Coroutine version of `get`; `create` is a coroutine function."""
+        key = self._key(model, system)
+        if not self._usable(key, system):
+            return None
+        name = self._current(key)
+        if name:
+            return name
+
+        async def make():
+            return self._current(key) or self._store(key, await create())
+        try:
+            return await self._flights.ado(key, make)
+        except Exception as e:
+            self._failed(key, model, e)
+            return None
+
+    def invalidate(self, model: str, system: str):
+        """Forgets a handle the provider no longer accepts (it is recreated on the next call)."""
+        with self._lock:
+            self._handles.pop(self._key(model, system), None)
+
+class PromptUsage:
+    """Input tokens reported by providers, and how many were served from their prompt caches."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def add(self, res_json: dict):
+        prompt, cached = usage_breakdown(res_json)
+        if not prompt:
+            return
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+
+    def summary(self) -> Optional[str]:
+        with self._lock:
+            if not self.prompt_tokens:
+                return None
+            return (f"{self.prompt_tokens:,} input tokens over {self.calls} call(s), "
+                    f"{self.cached_tokens / self.prompt_tokens:.0%} served from provider prompt cache")
@@ -0,0 +1,314 @@
+"""
+Compiled replacement rules from HARD_CONSTRAINTS.md (glossary fixes, text
+cleanup, banned AI phrasing, compliance terms).
+
+The rules are markdown table rows: | description | `pattern` | `replacement` | notes |.
+load_rules parses them once: code spans may contain `|`, header and
+separator rows are skipped, and rows inside HTML comments are inactive.
+Every pattern and replacement is compiled and checked at load time, and a
+broken rule is reported and skipped, not silently retried on every line.
+
+RuleEngine gives the same result as running re.sub for each rule in order,
+but in fewer passes over the text. Consecutive rules that cannot affect
+each other form one stage:
+- their character sets are disjoint;
+- no replacement can create, break or join a later rule's match;
+- no stage member after the first uses anchors, lookarounds or
+  backreferences.
+A stage's literal rules are merged into one trie-shaped alternation, looked
+up by matched text. Its regex rules become named alternatives, dispatched by
+group name. One scan per stage replaces one scan per rule. Rules that do
+interact (dashes to commas, then collapsing double commas) keep their own
+stage and run in order as before.
+
+smart_translate.humanize_text and apply_style.py share the engine.
+"""
+import os
+import re
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+HARD_CONSTRAINTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "HARD_CONSTRAINTS.md")
+
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_SEPARATOR_CELL = re.compile(r'^:?-+:?$')
+_HEADER_FIRST = ("description", "rule")
+_HEADER_SECOND = ("pattern", "replacement")
+_GROUP_REF = re.compile(r'\\(?:\d|g<)')
+_LEADING_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+
+# Characters \s matches in str patterns
+_WHITESPACE = [(0x09, 0x0d), (0x1c, 0x20), (0x85, 0x85), (0xa0, 0xa0), (0x1680, 0x1680), (0x2000, 0x200a),
+               (0x2028, 0x2029), (0x202f, 0x202f), (0x205f, 0x205f), (0x3000, 0x3000)]
+
+class Rule:
+    """One replacement; `literal` rules match their pattern text exactly."""
+    def __init__(self, pattern: str, replacement: str, description: str = "", literal: bool = False):
+        self.pattern = pattern
+        self.replacement = replacement
+        self.description = description or pattern
+        self.literal = literal
+        self.regex = re.compile(re.escape(pattern) if literal else pattern)
+        if literal:
+            self.expanded = replacement
+            self.template = replacement.replace('\\', '\\\\')
+        else:
+            self.template = replacement
+            # Group references and escapes are checked against the pattern now, not on first use
+            sre_parse.parse_template(replacement, self.regex)
+            self.expanded = None if _GROUP_REF.search(replacement) else re.compile('').sub(replacement, '', 1)
+        self._analyze()
+
+    def _analyze(self):
+        """Characters the rule reads and writes, and whether it may share a stage."""
+        self.combinable = True
+        self.contextual = False  # anchors, word boundaries or lookarounds
+        self.reads = []  # (lo, hi) code point ranges; None = any character
+        try:
+            parsed = sre_parse.parse(self.regex.pattern, self.regex.flags)
+            ignorecase = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+            self._walk(parsed, ignorecase)
+            self.min_width, self.max_width = parsed.getwidth()
+        except _Uncombinable:
+            self.combinable = False
+            return
+        if self.min_width == 0 or "(?P" in self.regex.pattern:
+            self.combinable = False
+        if self.expanded is not None:
+            self.writes = [(ord(c), ord(c)) for c in self.expanded]
+        else:
+            self.writes = None if self.reads is None else self.reads + [(ord(c), ord(c)) for c in self.template]
+        self.text = self.regex.pattern if self.literal else _literal_text(parsed)
+
+    def _add(self, lo: int, hi: int, ignorecase: bool):
+        if self.reads is None:
+            return
+        self.reads.append((lo, hi))
+        if ignorecase:
+            if hi - lo > 256:
+                self.reads = None
+                return
+            for code in range(lo, hi + 1):
+                for variant in {chr(code).lower(), chr(code).upper(), chr(code).casefold()}:
+                    if len(variant) == 1:
+                        self.reads.append((ord(variant), ord(variant)))
+
+    def _walk(self, sub, ignorecase: bool):
+        c = sre_constants
+        for op, av in sub:
+            if op is c.LITERAL:
+                self._add(av, av, ignorecase)
+            elif op is c.IN:
+                for item_op, item_av in av:
+                    if item_op is c.LITERAL:
+                        self._add(item_av, item_av, ignorecase)
+                    elif item_op is c.RANGE:
+                        self._add(item_av[0], item_av[1], ignorecase)
+                    elif item_op is c.CATEGORY and item_av is c.CATEGORY_SPACE:
+                        for lo, hi in _WHITESPACE:
+                            self._add(lo, hi, False)
+                    else:  # NEGATE, other categories
+                        self.reads = None
+            elif op in (c.ANY, c.NOT_LITERAL):
+                self.reads = None
+            elif op is c.BRANCH:
+                for branch in av[1]:
+                    self._walk(branch, ignorecase)
+            elif op is c.SUBPATTERN:
+                _, add_flags, del_flags, pattern = av
+                scoped = (ignorecase or add_flags & c.SRE_FLAG_IGNORECASE) and not del_flags & c.SRE_FLAG_IGNORECASE
+                self._walk(pattern, bool(scoped))
+            elif op in (c.MAX_REPEAT, c.MIN_REPEAT, getattr(c, 'POSSESSIVE_REPEAT', None)):
+                self._walk(av[2], ignorecase)
+            elif op is getattr(c, 'ATOMIC_GROUP', None):
+                self._walk(av, ignorecase)
+            elif op in (c.ASSERT, c.ASSERT_NOT):
+                self.contextual = True
+                self._walk(av[1], ignorecase)
+            elif op is c.AT:
+                self.contextual = True
+            else:  # backreferences, conditionals
+                raise _Uncombinable()
+
+    def apply(self, text: str) -> str:
+        return self.regex.sub(self.template, text)
+
+class _Uncombinable(Exception):
+    pass
+
+def _literal_text(parsed) -> Optional[str]:
+    """The exact text a pattern matches, if it is a plain case-sensitive string."""
+    if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    chars = []
+    for op, av in parsed:
+        if op is not sre_constants.LITERAL:
+            return None
+        chars.append(chr(av))
+    return "".join(chars)
+
+def _ranges_overlap(a, b) -> bool:
+    if a is None or b is None:
+        return True
+    return any(lo1 <= hi2 and lo2 <= hi1 for lo1, hi1 in a for lo2, hi2 in b)
+
+def _text_overlap(a: str, b: str) -> bool:
+    """Whether occurrences of `a` and `b` can share characters in some text."""
+    if not a or not b:
+        return False
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+def _interferes(earlier: Rule, later: Rule) -> bool:
+    """Whether applying `earlier` first can change what `later` matches."""
+    if earlier.writes is not None and not earlier.writes and later.max_width >= 2:
+        return True  # a deletion joins its neighbours into new text
+    if earlier.text is not None and later.text is not None:
+        return _text_overlap(earlier.text, later.text) or \
+            (earlier.expanded is not None and _text_overlap(earlier.expanded, later.text))
+    return _ranges_overlap(earlier.reads, later.reads) or _ranges_overlap(earlier.writes, later.reads)
+
+def _trie_pattern(words: Sequence[str]) -> str:
+    """One alternation matching any of `words`, with shared prefixes factored out."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+    return build(trie)
+
+def _scoped(pattern: str) -> str:
+    """`pattern` with leading global flags turned into a scoped group, so it can be an alternative."""
+    match = _LEADING_FLAGS.match(pattern)
+    if match:
+        return f"(?{match.group(1)}:{pattern[match.end():]})"
+    return f"(?:{pattern})"
+
+class _Stage:
+    """Several non-interfering rules applied in one scan."""
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.literals = {r.text: r.expanded for r in rules if r.text is not None and r.expanded is not None}
+        self.named = {}
+        parts = []
+        if self.literals:
+            parts.append(f"(?P<lit>{_trie_pattern(list(self.literals))})")
+        for n, rule in enumerate(r for r in rules if r.text is None or r.expanded is None):
+            self.named[f"r{n}"] = rule
+            parts.append(f"(?P<r{n}>{_scoped(rule.regex.pattern)})")
+        self.regex = re.compile("|".join(parts))
+
+    def _replace(self, match) -> str:
+        name = match.lastgroup
+        if name == "lit":
+            return self.literals[match.group()]
+        rule = self.named[name]
+        if rule.expanded is not None:
+            return rule.expanded
+        return rule.regex.match(match.string, match.start()).expand(rule.template)
+
+    def apply(self, text: str) -> str:
+        return self.regex.sub(self._replace, text)
+
+class RuleEngine:
+    """Ordered replacement rules, compiled into as few passes as their interactions allow."""
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+        groups = []
+        for rule in self.rules:
+            group = groups[-1] if groups else None
+            if group and rule.combinable and not rule.contextual and group[0].combinable \
+                    and not any(_interferes(earlier, rule) for earlier in group):
+                group.append(rule)
+            else:
+                groups.append([rule])
+        self.passes = []
+        for group in groups:
+            if len(group) == 1:
+                self.passes.append(group[0].apply)
+                continue
+            try:
+                self.passes.append(_Stage(group).apply)
+            except re.error:
+                self.passes.extend(rule.apply for rule in group)
+
+    def apply(self, text: str) -> str:
+        for apply in self.passes:
+            text = apply(text)
+        return text
+
+    def describe(self) -> str:
+        return f"{len(self.rules)} rule(s) in {len(self.passes)} pass(es)"
+
+def _split_row(line: str) -> List[str]:
+    """Cells of a markdown table row; `|` inside code spans or escaped as \\| does not split."""
+    cells, cell, code, prev = [], [], False, ""
+    for ch in line.strip()[1:]:
+        if ch == '`':
+            code = not code
+        if ch == '|' and not code and prev != '\\':
+            cells.append("".join(cell).strip())
+            cell = []
+        else:
+            cell.append(ch)
+        prev = ch
+    if "".join(cell).strip():
+        cells.append("".join(cell).strip())
+    return cells
+
+def load_rules(filepath: str = HARD_CONSTRAINTS_PATH) -> List[Rule]:
+    """Active rules of a HARD_CONSTRAINTS.md-style file, in file order. Broken rules are reported and skipped."""
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = _HTML_COMMENT.sub('', f.read())
+    rules = []
+    for line in content.splitlines():
+        if not line.strip().startswith('|'):
+            continue
+        cells = _split_row(line)
+        if len(cells) < 2 or all(_SEPARATOR_CELL.match(cell) for cell in cells):
+            continue
+        if cells[0].lower() in _HEADER_FIRST or cells[1].lower() in _HEADER_SECOND \
+                or cells[0].lower().startswith("original"):
+            continue
+        pattern = cells[1].strip('`').replace(r'\|', '|')
+        replacement = cells[2].strip('`').replace(r'\|', '|') if len(cells) > 2 else ""
+        if not pattern:
+            continue
+        try:
+            rules.append(Rule(pattern, replacement, cells[0]))
+        except (re.error, IndexError) as e:
+            print(f"⚠️ {os.path.basename(filepath)}: skipping rule '{cells[0]}' ({pattern}): {e}")
+    return rules
+
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+def get_engine(filepath: str = HARD_CONSTRAINTS_PATH, literals: Sequence[Tuple[str, str]] = ()) -> RuleEngine:
+    """Engine for the file's rules followed by plain-text `literals` (old, new) replacements."""
+    key = (os.path.abspath(filepath), tuple(literals))
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is None:
+            rules = load_rules(filepath) + [Rule(old, new, literal=True) for old, new in literals]
+            engine = _ENGINES[key] = RuleEngine(rules)
+        return engine
@@ -0,0 +1,92 @@
+"""
+Interval-join engine for subtitle tracks.
+
+Matches every cue of one track against the cues of another in a single
+pass over sorted millisecond arrays. Candidate ranges are found by binary
+search (searchsorted), so the cost is O((n + m) log m + matches) instead of
+scanning the other track per cue.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+def _sorted_view(starts, ends):
+    """
+    Returns (order, sorted_starts, prefix_max_ends, sorted_ends). `order` maps
+    sorted positions back to original cue positions (None if already sorted).
+    """
+    n = len(starts)
+    if all(starts[i] <= starts[i + 1] for i in range(n - 1)):
+        order = None
+        s = starts
+        e = ends
+    else:
+        order = sorted(range(n), key=starts.__getitem__)
+        s = array('q', (starts[i] for i in order))
+        e = array('q', (ends[i] for i in order))
+    # Ends are not monotonic in general; the running max is, so it can be bisected
+    return order, s, array('q', accumulate(e, max)), e
+
+def candidate_ranges(src_starts, src_ends, ref_starts, ref_ends):
+    """
+    For every source interval, finds the half-open range [lo, hi) of reference
+    intervals (in start-sorted order) that can possibly overlap it.
+    Returns (order, sorted_ref_starts, sorted_ref_ends, lows, highs).
+    """
+    order, s, max_e, e = _sorted_view(ref_starts, ref_ends)
+    lows = array('q', (bisect_left(max_e, st) for st in src_starts))
+    highs = array('q', (bisect_right(s, en) for en in src_ends))
+    return order, s, e, lows, highs
+
+def overlap_join(src_starts, src_ends, ref_starts, ref_ends, min_ratio=0.3, min_overlap_ms=500):
+    """
+    Matches each source interval to all reference intervals that overlap it
+    significantly: overlap > `min_ratio` of the reference duration, or
+    overlap > `min_overlap_ms`. All times are integer milliseconds.
+
+    Returns a list (one entry per source interval) of matched reference
+    positions, in reference start order.
+    """
+    order, s, e, lows, highs = candidate_ranges(src_starts, src_ends, ref_starts, ref_ends)
+    ratio_num = round(min_ratio * 1000)
+
+    matches = []
+    for st, en, lo, hi in zip(src_starts, src_ends, lows, highs):
+        hits = [
+            j for j in range(lo, hi)
+            if _significant(min(en, e[j]) - max(st, s[j]), e[j] - s[j], ratio_num, min_overlap_ms)
+        ]
+        if order is not None:
+            hits = [order[j] for j in hits]
+        matches.append(hits)
+    return matches
+
+def _significant(overlap, ref_duration, ratio_num, min_overlap_ms):
+    if overlap <= 0:
+        return False
+    # Integer form of overlap / ref_duration > ratio (ratio_num is in thousandths)
+    if ref_duration > 0 and overlap * 1000 > ratio_num * ref_duration:
+        return True
+    return overlap > min_overlap_ms
+
+def best_overlap(src_starts, src_ends, ref_starts, ref_ends, min_overlap_ms=100):
+    """
+    For each source interval, returns the position of the reference interval
+    with the largest overlap (first one wins on ties), or -1 if no overlap
+    exceeds `min_overlap_ms`.
+    """
+    order, s, e, lows, highs = candidate_ranges(src_starts, src_ends, ref_starts, ref_ends)
+
+    best = array('q')
+    for st, en, lo, hi in zip(src_starts, src_ends, lows, highs):
+        best_key = (0, 0)
+        best_j = -1
+        for j in range(lo, hi):
+            pos = j if order is None else order[j]
+            # Largest overlap wins; ties go to the earliest cue in the original track
+            key = (min(en, e[j]) - max(st, s[j]), -pos)
+            if key[0] > 0 and (best_j == -1 or key > best_key):
+                best_key = key
+                best_j = pos
+        best.append(best_j if best_key[0] > min_overlap_ms else -1)
+    return best
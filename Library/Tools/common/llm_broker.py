@@ -0,0 +1,598 @@
+"""
+Local broker shared by the LLM clients of several processes.
+
+autosub_batch runs one smart_translate process per video. The broker is a
+small server inside the batch process (multiprocessing.connection: a Unix
+socket, or a named pipe on Windows) which the child processes find through
+the environment. It provides:
+
+Global rate limits. Every request is leased from the broker first. The broker
+keeps one RPM/TPM budget per provider/model (rate_limits.ProviderLimit, so
+headers and 429s adapt the shared budget) and a global cap on requests in
+flight (`--max-api-calls`). Waiting leases are granted round-robin between
+videos, so one long video cannot starve the others.
+
+Request coalescing. The first process to claim a request key makes the call
+and the others wait for its answer (see singleflight.py).
+
+Status. `python llm_broker.py status` (or a ("status",) request) reports
+budgets, requests in flight and queue depth per provider and video.
+
+Protocol (one connection per exchange):
+    ("lease", client, provider, model, tokens) -> ("grant",), then the client
+        sends ("release", status, rate headers) -> ("ok", seconds blocked)
+    ("settle", provider, model, reserved, actual)     token usage correction
+    ("delay", provider, model) -> seconds a new lease would wait
+    ("claim", key) -> ("leader",) | ("follower",); a leader then sends
+        ("done", text) or ("failed", message), which every follower receives
+        (or ("retry",) if the leader disappeared)
+    ("stats",) / ("status",) -> dict
+
+Environment (exported by the broker owner for its children):
+    AUTOSUB_LLM_BROKER=...       listener address
+    AUTOSUB_LLM_BROKER_KEY=...   hex auth key
+    AUTOSUB_LLM_CLIENT=...       name this process is scheduled under (default: pid)
+    LLM_BROKER_LIMITS=0          coalesce through the broker but keep rate limits per process
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import secrets
+import tempfile
+import threading
+import contextvars
+import concurrent.futures
+from collections import OrderedDict, deque
+from multiprocessing.connection import Listener, Client
+
+from rate_limits import RateLimitRegistry
+
+BROKER_ENV = "AUTOSUB_LLM_BROKER"
+BROKER_KEY_ENV = "AUTOSUB_LLM_BROKER_KEY"
+CLIENT_ENV = "AUTOSUB_LLM_CLIENT"
+BROKER_LIMITS = os.environ.get("LLM_BROKER_LIMITS", "1") != "0"
+# Where a running broker records its address, for the status command
+STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "autosub", "llm_broker.json")
+
+def _new_address():
+    if sys.platform == "win32":
+        return rf"\\.\pipe\autosub-llm-{os.getpid()}-{secrets.token_hex(4)}"
+    return os.path.join(tempfile.mkdtemp(prefix="autosub-llm-"), "broker.sock")
+
+def _rate_headers(headers):
+    """The rate-limit headers of a response, as a plain dict with lowercase keys."""
+    if not headers:
+        return {}
+    return {k.lower(): v for k, v in headers.items()
+            if k.lower().startswith('x-ratelimit') or k.lower() == 'retry-after'}
+
+class _Waiter:
+    __slots__ = ('client', 'tokens', 'event', 'granted_at')
+
+    def __init__(self, client, tokens):
+        self.client = client
+        self.tokens = tokens
+        self.event = threading.Event()
+        self.granted_at = None
+
+class _Quota:
+    """Budget, in-flight count and per-client queues of one provider/model."""
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.granted = 0
+        self.queues = OrderedDict()  # client -> deque of waiters, in round-robin order
+
+    def head(self):
+        for queue in self.queues.values():
+            return queue[0]
+        return None
+
+    def pop_head(self):
+        client, queue = next(iter(self.queues.items()))
+        waiter = queue.popleft()
+        # The client goes to the back of the round
+        del self.queues[client]
+        if queue:
+            self.queues[client] = queue
+        return waiter
+
+    def remove(self, waiter):
+        queue = self.queues.get(waiter.client)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self.queues[waiter.client]
+
+    def queued(self):
+        return sum(len(q) for q in self.queues.values())
+
+class LLMBroker:
+    """
+    Broker server. `start()` serves from daemon threads; `export()` advertises
+    it to child processes. `max_in_flight` caps requests in flight across all
+    processes and providers (0 = no cap); budgets come from `default_rpm` and
+    the LLM_RPM*/LLM_TPM* environment, as in LLMClient.
+    """
+    def __init__(self, default_rpm: float = 0, max_in_flight: int = 0, address=None):
+        self.address = address or _new_address()
+        self.authkey = secrets.token_bytes(16)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self.limits = RateLimitRegistry(default_rpm)
+        self.max_in_flight = max(0, int(max_in_flight or 0))
+        self._quotas = OrderedDict()  # (provider, model) -> _Quota
+        self._in_flight = 0
+        self._flights = {}  # coalescing: key -> follower connections
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._closed = False
+        self._state_file = None
+        self.started = time.time()
+        self.leases = 0
+        self.claims = 0
+        self.coalesced = 0
+
+    def start(self):
+        threading.Thread(target=self._serve, name="llm-broker", daemon=True).start()
+        threading.Thread(target=self._dispatch, name="llm-broker-dispatch", daemon=True).start()
+        return self
+
+    def export(self, env=None, state_file=STATE_FILE):
+        """Advertises the broker to child processes (and to `llm_broker.py status`)."""
+        env = os.environ if env is None else env
+        env[BROKER_ENV] = self.address
+        env[BROKER_KEY_ENV] = self.authkey.hex()
+        if state_file:
+            try:
+                os.makedirs(os.path.dirname(state_file), exist_ok=True)
+                fd = os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    json.dump({'address': self.address, 'key': self.authkey.hex(), 'pid': os.getpid()}, f)
+                self._state_file = state_file
+            except OSError:
+                pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._listener.close()
+        if self._state_file:
+            try:
+                os.remove(self._state_file)
+            except OSError:
+                pass
+        if sys.platform != "win32":
+            shutil.rmtree(os.path.dirname(self.address), ignore_errors=True)
+
+    def _serve(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # Listener closed, or a client failed authentication
+                if self._closed:
+                    return
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            return
+        kind = msg[0]
+        if kind == "claim":
+            self._claim(conn, msg[1])  # owns the connection from here on
+            return
+        try:
+            if kind == "lease":
+                self._lease(conn, *msg[1:])
+            elif kind == "settle":
+                _, provider, model, reserved, actual = msg
+                self.limits.get(provider, model).settle(reserved, actual)
+            elif kind == "delay":
+                conn.send(self.limits.get(msg[1], msg[2]).pending_delay())
+            elif kind == "stats":
+                conn.send(self.stats())
+            elif kind == "status":
+                conn.send(self.status())
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    # --- Rate limits ---
+
+    def _quota(self, provider, model):
+        key = (provider, model)
+        quota = self._quotas.get(key)
+        if quota is None:
+            quota = self._quotas[key] = _Quota(self.limits.get(provider, model))
+        return quota
+
+    def _lease(self, conn, client, provider, model, tokens):
+        waiter = _Waiter(client, tokens)
+        with self._cond:
+            quota = self._quota(provider, model)
+            quota.queues.setdefault(client, deque()).append(waiter)
+            self.leases += 1
+            self._cond.notify_all()
+        try:
+            waiter.event.wait()
+            if waiter.granted_at is None:
+                return  # broker closing
+            conn.send(("grant",))
+            try:
+                reply = conn.recv()
+            except (EOFError, OSError):
+                reply = None  # client gone or call aborted: just free the slot
+            blocked = 0.0
+            if reply and reply[0] == "release" and reply[1] is not None:
+                blocked = quota.limit.observe(reply[1], reply[2], waiter.granted_at)
+            if reply is not None:
+                conn.send(("ok", blocked))
+        finally:
+            with self._cond:
+                if waiter.granted_at is None:
+                    quota.remove(waiter)
+                else:
+                    quota.in_flight -= 1
+                    self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _dispatch(self):
+        """Grants leases while budgets and the in-flight cap allow, round-robin between clients."""
+        with self._cond:
+            while not self._closed:
+                wake = None
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for quota in self._quotas.values():
+                        if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                            break
+                        waiter = quota.head()
+                        if waiter is None:
+                            continue
+                        delay = quota.limit.try_reserve(waiter.tokens)
+                        if delay > 0:
+                            wake = delay if wake is None else min(wake, delay)
+                            continue
+                        quota.pop_head()
+                        quota.in_flight += 1
+                        quota.granted += 1
+                        self._in_flight += 1
+                        waiter.granted_at = time.monotonic()
+                        waiter.event.set()
+                        progressed = True
+                self._cond.wait(timeout=wake)
+            # Closing: wake every waiter so its handler can exit
+            for quota in self._quotas.values():
+                for queue in quota.queues.values():
+                    for waiter in queue:
+                        waiter.event.set()
+
+    # --- Coalescing ---
+
+    def _claim(self, conn, key):
+        with self._lock:
+            self.claims += 1
+            followers = self._flights.get(key)
+            if followers is not None:
+                # Sent under the lock so it precedes the leader's answer; the
+                # leader's handler answers (and closes) this connection
+                try:
+                    conn.send(("follower",))
+                    followers.append(conn)
+                    self.coalesced += 1
+                except OSError:
+                    conn.close()
+                return
+            self._flights[key] = []
+
+        try:
+            conn.send(("leader",))
+            reply = conn.recv()
+        except (EOFError, OSError):
+            reply = ("retry",)
+        finally:
+            conn.close()
+        with self._lock:
+            followers = self._flights.pop(key, [])
+        for follower in followers:
+            try:
+                follower.send(reply)
+            except OSError:
+                pass
+            follower.close()
+
+    # --- Status ---
+
+    def stats(self):
+        with self._lock:
+            return {'claims': self.claims, 'coalesced': self.coalesced, 'leases': self.leases,
+                    'in_flight': self._in_flight}
+
+    def status(self):
+        """Budgets, requests in flight and queue depth per provider/model and client."""
+        with self._lock:
+            quotas = {}
+            for quota in self._quotas.values():
+                limit = quota.limit
+                quotas[limit.name] = {
+                    'rpm': round(limit.requests.per_minute, 1),
+                    'tpm': round(limit.tokens.per_minute, 1),
+                    'learned': limit.learned,
+                    'in_flight': quota.in_flight,
+                    'granted': quota.granted,
+                    'queued': quota.queued(),
+                    'queued_by_client': {c: len(q) for c, q in quota.queues.items()},
+                    'throttled': limit.throttled,
+                    'wait': round(limit.pending_delay(), 2),
+                }
+            return {
+                'pid': os.getpid(),
+                'uptime': round(time.time() - self.started, 1),
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queued': sum(q['queued'] for q in quotas.values()),
+                'leases': self.leases,
+                'claims': self.claims,
+                'coalesced': self.coalesced,
+                'quotas': quotas,
+            }
+
+class RemoteLimit:
+    """
+    Client side of a broker lease, with the interface of rate_limits.ProviderLimit
+    (acquire / acquire_async / observe / settle / finish / pending_delay, and
+    the *_async variants) so LLMClient can use either. The async variants run
+    their broker round trips in lease_executor, off the event loop. Falls
+    back to the local limit if the broker goes away.
+    """
+    def __init__(self, broker: "BrokerClient", provider: str, model: str, fallback):
+        self.broker = broker
+        self.provider = provider
+        self.model = model
+        self.fallback = fallback
+        self.name = f"{provider}/{model}"
+        # Lease connection of the current call; a context variable so threads and asyncio tasks each have their own
+        self._lease = contextvars.ContextVar(f"lease:{self.name}", default=None)
+
+    @property
+    def throttled(self):
+        return self.fallback.throttled
+
+    def _open_lease(self, tokens):
+        conn = self.broker.connect()
+        try:
+            conn.send(("lease", self.broker.client, self.provider, self.model, tokens))
+            conn.recv()  # ("grant",)
+            return conn
+        except Exception:
+            conn.close()
+            raise
+
+    def _broken(self, e):
+        if not self.broker.broken:
+            print(f"⚠️ LLM broker unreachable, rate limiting within this process only: {e}")
+        self.broker.broken = True
+
+    def acquire(self, tokens: int = 0) -> float:
+        self.finish()
+        if self.broker.broken:
+            return self.fallback.acquire(tokens)
+        start = time.monotonic()
+        try:
+            self._lease.set(self._open_lease(tokens))
+        except Exception as e:
+            self._broken(e)
+            return self.fallback.acquire(tokens)
+        return time.monotonic() - start
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        self.finish()
+        if self.broker.broken:
+            return await self.fallback.acquire_async(tokens)
+        start = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            self._lease.set(await loop.run_in_executor(self.broker.lease_executor, self._open_lease, tokens))
+        except Exception as e:
+            self._broken(e)
+            return await self.fallback.acquire_async(tokens)
+        return time.monotonic() - start
+
+    @staticmethod
+    def _release(conn, status, rate_headers) -> float:
+        try:
+            conn.send(("release", status, rate_headers))
+            return conn.recv()[1]
+        except Exception:
+            return 0.0
+        finally:
+            conn.close()
+
+    def observe(self, status: int, headers=None, sent_at: float = None) -> float:
+        conn = self._lease.get()
+        if conn is None:
+            return self.fallback.observe(status, headers, sent_at)
+        self._lease.set(None)
+        blocked = self._release(conn, status, _rate_headers(headers))
+        if status == 429:
+            self.fallback.throttled += 1
+        return blocked
+
+    async def observe_async(self, status: int, headers=None, sent_at: float = None) -> float:
+        # The lease lives in this task's context; executor threads do not see it
+        conn = self._lease.get()
+        if conn is None:
+            return self.fallback.observe(status, headers, sent_at)
+        self._lease.set(None)
+        loop = asyncio.get_running_loop()
+        blocked = await loop.run_in_executor(self.broker.lease_executor, self._release, conn, status,
+                                             _rate_headers(headers))
+        if status == 429:
+            self.fallback.throttled += 1
+        return blocked
+
+    def finish(self):
+        """Frees a lease whose call ended without a response."""
+        conn = self._lease.get()
+        if conn is not None:
+            self._lease.set(None)
+            try:
+                conn.send(("release", None, None))
+            except OSError:
+                pass
+            conn.close()
+
+    def settle(self, reserved: int, actual):
+        if actual is None or actual == reserved or self.broker.broken:
+            return
+        self.broker.send(("settle", self.provider, self.model, reserved, actual))
+
+    async def settle_async(self, reserved: int, actual):
+        if actual is None or actual == reserved or self.broker.broken:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.broker.lease_executor, self.broker.send,
+                                   ("settle", self.provider, self.model, reserved, actual))
+
+    def pending_delay(self) -> float:
+        if self.broker.broken:
+            return self.fallback.pending_delay()
+        try:
+            return self.broker.request(("delay", self.provider, self.model))
+        except Exception:
+            return 0.0
+
+    async def pending_delay_async(self) -> float:
+        if self.broker.broken:
+            return self.fallback.pending_delay()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.broker.lease_executor, self.pending_delay)
+
+class BrokerClient:
+    """Connection factory for a broker advertised in the environment."""
+    def __init__(self, address: str, authkey: bytes, client: str = None):
+        self.address = address
+        self.authkey = authkey
+        self.client = client or os.environ.get(CLIENT_ENV) or f"pid {os.getpid()}"
+        self.broken = False
+        self._limits = {}
+        self._lock = threading.Lock()
+        # Async callers wait for the broker in these threads. They are kept off asyncio's
+        # default executor (aiohttp resolves hosts there) and apart from each other, so
+        # waiting leases or coalesced calls can never starve the calls they wait for.
+        self.lease_executor = concurrent.futures.ThreadPoolExecutor(64, thread_name_prefix="llm-lease")
+        self.claim_executor = concurrent.futures.ThreadPoolExecutor(64, thread_name_prefix="llm-claim")
+
+    def connect(self):
+        return Client(self.address, authkey=self.authkey)
+
+    def request(self, msg):
+        conn = self.connect()
+        try:
+            conn.send(msg)
+            return conn.recv()
+        finally:
+            conn.close()
+
+    def send(self, msg):
+        try:
+            conn = self.connect()
+        except Exception:
+            return
+        try:
+            conn.send(msg)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def claim(self, key: str):
+        """Returns (connection, "leader" | "follower"); the caller finishes the exchange."""
+        conn = self.connect()
+        try:
+            conn.send(("claim", key))
+            return conn, conn.recv()[0]
+        except Exception:
+            conn.close()
+            raise
+
+    def limit(self, provider, model: str, fallback) -> RemoteLimit:
+        provider = getattr(provider, 'value', provider)
+        with self._lock:
+            limit = self._limits.get((provider, model))
+            if limit is None:
+                limit = self._limits[(provider, model)] = RemoteLimit(self, provider, model, fallback)
+            return limit
+
+    def stats(self):
+        return self.request(("stats",))
+
+    def status(self):
+        return self.request(("status",))
+
+def broker_from_env():
+    """BrokerClient for the broker advertised by a parent process, or None."""
+    address = os.environ.get(BROKER_ENV)
+    key = os.environ.get(BROKER_KEY_ENV)
+    if not address or not key:
+        return None
+    try:
+        return BrokerClient(address, bytes.fromhex(key))
+    except ValueError:
+        return None
+
+def _broker_from_state_file(path=STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        return BrokerClient(state['address'], bytes.fromhex(state['key']))
+    except (OSError, ValueError, KeyError):
+        return None
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Status of the running autosub_batch LLM broker")
+    parser.add_argument('cmd', choices=['status'])
+    parser.add_argument('--json', action='store_true', help="Print the raw status")
+    parser.add_argument('--watch', type=float, default=0, help="Refresh every N seconds")
+    args = parser.parse_args()
+
+    broker = broker_from_env() or _broker_from_state_file()
+    if broker is None:
+        print("❌ No LLM broker running (start autosub_batch first).")
+        sys.exit(1)
+    while True:
+        try:
+            status = broker.status()
+        except Exception as e:
+            print(f"❌ LLM broker unreachable: {e}")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(status, indent=2, ensure_ascii=False))
+        else:
+            cap = status['max_in_flight'] or "∞"
+            print(f"📡 LLM broker (pid {status['pid']}, up {status['uptime']:.0f}s): "
+                  f"{status['in_flight']}/{cap} in flight, {status['queued']} queued, "
+                  f"{status['coalesced']} coalesced")
+            for name, q in status['quotas'].items():
+                rpm = f"{q['rpm']:.0f} RPM" if q['rpm'] else "no RPM limit"
+                print(f"   {name:<40} {rpm:>14}  in flight {q['in_flight']:>3}  queued {q['queued']:>4}  "
+                      f"429s {q['throttled']:>3}  wait {q['wait']:.1f}s")
+                for client, n in q['queued_by_client'].items():
+                    print(f"      {client}: {n} queued")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+if __name__ == "__main__":
+    main()
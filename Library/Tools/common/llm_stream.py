@@ -0,0 +1,162 @@
+"""
+Streaming (server-sent events) LLM replies.
+
+LLMClient streams a reply when `generate_content`/`generate_batch` get an
+`on_delta` callback: OpenAI-compatible endpoints with `"stream": true`,
+Gemini through `:streamGenerateContent?alt=sse`. StreamCollector turns the
+event stream back into the shape of a non-streamed response, so callers
+parse both the same way, and hands every text delta to the callback.
+
+IDLineParser consumes those deltas and returns each `[ID] text` block as
+soon as its line is complete, so translation progress and skipped IDs are
+visible before the chunk finishes. Streamed blocks are provisional: the
+complete reply (which may come from a fallback provider, the cache or a
+coalesced call) is what gets applied.
+
+Environment:
+    LLM_STREAM=0                 never stream; on_delta callbacks are ignored
+"""
+import os
+import re
+import json
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+STREAM_ENABLED = os.environ.get("LLM_STREAM", "1") != "0"
+
+ID_LINE = re.compile(r'\[(\d+)\]\s*(.*)')
+
+def parse_id_line(line: str) -> Optional[Tuple[str, str]]:
+    """(id, text) of a `[ID] text` line, or None (also for an empty translation)."""
+    match = ID_LINE.match(line.strip())
+    if match:
+        content = match.group(2).strip()
+        if content:
+            return match.group(1), content
+    return None
+
+def parse_id_lines(text: str) -> Dict[str, str]:
+    """All `[ID] text` blocks of a reply as {id: text}; later lines win."""
+    blocks = {}
+    for line in text.split('\n'):
+        block = parse_id_line(line)
+        if block:
+            blocks[block[0]] = block[1]
+    return blocks
+
+class IDLineParser:
+    """
+    Incremental parse_id_lines. `feed` takes reply text in arbitrary pieces
+    and returns the (id, text) blocks whose lines it completed; `finish`
+    returns the full {id: text} map.
+    """
+    def __init__(self, expected_ids: Iterable = ()):
+        self.expected = [str(i) for i in expected_ids]
+        self._order = {block_id: n for n, block_id in enumerate(self.expected)}
+        self._furthest = -1  # position in `expected` of the furthest ID seen
+        self._buffer = ""
+        self.blocks = {}
+
+    def _line(self, line: str) -> Optional[Tuple[str, str]]:
+        block = parse_id_line(line)
+        if block is None:
+            return None
+        new = block[0] not in self.blocks
+        self.blocks[block[0]] = block[1]
+        self._furthest = max(self._furthest, self._order.get(block[0], -1))
+        return block if new else None
+
+    def feed(self, delta: str) -> List[Tuple[str, str]]:
+        self._buffer += delta
+        if '\n' not in delta:
+            return []
+        *lines, self._buffer = self._buffer.split('\n')
+        return [block for block in map(self._line, lines) if block]
+
+    def skipped(self) -> List[str]:
+        """Expected IDs the reply has already moved past without translating."""
+        return [block_id for block_id in self.expected[:self._furthest] if block_id not in self.blocks]
+
+    def finish(self, text: Optional[str] = None) -> Dict[str, str]:
+        """Blocks of the complete reply: `text` when given (authoritative), else everything fed."""
+        if text is not None:
+            self.blocks = parse_id_lines(text)
+        elif self._buffer:
+            self._line(self._buffer)
+        self._buffer = ""
+        return self.blocks
+
+    def missing(self) -> List[str]:
+        return [block_id for block_id in self.expected if block_id not in self.blocks]
+
+class SSEDecoder:
+    """Line-by-line server-sent events decoder; yields the data of each complete event."""
+    def __init__(self):
+        self._data = []
+
+    def line(self, line: str) -> Optional[str]:
+        line = line.rstrip('\r\n')
+        if not line:
+            return self.flush()
+        if line.startswith(':'):
+            return None  # comment / keep-alive
+        field, _, value = line.partition(':')
+        if field == 'data':
+            self._data.append(value[1:] if value.startswith(' ') else value)
+        return None
+
+    def flush(self) -> Optional[str]:
+        if not self._data:
+            return None
+        data, self._data = '\n'.join(self._data), []
+        return data
+
+class StreamCollector:
+    """
+    Accumulates a streamed reply (OpenAI-compatible chat chunks or Gemini
+    candidates) and rebuilds the equivalent non-streamed response JSON.
+    """
+    def __init__(self, on_delta: Callable[[str], None], gemini: bool = False):
+        self.on_delta = on_delta
+        self.gemini = gemini
+        self.parts = []
+        self.usage = None
+        self._sse = SSEDecoder()
+
+    def feed_line(self, line: str):
+        data = self._sse.line(line)
+        if data is not None:
+            self._event(data)
+
+    def _event(self, data: str):
+        if data == '[DONE]':
+            return
+        event = json.loads(data)
+        if event.get('error'):
+            raise Exception(f"Stream error: {event['error']}")
+        text = ""
+        if self.gemini:
+            for candidate in event.get('candidates', [])[:1]:
+                text = "".join(p.get('text', '') for p in (candidate.get('content') or {}).get('parts', []))
+            self.usage = event.get('usageMetadata') or self.usage
+        else:
+            for choice in event.get('choices', [])[:1]:
+                text = (choice.get('delta') or {}).get('content') or ""
+            self.usage = event.get('usage') or self.usage
+        if text:
+            self.parts.append(text)
+            self.on_delta(text)
+
+    def result(self) -> dict:
+        data = self._sse.flush()
+        if data is not None:
+            self._event(data)
+        text = "".join(self.parts)
+        if self.gemini:
+            res_json = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+            if self.usage:
+                res_json['usageMetadata'] = self.usage
+        else:
+            res_json = {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}}]}
+            if self.usage:
+                res_json['usage'] = self.usage
+        return res_json
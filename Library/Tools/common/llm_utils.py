@@ -6,9 +6,18 @@ import concurrent.futures
 import re
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from enum import Enum
 from typing import List, Dict, Optional, Union
 
+from rate_limits import RateLimitRegistry, estimate_tokens
+from provider_health import HealthRegistry
+from response_cache import get_cache
+from singleflight import SingleFlight, flight_key, COALESCE_ENABLED
+from llm_broker import broker_from_env, BROKER_LIMITS
+from llm_stream import StreamCollector, STREAM_ENABLED
+from context_cache import GeminiContextCaches, PromptUsage, CONTEXT_CACHE_ENABLED, full_prompt, gemini_request
+
 # Try to load keys from .env if present
 def get_env_path():
     if getattr(sys, 'frozen', False):
@@ -46,8 +55,97 @@ class LLMProvider(Enum):
     DEEPSEEK = "deepseek"
     SILICONFLOW = "siliconflow"
 
+# OpenAI-compatible endpoints (each may be overridden by <PROVIDER>_API_BASE, e.g. OPENAI_API_BASE)
+OPENAI_COMPATIBLE_BASE_URLS = {
+    LLMProvider.OPENAI: "https://api.openai.com/v1",
+    LLMProvider.MOONSHOT: "https://api.moonshot.cn/v1",
+    LLMProvider.DASHSCOPE: "https://dashscope.aliyuncs.com/compatible-mode/v1",
+    LLMProvider.ZHIPU: "https://open.bigmodel.cn/api/paas/v4",
+    LLMProvider.DEEPSEEK: "https://api.deepseek.com",
+    LLMProvider.SILICONFLOW: "https://api.siliconflow.cn/v1",
+}
+
+# Gemini REST endpoint (async client and health probes)
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE") or "https://generativelanguage.googleapis.com/v1beta"
+
+def get_base_url(provider: LLMProvider) -> Optional[str]:
+    if provider not in OPENAI_COMPATIBLE_BASE_URLS:
+        return None
+    base_url = os.environ.get(f"{provider.name}_API_BASE") or OPENAI_COMPATIBLE_BASE_URLS[provider]
+    if base_url.endswith("/v1/"): base_url = base_url[:-1]
+    return base_url
+
+# Sampling temperature of OpenAI-compatible calls (Gemini uses the model default)
+TEMPERATURE = 0.3
+
+def request_temperature(provider: LLMProvider) -> Optional[float]:
+    return None if provider == LLMProvider.GEMINI else TEMPERATURE
+
+# 429 handling: retries on the same provider when it asks to wait at most RATE_LIMIT_MAX_WAIT
+RATE_LIMIT_RETRIES = int(os.environ.get("LLM_RATE_RETRIES", "5"))
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("LLM_RATE_MAX_WAIT", "60"))
+# The cascade moves past a provider whose queue is longer than this (seconds)
+MAX_QUEUE_WAIT = float(os.environ.get("LLM_MAX_QUEUE_WAIT", "30"))
+
+def openai_request(provider: LLMProvider, model_name: str, prompt: str, system: Optional[str] = None,
+                   stream: bool = False) -> dict:
+    """
+    Chat completion body. A static `system` prefix goes first, as its own
+    message, so provider prefix caches can serve it across calls.
+    """
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    data = {"model": model_name, "messages": messages, "temperature": TEMPERATURE}
+    if stream:
+        data["stream"] = True
+        if provider == LLMProvider.OPENAI:
+            # Usage (including cached tokens) arrives in a final chunk only when asked for
+            data["stream_options"] = {"include_usage": True}
+    return data
+
+def reserve_tokens(prompt: str) -> int:
+    """Tokens booked against the TPM budget before a call (prompt plus a reply allowance)."""
+    prompt_tokens = estimate_tokens(prompt)
+    return prompt_tokens + prompt_tokens // 4
+
+def usage_tokens(res_json: dict) -> Optional[int]:
+    """Total tokens reported by an OpenAI-compatible or Gemini REST response."""
+    usage = res_json.get('usage') or {}
+    if 'total_tokens' in usage:
+        return usage['total_tokens']
+    meta = res_json.get('usageMetadata') or {}
+    if 'totalTokenCount' in meta:
+        return meta['totalTokenCount']
+    if 'promptTokenCount' in meta:
+        return meta['promptTokenCount'] + meta.get('candidatesTokenCount', 0)
+    return None
+
+def is_rate_limit_error(e: Exception) -> bool:
+    text = f"{type(e).__name__} {e}"
+    return "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text
+
+# LLM_ASYNC=0 forces the thread-pool batch path even when aiohttp is installed
+USE_ASYNC = os.environ.get("LLM_ASYNC", "1") != "0"
+
+def _in_event_loop() -> bool:
+    try:
+        import asyncio
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def tier_settings() -> tuple:
+    """(default RPM, batch workers) for LLM_TIER."""
+    tier_str = os.environ.get("LLM_TIER", "tier1").lower()
+    if tier_str == "free":
+        return 10, 1
+    if tier_str == "tier1":
+        return 100, 10
+    return 500, 20
+
 class RateLimiter:
-    """Simple thread-safe rate limiter based on RPM."""
+    """Simple thread-safe rate limiter based on RPM. LLMClient uses rate_limits.RateLimitRegistry instead."""
     def __init__(self, rpm: int):
         self.rpm = rpm
         self.interval = 60.0 / rpm
@@ -103,21 +201,53 @@ class LLMClient:
                         
                         if prov: self.ordered_configs.append((prov, val, mod))
 
-        # Default tier settings
-        tier_str = os.environ.get("LLM_TIER", "tier1").lower()
-        if tier_str == "free":
-            self.rpm_limit = 10
-            self.max_workers = 1
-        elif tier_str == "tier1":
-            self.rpm_limit = 100 
-            self.max_workers = 10 
-        else:
-            self.rpm_limit = 500
-            self.max_workers = 20
-            
-        self.limiter = RateLimiter(self.rpm_limit)
+        self.rpm_limit, self.max_workers = tier_settings()
+
+        # One RPM/TPM token bucket per provider/model (see rate_limits.py)
+        self.limits = RateLimitRegistry(self.rpm_limit)
         self._gemini_configured = False
 
+        # HTTP timeouts (seconds): connect is short, read covers long generations
+        self.connect_timeout = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+        self.read_timeout = float(os.environ.get("LLM_READ_TIMEOUT", "300"))
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+        # Circuit breakers and latency per provider/model, shared by every call of a batch
+        self.health = HealthRegistry(probe=self._probe, trial_timeout=self.connect_timeout + self.read_timeout)
+        # Opt-in persistent response cache (LLM_CACHE=1, see response_cache.py)
+        self.cache = get_cache()
+        # Batch broker (autosub_batch): shared rate limits and cross-process coalescing
+        self.broker = broker_from_env()
+        # Identical concurrent prompts share one call
+        self.flights = SingleFlight(self.broker) if COALESCE_ENABLED else None
+        # Static prompt prefixes (`system`) kept in Gemini context caches; input tokens per provider report
+        self.context_caches = GeminiContextCaches() if CONTEXT_CACHE_ENABLED else None
+        self.usage = PromptUsage()
+
+    def _get_session(self, provider: LLMProvider) -> requests.Session:
+        """
+        One keep-alive session per provider, with a connection pool as large
+        as the batch worker count so parallel chunks reuse TCP/TLS connections.
+        """
+        with self._sessions_lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, self.max_workers))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                self._sessions[provider] = session
+            return session
+
+    def close(self):
+        """Closes all pooled HTTP connections."""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
     def _get_provider(self, model_name: str) -> LLMProvider:
         model_name = model_name.lower()
         if "gpt" in model_name: return LLMProvider.OPENAI
@@ -127,7 +257,9 @@ class LLMClient:
         if "deepseek" in model_name: return LLMProvider.DEEPSEEK
         return LLMProvider.GEMINI
 
-    def _call_openai_compatible(self, model_name: str, prompt: str, base_url: str, api_key: str) -> Optional[str]:
+    def _call_openai_compatible(self, model_name: str, prompt: str, base_url: str, api_key: str,
+                                provider: LLMProvider = LLMProvider.OPENAI, on_delta=None,
+                                system: Optional[str] = None) -> Optional[str]:
         if not api_key:
             print(f"❌ Error: API Key for {model_name} not found.")
             return None
@@ -136,63 +268,144 @@ class LLMClient:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
-        data = {
-            "model": model_name,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.3
-        }
+        data = openai_request(provider, model_name, prompt, system, stream=on_delta is not None)
         
-        self.limiter.wait()
         try:
-            response = requests.post(f"{base_url}/chat/completions", headers=headers, json=data, timeout=300)
-            response.raise_for_status()
-            res_json = response.json()
+            res_json = self._post(provider, model_name, f"{base_url}/chat/completions", headers, data,
+                                  reserve_tokens(full_prompt(prompt, system)), on_delta)
             return res_json['choices'][0]['message']['content'].strip()
         except Exception as e:
             print(f"❌ OpenAI-compatible API error ({model_name}): {e}")
             return None
 
-    def _call_gemini(self, model_name: str, prompt: str, api_key: str) -> Optional[str]:
+    def _limit(self, provider: LLMProvider, model_name: str):
+        """Rate limit a call schedules against: the batch broker's when one is advertised, else this process's."""
+        limit = self.limits.get(provider, model_name)
+        if self.broker is not None and BROKER_LIMITS:
+            return self.broker.limit(provider, model_name, limit)
+        return limit
+
+    def _post(self, provider: LLMProvider, model_name: str, url: str, headers: dict, data: dict, reserved: int,
+              on_delta=None) -> dict:
+        """
+        POST through the provider's rate limit, retrying 429s the provider asks us
+        to wait out, and record the outcome in the health registry. With `on_delta`
+        the reply is read as an event stream (see llm_stream.py) and passed to it
+        piece by piece; the return value has the non-streamed shape either way.
+        """
+        limit = self._limit(provider, model_name)
+        try:
+            session = self._get_session(provider)
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                limit.acquire(reserved)
+                sent_at = time.monotonic()
+                response = session.post(url, headers=headers, json=data, stream=on_delta is not None,
+                                        timeout=(self.connect_timeout, self.read_timeout))
+                blocked = limit.observe(response.status_code, response.headers, sent_at)
+                if response.status_code == 429 and attempt < RATE_LIMIT_RETRIES and blocked <= RATE_LIMIT_MAX_WAIT:
+                    print(f"⏳ {limit.name} rate limited, retrying in {blocked:.1f}s...")
+                    response.close()
+                    continue
+                break
+            with response:
+                response.raise_for_status()
+                if on_delta is None:
+                    res_json = response.json()
+                else:
+                    collector = StreamCollector(on_delta, gemini=provider == LLMProvider.GEMINI)
+                    # chunk_size=None: hand over events as they arrive instead of filling 512-byte reads
+                    for line in response.iter_lines(chunk_size=None):
+                        collector.feed_line(line.decode('utf-8'))
+                    res_json = collector.result()
+        except Exception as e:
+            limit.finish()
+            # Throttling is the rate limiter's business; everything else counts against health
+            if not is_rate_limit_error(e):
+                self.health.record_failure(provider, model_name, e)
+            raise
+        self.health.record_success(provider, model_name, time.monotonic() - sent_at)
+        limit.settle(reserved, usage_tokens(res_json))
+        self.usage.add(res_json)
+        return res_json
+
+    def _gemini_context(self, model_name: str, system: Optional[str], api_key: str) -> Optional[str]:
+        """Name of the Gemini context cache holding `system`, created on first use (None: send it inline)."""
+        if not system or self.context_caches is None:
+            return None
+
+        def create():
+            response = self._get_session(LLMProvider.GEMINI).post(
+                f"{GEMINI_API_BASE}/cachedContents", headers={"x-goog-api-key": api_key},
+                json=self.context_caches.create_request(model_name, system), timeout=(self.connect_timeout, 60))
+            response.raise_for_status()
+            return response.json()
+        return self.context_caches.get(model_name, system, create)
+
+    def _call_gemini_stream(self, model_name: str, prompt: str, api_key: str, on_delta,
+                            system: Optional[str] = None) -> Optional[str]:
+        """Streams over the REST API; the SDK path below does not expose the event stream."""
+        url = f"{GEMINI_API_BASE}/models/{model_name}:streamGenerateContent?alt=sse"
+        headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        cached = self._gemini_context(model_name, system, api_key)
+        data = gemini_request(prompt, system, cached)
+        try:
+            res_json = self._post(LLMProvider.GEMINI, model_name, url, headers, data,
+                                  reserve_tokens(full_prompt(prompt, system)), on_delta)
+            text = "".join(p.get('text', '') for p in res_json['candidates'][0]['content']['parts']).strip()
+            return text or None
+        except Exception as e:
+            if cached:
+                self.context_caches.invalidate(model_name, system)
+            print(f"❌ Gemini API error: {e}")
+            raise Exception(f"Gemini API Error: {e}")
+
+    def _call_gemini(self, model_name: str, prompt: str, api_key: str, on_delta=None,
+                     system: Optional[str] = None) -> Optional[str]:
         if not api_key:
             print("❌ Error: Gemini API Key not found.")
             return None
+        if on_delta is not None:
+            return self._call_gemini_stream(model_name, prompt, api_key, on_delta, system)
             
+        sent_at = None
+        limit = self._limit(LLMProvider.GEMINI, model_name)
         try:
             import google.generativeai as genai
             genai.configure(api_key=api_key) # Reconfigure to support switching keys during cascade
             self._gemini_configured = True
             
-            model = genai.GenerativeModel(model_name)
-            self.limiter.wait()
+            model = genai.GenerativeModel(model_name, system_instruction=system)
+            limit.acquire(reserve_tokens(full_prompt(prompt, system)))
+            sent_at = time.monotonic()
             response = model.generate_content(prompt)
+            limit.observe(200, None, sent_at)
+            self.health.record_success(LLMProvider.GEMINI, model_name, time.monotonic() - sent_at)
             if response.text:
                 return response.text.strip()
             return None
         except Exception as e:
+            if is_rate_limit_error(e):
+                # The SDK does not expose headers; fall back to backoff
+                limit.observe(429, None, sent_at)
+            else:
+                limit.finish()
+                if sent_at is not None:
+                    self.health.record_failure(LLMProvider.GEMINI, model_name, e)
             print(f"❌ Gemini API error: {e}")
             # Raise exception to allow cascade catching
             raise Exception(f"Gemini API Error: {e}")
 
-    def _execute_provider_call(self, provider: LLMProvider, model_name: str, prompt: str, api_key: str) -> Optional[str]:
+    def _execute_provider_call(self, provider: LLMProvider, model_name: str, prompt: str, api_key: str,
+                               on_delta=None, system: Optional[str] = None) -> Optional[str]:
         if provider == LLMProvider.GEMINI:
-            return self._call_gemini(model_name, prompt, api_key)
-        elif provider == LLMProvider.OPENAI:
-            base_url = os.environ.get("OPENAI_API_BASE") or "https://api.openai.com/v1"
-            if base_url.endswith("/v1/"): base_url = base_url[:-1]
-            return self._call_openai_compatible(model_name, prompt, base_url, api_key)
-        elif provider == LLMProvider.MOONSHOT:
-            return self._call_openai_compatible(model_name, prompt, "https://api.moonshot.cn/v1", api_key)
-        elif provider == LLMProvider.DASHSCOPE:
-            return self._call_openai_compatible(model_name, prompt, "https://dashscope.aliyuncs.com/compatible-mode/v1", api_key)
-        elif provider == LLMProvider.ZHIPU:
-            return self._call_openai_compatible(model_name, prompt, "https://open.bigmodel.cn/api/paas/v4", api_key)
-        elif provider == LLMProvider.DEEPSEEK:
-            return self._call_openai_compatible(model_name, prompt, "https://api.deepseek.com", api_key)
-        elif provider == LLMProvider.SILICONFLOW:
-            return self._call_openai_compatible(model_name, prompt, "https://api.siliconflow.cn/v1", api_key)
+            return self._call_gemini(model_name, prompt, api_key, on_delta, system)
+        base_url = get_base_url(provider)
+        if base_url:
+            return self._call_openai_compatible(model_name, prompt, base_url, api_key, provider, on_delta, system)
         return None
 
-    def generate_content(self, prompt: str, model_name: Optional[str] = None, fallback: bool = True) -> Optional[str]:
+    def _build_targets(self, model_name: Optional[str] = None, fallback: bool = True) -> List[tuple]:
+        """Ordered (provider, api_key, model) cascade for one call."""
         targets = []
         
         # If user hardcoded a specific model, try it first
@@ -215,13 +428,108 @@ class LLMClient:
                     # Guess a model 
                     guess = "gemini-3.1-pro-preview" if prov == LLMProvider.GEMINI else "gpt-4o"
                     targets.append((prov, key, guess))
+        return targets
 
+    def _rank_targets(self, targets: List[tuple], model_name: Optional[str]) -> List[tuple]:
+        """
+        Keeps an explicitly requested model first unless its circuit is open and
+        orders the rest by health (see ProviderHealth.rank): recovering, then
+        fastest recent latency, then untried in .env order, then open.
+        """
+        pinned = []
+        if model_name and targets and targets[0][2] == model_name \
+                and self.health.get(targets[0][0], model_name).state != "open":
+            pinned, targets = targets[:1], targets[1:]
+        return pinned + sorted(targets, key=lambda t: self.health.get(t[0], t[2]).rank())
+
+    def _cascade(self, model_name: Optional[str], fallback: bool, errors: List[str], targets=None, delays=None):
+        """
+        Yields the (provider, api_key, model) targets worth calling, in order.
+        Targets with an open circuit or an over-long rate-limit queue are skipped;
+        if the breakers rule out every target, the best-ranked one is still tried.
+        `targets` and their queue `delays` may be given precomputed (async path).
+        """
+        if targets is None:
+            targets = self._rank_targets(self._build_targets(model_name, fallback), model_name)
+        delays = delays or {}
+        tried, skipped = False, None
+        for n, (provider, api_key, m_name) in enumerate(targets, 1):
+            health = self.health.get(provider, m_name)
+            if not health.allow():
+                print(f"⏭️ Skipping {provider.value}/{m_name}: circuit {health.state}")
+                errors.append(f"{provider.value}: circuit {health.state} ({health.last_error})")
+                skipped = skipped or (provider, api_key, m_name)
+                continue
+            if self._queue_too_long(provider, m_name, n == len(targets), delays.get((provider, m_name))):
+                errors.append(f"{provider.value}: rate-limited")
+                continue
+            tried = True
+            yield provider, api_key, m_name
+        if not tried and skipped:
+            yield skipped
+
+    def _cache_lookup(self, prompt: str, model_name: Optional[str], fallback: bool) -> Optional[str]:
+        """A cached answer from any target of the cascade, preferring the earlier ones."""
+        if self.cache is None:
+            return None
+        targets = [(p, m, request_temperature(p)) for p, _, m in self._build_targets(model_name, fallback)]
+        return self.cache.lookup(targets, prompt)
+
+    def _cache_store(self, provider: LLMProvider, model_name: str, prompt: str, result: str):
+        if self.cache is not None:
+            self.cache.put(provider, model_name, request_temperature(provider), prompt, result)
+
+    def _probe(self, provider: LLMProvider, model_name: str) -> bool:
+        """Cheap reachability check the health registry runs while a circuit is open."""
+        api_key = self.api_keys.get(provider) or ""
+        if provider == LLMProvider.GEMINI:
+            url, headers = f"{GEMINI_API_BASE}/models/{model_name}", {"x-goog-api-key": api_key}
+        else:
+            base_url = get_base_url(provider)
+            if not base_url:
+                return False
+            url, headers = f"{base_url}/models", {"Authorization": f"Bearer {api_key}"}
+        response = self._get_session(provider).get(url, headers=headers, timeout=(self.connect_timeout, 10))
+        return response.status_code < 500 and response.status_code not in (401, 403)
+
+    def _queue_too_long(self, provider: LLMProvider, model_name: str, is_last: bool, wait: float = None) -> bool:
+        """True when another target is available and this one is throttled beyond MAX_QUEUE_WAIT."""
+        if is_last:
+            return False
+        if wait is None:
+            wait = self._limit(provider, model_name).pending_delay()
+        if wait > MAX_QUEUE_WAIT:
+            print(f"⏭️ Skipping {provider.value}/{model_name}: rate-limit queue {wait:.0f}s")
+            return True
+        return False
+
+    def generate_content(self, prompt: str, model_name: Optional[str] = None, fallback: bool = True,
+                         on_delta=None, system: Optional[str] = None) -> Optional[str]:
+        """
+        Full reply text of the first target in the cascade that answers. With
+        `on_delta(text)` the reply is streamed to it as it is generated (unless
+        LLM_STREAM=0); cached and coalesced answers arrive only as the result.
+        `system` is a static instruction prefix shared by many calls, sent so
+        that providers can cache it (see context_cache.py).
+        """
+        on_delta = on_delta if STREAM_ENABLED else None
+        if self.flights is None:
+            return self._generate_content(prompt, model_name, fallback, on_delta, system)
+        return self.flights.do(flight_key(full_prompt(prompt, system), model_name, fallback),
+                               lambda: self._generate_content(prompt, model_name, fallback, on_delta, system))
+
+    def _generate_content(self, prompt: str, model_name: Optional[str], fallback: bool,
+                          on_delta=None, system: Optional[str] = None) -> Optional[str]:
+        cached = self._cache_lookup(full_prompt(prompt, system), model_name, fallback)
+        if cached is not None:
+            return cached
         errors = []
-        for provider, api_key, m_name in targets:
+        for provider, api_key, m_name in self._cascade(model_name, fallback, errors):
             print(f"🔄 Executing LLM Call -> Provider: {provider.value}, Model: {m_name}")
             try:
-                result = self._execute_provider_call(provider, m_name, prompt, api_key)
+                result = self._execute_provider_call(provider, m_name, prompt, api_key, on_delta, system)
                 if result: 
+                    self._cache_store(provider, m_name, full_prompt(prompt, system), result)
                     return result
                 else:
                     errors.append(f"{provider.value}: Returned empty or controlled failure.")
@@ -232,14 +540,34 @@ class LLMClient:
                 
         raise Exception(f"❌ All LLM API fallbacks exhausted. Errors: {errors}")
 
-    def generate_batch(self, tasks: List[Dict], model_name: str = "gemini-3.1-pro-preview") -> List[Dict]:
+    def generate_batch(self, tasks: List[Dict], model_name: str = "gemini-3.1-pro-preview",
+                       on_delta=None, on_result=None) -> List[Dict]:
+        """
+        Runs all tasks concurrently. Uses the asyncio client (hundreds of requests
+        in flight on one thread) when aiohttp is installed, otherwise a thread pool.
+        `on_delta(task, text)` receives each task's reply as it streams; a task's
+        optional 'system' is its cacheable instruction prefix. `on_result(result)`
+        gets each task's result dict as soon as that task finishes.
+        """
+        if USE_ASYNC and not _in_event_loop():
+            try:
+                import async_llm_utils
+            except ImportError:
+                async_llm_utils = None
+            if async_llm_utils is not None and async_llm_utils.HAS_AIOHTTP:
+                return async_llm_utils.run_batch(self, tasks, model_name, on_delta, on_result)
+        return self._generate_batch_threaded(tasks, model_name, on_delta, on_result)
+
+    def _generate_batch_threaded(self, tasks: List[Dict], model_name: str, on_delta=None,
+                                 on_result=None) -> List[Dict]:
         results = []
         total = len(tasks)
         print(f"🚀 Starting batch generation for {total} items (Workers: {self.max_workers}, Model: {model_name})...")
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             future_to_task = {
-                executor.submit(self.generate_content, task['prompt'], model_name): task 
+                executor.submit(self.generate_content, task['prompt'], model_name, system=task.get('system'),
+                                on_delta=on_delta and (lambda text, task=task: on_delta(task, text))): task
                 for task in tasks
             }
             
@@ -251,32 +579,51 @@ class LLMClient:
                     results.append({**task, 'result': result_text})
                 except Exception as e:
                     results.append({**task, 'result': None, 'error': str(e)})
+                if on_result:
+                    on_result(results[-1])
                 
                 completed += 1
                 print(f"   Progress: {completed}/{total} (chunks)", flush=True)
-                    
+
+        self._report_batch()
         return results
 
+    def _report_batch(self):
+        """End-of-batch summary of cache use, coalesced calls, rate limits hit and circuits tripped."""
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"💾 LLM cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                  f"{stats['entries']} entries ({stats['bytes'] / 1048576:.1f} MB)")
+        if self.flights is not None:
+            stats = self.flights.stats()
+            saved = stats['coalesced'] + stats['coalesced_remote']
+            if saved:
+                print(f"🔗 Coalesced {saved} identical request(s) "
+                      f"({stats['coalesced']} in-process, {stats['coalesced_remote']} from other processes)")
+        usage = self.usage.summary()
+        if usage:
+            created = self.context_caches.created if self.context_caches else 0
+            print(f"🧠 Prompt usage: {usage}" + (f" ({created} Gemini context cache(s) created)" if created else ""))
+        throttled = self.limits.summary()
+        if throttled:
+            print("⏳ Rate limits hit: " + ", ".join(f"{name} x{count}" for name, count in throttled.items()))
+        circuits = self.health.summary()
+        if circuits:
+            print("🔌 Circuit breakers: " + ", ".join(f"{name} {state}" for name, state in circuits.items()))
+
     def _list_openai_models(self, provider: LLMProvider) -> List[str]:
         api_key = self.api_keys.get(provider)
         if not api_key:
             return []
 
-        base_urls = {
-            LLMProvider.OPENAI: "https://api.openai.com/v1",
-            LLMProvider.MOONSHOT: "https://api.moonshot.cn/v1",
-            LLMProvider.DASHSCOPE: "https://dashscope.aliyuncs.com/compatible-mode/v1",
-            LLMProvider.ZHIPU: "https://open.bigmodel.cn/api/paas/v4",
-            LLMProvider.DEEPSEEK: "https://api.deepseek.com",
-            LLMProvider.SILICONFLOW: "https://api.siliconflow.cn/v1"
-        }
-        
-        base_url = base_urls.get(provider)
+        base_url = get_base_url(provider)
         if not base_url:
             return []
 
         try:
-            response = requests.get(f"{base_url}/models", headers={"Authorization": f"Bearer {api_key}"}, timeout=10)
+            response = self._get_session(provider).get(
+                f"{base_url}/models", headers={"Authorization": f"Bearer {api_key}"},
+                timeout=(self.connect_timeout, 10))
             response.raise_for_status()
             data = response.json()
             
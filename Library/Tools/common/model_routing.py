@@ -0,0 +1,150 @@
+"""
+Two-tier model routing for batch translation.
+
+The first pass of a file goes to a cheap, fast sibling of the requested
+model (its "flash" tier). Every chunk it returns is reviewed with local
+heuristics (see smart_translate.escalation_reason), and only the chunks that
+fail are sent again to the requested model. Models that are already a fast
+tier, or have no known sibling, are used directly.
+
+RoutingReport tallies what the routing did: chunks escalated, the batch
+time against an all-strong-model estimate (from the per-model latency the
+provider health registry measures), and the cost against sending every
+chunk to the strong model. Costs use approximate list prices per million
+tokens and estimated token counts; they indicate the size of the saving,
+not an invoice.
+
+Environment:
+    LLM_FAST_MODEL=...           fast model for the first pass ("none" disables routing)
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+from rate_limits import estimate_tokens
+
+FAST_MODEL = os.environ.get("LLM_FAST_MODEL", "")
+
+# Name fragments of models that already are the fast/cheap tier
+FAST_TIER_MARKERS = ("flash", "mini", "turbo", "lite", "haiku", "nano")
+
+# (strong model name fragment, fast sibling); first match wins
+FAST_SIBLINGS = [
+    ("gemini-3.1-pro", "gemini-3.1-flash-preview"),
+    ("gemini-3-pro", "gemini-3-flash-preview"),
+    ("gemini-2.5-pro", "gemini-2.5-flash"),
+    ("gemini-1.5-pro", "gemini-1.5-flash"),
+    ("gpt-4.1", "gpt-4.1-mini"),
+    ("gpt-4o", "gpt-4o-mini"),
+    ("qwen-max", "qwen-plus"),
+    ("glm-4", "glm-4-flash"),
+    ("deepseek-reasoner", "deepseek-chat"),
+]
+
+# (model name fragment, USD per 1M input tokens, USD per 1M output tokens); first match wins.
+# Approximate list prices; unknown models have no cost estimate.
+MODEL_PRICES = [
+    ("gemini-3.1-flash", 0.50, 3.00),
+    ("gemini-3-flash", 0.50, 3.00),
+    ("gemini-3.1-pro", 2.00, 12.00),
+    ("gemini-3-pro", 2.00, 12.00),
+    ("gemini-2.5-flash", 0.30, 2.50),
+    ("gemini-2.5-pro", 1.25, 10.00),
+    ("gemini-1.5-flash", 0.075, 0.30),
+    ("gemini-1.5-pro", 1.25, 5.00),
+    ("gpt-4.1-mini", 0.40, 1.60),
+    ("gpt-4.1", 2.00, 8.00),
+    ("gpt-4o-mini", 0.15, 0.60),
+    ("gpt-4o", 2.50, 10.00),
+    ("qwen-plus", 0.40, 1.20),
+    ("qwen-max", 1.60, 6.40),
+    ("glm-4-flash", 0.0, 0.0),
+    ("deepseek-chat", 0.27, 1.10),
+    ("deepseek-reasoner", 0.55, 2.19),
+]
+
+def fast_sibling(model: Optional[str]) -> Optional[str]:
+    """The fast tier of `model`, or None if it is one already or has no known sibling."""
+    name = (model or "").lower()
+    if not name or any(marker in name for marker in FAST_TIER_MARKERS):
+        return None
+    for fragment, fast in FAST_SIBLINGS:
+        if fragment in name:
+            return fast
+    return None
+
+def resolve_fast_model(client, model: str, requested: Optional[str] = None) -> Optional[str]:
+    """
+    Model for the first pass when routing applies: `requested` (or
+    LLM_FAST_MODEL), else the known sibling. None means no routing: "none",
+    the model itself, or a fast model without an API key.
+    """
+    fast = requested or FAST_MODEL or "auto"
+    if fast.lower() == "none":
+        return None
+    if fast.lower() == "auto":
+        fast = fast_sibling(model)
+    if not fast or fast == model:
+        return None
+    if not client.api_keys.get(client._get_provider(fast)):
+        print(f"⚠️ No API key for fast model {fast}; translating with {model} only.")
+        return None
+    return fast
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    name = (model or "").lower()
+    for fragment, price_in, price_out in MODEL_PRICES:
+        if fragment in name:
+            return price_in, price_out
+    return None
+
+def call_tokens(result: Dict) -> Tuple[int, int]:
+    """Estimated (input, output) tokens of one batch result."""
+    prompt = (result.get('system') or "") + result.get('prompt', "")
+    return estimate_tokens(prompt), estimate_tokens(result.get('result') or "")
+
+def batch_cost(model: str, results: List[Dict]) -> Optional[float]:
+    price = model_price(model)
+    if price is None:
+        return None
+    tokens_in = tokens_out = 0
+    for result in results:
+        n_in, n_out = call_tokens(result)
+        tokens_in += n_in
+        tokens_out += n_out
+    return (tokens_in * price[0] + tokens_out * price[1]) / 1e6
+
+class RoutingReport:
+    """What two-tier routing cost and saved over one batch."""
+    def __init__(self, fast: str, strong: str):
+        self.fast = fast
+        self.strong = strong
+        self.first_pass = []
+        self.escalated = []
+        self.fast_seconds = 0.0
+        self.escalation_seconds = 0.0
+
+    def summary(self, client) -> str:
+        n, k = len(self.first_pass), len(self.escalated)
+        lines = [f"🪜 Routing: {n - k}/{n} chunk(s) accepted from {self.fast}, {k} escalated to {self.strong}"]
+
+        actual = self.fast_seconds + self.escalation_seconds
+        fast_latency = client.health.get(client._get_provider(self.fast), self.fast).latency
+        strong_latency = client.health.get(client._get_provider(self.strong), self.strong).latency
+        if fast_latency and strong_latency:
+            # The first-pass batch, had every call taken the strong model's time
+            estimate = self.fast_seconds * strong_latency / fast_latency
+            delta = estimate - actual
+            lines.append(f"   Time: {actual:.1f}s vs ~{estimate:.1f}s with {self.strong} only "
+                         + (f"(saved ~{delta:.1f}s)" if delta >= 0 else f"(~{-delta:.1f}s slower)"))
+        else:
+            lines.append(f"   Time: {actual:.1f}s ({self.strong} latency not measured in this run)")
+
+        fast_cost = batch_cost(self.fast, self.first_pass)
+        escalated_cost = batch_cost(self.strong, self.escalated)
+        strong_only = batch_cost(self.strong, self.first_pass)
+        if None not in (fast_cost, escalated_cost, strong_only):
+            spent = fast_cost + escalated_cost
+            saved = 1 - spent / strong_only if strong_only else 0.0
+            lines.append(f"   Cost: ~${spent:.4f} vs ~${strong_only:.4f} with {self.strong} only "
+                         f"(saved {saved:.0%}, estimated tokens at list prices)")
+        return "\n".join(lines)
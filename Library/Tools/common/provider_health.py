@@ -0,0 +1,225 @@
+"""
+Health tracking and circuit breaking for the LLM provider cascade.
+
+Every (provider, model) target gets a ProviderHealth record holding a rolling
+error rate, an EWMA of successful call latency and a circuit breaker:
+
+    closed     calls go through; failures are counted
+    open       the target is skipped until its cooldown expires
+    half-open  one trial call is let through; success closes the breaker,
+               failure re-opens it with a doubled cooldown
+
+A breaker opens after LLM_BREAKER_FAILURES consecutive failures, or when the
+error rate over the last WINDOW_SECONDS reaches LLM_BREAKER_ERROR_RATE. While
+any breaker is open a background thread probes the target with a cheap
+request, so a dead provider costs one probe per cooldown instead of one
+timeout per chunk. A failed probe extends the cooldown; a successful one
+moves the breaker to half-open and the next real call decides.
+
+The registry lives on LLMClient, so every chunk of a batch (thread pool or
+asyncio) shares what the others have learned.
+
+Environment:
+    LLM_BREAKER_FAILURES=3       consecutive failures that open a breaker
+    LLM_BREAKER_ERROR_RATE=0.5   rolling error rate that opens a breaker (0 = off)
+    LLM_BREAKER_COOLDOWN=30      seconds an open breaker waits before a probe/trial
+"""
+import os
+import time
+import threading
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "3"))
+BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+MAX_COOLDOWN = 300
+# The error rate only counts once MIN_CALLS calls fall inside the window
+WINDOW_SECONDS = 120
+MIN_CALLS = 5
+LATENCY_ALPHA = 0.3
+PROBE_INTERVAL = 1.0
+
+class ProviderHealth:
+    """Rolling statistics and breaker state for one provider/model."""
+    def __init__(self, name: str, trial_timeout: float):
+        self.name = name
+        self.state = CLOSED
+        self.latency = None  # EWMA of successful calls, seconds
+        self.failures = 0  # consecutive
+        self.trips = 0
+        self.last_error = None
+        self.open_until = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.trial_timeout = trial_timeout
+        self.probed = False  # a background probe, not a real call, ends the cooldown
+        self._trial_until = 0.0  # half-open: a trial call is in flight until then
+        self._outcomes = deque()  # (time, ok)
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > WINDOW_SECONDS:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> float:
+        with self._lock:
+            self._trim(time.monotonic())
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _open(self, now):
+        if self.state == HALF_OPEN:
+            self.cooldown = min(MAX_COOLDOWN, self.cooldown * 2)
+        elif self.state == CLOSED:
+            self.cooldown = BREAKER_COOLDOWN
+            self.trips += 1
+        self.state = OPEN
+        self.open_until = now + self.cooldown
+        self._trial_until = 0.0
+
+    def allow(self) -> bool:
+        """
+        True if a call may go to this target now. In the half-open state only
+        one caller at a time gets True (the trial); it must report back with
+        record_success/record_failure.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.open_until and not self.probed:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and now >= self._trial_until:
+                self._trial_until = now + self.trial_timeout
+                return True
+            return False
+
+    def probe_due(self) -> bool:
+        """Claims the next probe of an open breaker whose cooldown has expired."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state != OPEN or now < self.open_until:
+                return False
+            self.state = HALF_OPEN
+            self._trial_until = now + self.trial_timeout
+            return True
+
+    def probe_done(self, ok: bool):
+        with self._lock:
+            if self.state != HALF_OPEN:
+                return
+            if ok:
+                self._trial_until = 0.0  # the next real call is the trial
+            else:
+                self._open(time.monotonic())
+
+    def record_success(self, latency: float):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._outcomes.append((now, True))
+            self.latency = latency if self.latency is None else \
+                LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency
+            self.failures = 0
+            if self.state != CLOSED:
+                print(f"✅ {self.name} recovered (circuit closed)")
+            self.state = CLOSED
+            self.cooldown = BREAKER_COOLDOWN
+            self._trial_until = 0.0
+
+    def record_failure(self, error=None) -> bool:
+        """Counts a failed call. Returns True if this opened the breaker."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._outcomes.append((now, False))
+            self.failures += 1
+            self.last_error = (str(error) or type(error).__name__)[:200] if error is not None else None
+            if self.state == OPEN:
+                return False
+            tripped = self.state == HALF_OPEN or self.failures >= BREAKER_FAILURES
+            if not tripped and BREAKER_ERROR_RATE and len(self._outcomes) >= MIN_CALLS:
+                failed = sum(1 for _, ok in self._outcomes if not ok)
+                tripped = failed / len(self._outcomes) >= BREAKER_ERROR_RATE
+            if tripped:
+                self._open(now)
+                print(f"🔌 {self.name} circuit open for {self.cooldown:.0f}s after {self.failures} failure(s)")
+            return tripped
+
+    def rank(self):
+        """
+        Sort key for the cascade: a half-open target first (only one caller gets
+        its trial, the rest skip it), then closed ones by latency, untried ones,
+        and open ones last.
+        """
+        if self.state == HALF_OPEN:
+            return (0, 0.0)
+        if self.state == CLOSED:
+            return (1, self.latency) if self.latency is not None else (2, 0.0)
+        return (3, self.open_until)
+
+class HealthRegistry:
+    """
+    Lazily creates one ProviderHealth per (provider, model). `probe(provider,
+    model)` is called from a background thread for open breakers and returns
+    True when the target answered.
+    """
+    def __init__(self, probe=None, trial_timeout: float = 300.0):
+        self.probe = probe
+        self.trial_timeout = trial_timeout
+        self._health = {}
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def get(self, provider, model: str) -> ProviderHealth:
+        key = (provider, model)
+        with self._lock:
+            health = self._health.get(key)
+            if health is None:
+                name = f"{getattr(provider, 'value', provider)}/{model}"
+                health = ProviderHealth(name, self.trial_timeout)
+                health.probed = self.probe is not None
+                self._health[key] = health
+            return health
+
+    def record_success(self, provider, model: str, latency: float):
+        self.get(provider, model).record_success(latency)
+
+    def record_failure(self, provider, model: str, error=None):
+        if self.get(provider, model).record_failure(error):
+            self._start_prober()
+
+    def _start_prober(self):
+        if self.probe is None:
+            return
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="llm-health-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        """Runs while any breaker is open, probing each one when its cooldown expires."""
+        while True:
+            with self._lock:
+                items = list(self._health.items())
+                if not any(h.state == OPEN for _, h in items):
+                    self._prober = None
+                    return
+            for (provider, model), health in items:
+                if not health.probe_due():
+                    continue
+                try:
+                    ok = bool(self.probe(provider, model))
+                except Exception:
+                    ok = False
+                health.probe_done(ok)
+            time.sleep(PROBE_INTERVAL)
+
+    def summary(self):
+        """Targets that are not closed, or have tripped, as {name: state}."""
+        with self._lock:
+            return {h.name: f"{h.state} (tripped x{h.trips})" for h in self._health.values()
+                    if h.trips or h.state != CLOSED}
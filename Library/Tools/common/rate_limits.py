@@ -0,0 +1,351 @@
+"""
+Provider-aware rate limiting for LLM calls.
+
+Each (provider, model) pair gets its own pair of token buckets: one for
+requests per minute and one for tokens per minute. Buckets start full, so a
+batch can burst up to ~10 seconds' worth of budget before being paced, and
+a reservation that overdraws a bucket simply waits for the refill (callers
+queue up in reservation order). Slow or throttled providers never hold back
+the others.
+
+Limits adapt to what the provider reports: `x-ratelimit-*` headers replace
+the configured budget with the real one and cap the remaining allowance,
+and a 429 blocks the pair until `Retry-After` (or an exponential backoff)
+and, if the provider did not publish its limits, lowers the request rate
+until calls succeed again.
+
+Environment (PROVIDER is the upper-case provider name, e.g. DEEPSEEK):
+    LLM_RPM_<PROVIDER> / LLM_RPM    requests per minute (0 = unlimited; default from LLM_TIER)
+    LLM_TPM_<PROVIDER> / LLM_TPM    tokens per minute (0 = unlimited, the default)
+"""
+import os
+import re
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+# Buckets hold this many seconds of budget, which is the largest burst allowed
+BURST_SECONDS = 10
+# Backoff cap when a 429 carries no Retry-After
+MAX_BACKOFF = 60
+# Unpublished limits: halve the rate per throttling episode; once no 429 has been
+# seen for RECOVERY_DELAY seconds, grow back by RECOVERY_STEP per success
+DECREASE_FACTOR = 0.5
+RECOVERY_DELAY = 30
+RECOVERY_STEP = 0.02
+# Published limits are paced slightly below the advertised value to absorb clock/jitter differences
+HEADER_MARGIN = 0.95
+
+_CJK_RE = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: one per CJK character, one per ~4 other characters."""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _parse_duration(value):
+    """Parses '20ms', '1.5s', '6m0s' or plain seconds into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+
+def _parse_retry_after(value):
+    if value is None:
+        return None
+    seconds = _parse_duration(value)
+    if seconds is not None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_rate_headers(headers) -> dict:
+    """Extracts limits, remaining allowance and reset times from response headers."""
+    if not headers:
+        return {}
+    get = headers.get
+    info = {}
+    for kind in ('requests', 'tokens'):
+        limit = _to_float(get(f'x-ratelimit-limit-{kind}'))
+        remaining = _to_float(get(f'x-ratelimit-remaining-{kind}'))
+        reset = _parse_duration(get(f'x-ratelimit-reset-{kind}'))
+        if kind == 'requests':
+            # Some providers only send the unsuffixed form
+            limit = limit if limit is not None else _to_float(get('x-ratelimit-limit'))
+            remaining = remaining if remaining is not None else _to_float(get('x-ratelimit-remaining'))
+            reset = reset if reset is not None else _parse_duration(get('x-ratelimit-reset'))
+        if limit is not None: info[f'limit_{kind}'] = limit
+        if remaining is not None: info[f'remaining_{kind}'] = remaining
+        if reset is not None: info[f'reset_{kind}'] = reset
+    retry_after = _parse_retry_after(get('retry-after'))
+    if retry_after is not None:
+        info['retry_after'] = retry_after
+    return info
+
+class TokenBucket:
+    """Per-minute budget with burst capacity. `per_minute` of 0 means unlimited."""
+    def __init__(self, per_minute: float):
+        self.set_rate(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def set_rate(self, per_minute: float):
+        self.per_minute = per_minute or 0
+        self.refill = self.per_minute / 60.0
+        self.capacity = max(1.0, self.refill * BURST_SECONDS) if self.per_minute else 0.0
+        if hasattr(self, 'level'):
+            self.level = min(self.level, self.capacity)
+
+    @property
+    def unlimited(self):
+        return not self.per_minute
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.refill)
+            self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` (possibly overdrawing). Returns seconds until it is covered."""
+        if self.unlimited or amount <= 0:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the burst must still be admissible
+        self.level -= min(amount, self.capacity)
+        return -self.level / self.refill if self.level < 0 else 0.0
+
+    def shortfall(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available without overdrawing (0 if it is now)."""
+        if self.unlimited or amount <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.refill
+
+    def refund(self, amount: float):
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+    def backlog(self, now: float) -> float:
+        """Seconds of already-reserved work still waiting for budget."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        return -self.level / self.refill if self.level < 0 else 0.0
+
+class ProviderLimit:
+    """Request and token buckets for one provider/model, plus 429 state."""
+    def __init__(self, name: str, rpm: float, tpm: float):
+        self.name = name
+        self.configured_rpm = rpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self._episode_until = 0.0  # requests sent before this belong to the current throttling episode
+        self._generation = 0  # bumped on every back-off; queued callers then re-reserve
+        self.learned = False  # limits came from response headers
+        self.throttled = 0
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            delay = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.blocked_until - now,
+            )
+            return max(0.0, delay), self._generation
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Books one request and `tokens` tokens. Returns the delay before sending."""
+        return self._reserve(tokens)[0]
+
+    def try_reserve(self, tokens: int = 0) -> float:
+        """
+        Books one request and `tokens` tokens only if the budget has them now.
+        Returns 0 when booked, else the seconds to wait before asking again.
+        Used by schedulers that keep their own queue (llm_broker).
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now,
+                       self.requests.shortfall(1, now),
+                       self.tokens.shortfall(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.reserve(1, now)
+            self.tokens.reserve(tokens, now)
+            return 0.0
+
+    def _still_valid(self, generation):
+        with self._lock:
+            return generation == self._generation
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Waits until one request (and `tokens` tokens) may be sent. Returns the time waited."""
+        waited = 0.0
+        delay, generation = self._reserve(tokens)
+        while delay > 0:
+            time.sleep(delay)
+            waited += delay
+            if self._still_valid(generation):
+                break
+            # Throttled while we were queued: take a new place at the reduced rate
+            delay, generation = self._reserve(tokens)
+        return waited
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        waited = 0.0
+        delay, generation = self._reserve(tokens)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+            if self._still_valid(generation):
+                break
+            delay, generation = self._reserve(tokens)
+        return waited
+
+    def pending_delay(self) -> float:
+        """How long a new request would currently have to wait."""
+        with self._lock:
+            now = time.monotonic()
+            return max(0.0, self.blocked_until - now, self.requests.backlog(now), self.tokens.backlog(now))
+
+    async def pending_delay_async(self) -> float:
+        return self.pending_delay()
+
+    def finish(self):
+        """Called when a call ends without a response (connection error, timeout). Nothing to undo locally."""
+
+    def settle(self, reserved: int, actual):
+        """Corrects the token bucket once the real usage is known."""
+        if actual is None:
+            return
+        with self._lock:
+            if actual < reserved:
+                self.tokens.refund(reserved - actual)
+            elif actual > reserved:
+                self.tokens.reserve(actual - reserved, time.monotonic())
+
+    async def settle_async(self, reserved: int, actual):
+        self.settle(reserved, actual)
+
+    async def observe_async(self, status: int, headers=None, sent_at: float = None) -> float:
+        return self.observe(status, headers, sent_at)
+
+    def observe(self, status: int, headers=None, sent_at: float = None) -> float:
+        """
+        Feeds a response back into the limiter. `sent_at` is the time.monotonic()
+        at which the request went out. Returns the number of seconds the pair
+        is blocked for when the response was a 429, else 0.
+        """
+        info = parse_rate_headers(headers)
+        with self._lock:
+            now = time.monotonic()
+            for kind, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+                limit = info.get(f'limit_{kind}')
+                if limit and limit * HEADER_MARGIN != bucket.per_minute:
+                    bucket.set_rate(limit * HEADER_MARGIN)
+                    self.learned = True
+                remaining = info.get(f'remaining_{kind}')
+                if remaining is not None and not bucket.unlimited:
+                    bucket._refill(now)
+                    bucket.level = min(bucket.level, remaining)
+                    if remaining <= 0 and info.get(f'reset_{kind}'):
+                        self.blocked_until = max(self.blocked_until, now + info[f'reset_{kind}'])
+
+            if status == 429:
+                self.throttled += 1
+                # Only requests sent after the last back-off can start a new episode, so a
+                # wave of concurrent rejections slows the pair down once, not once per request
+                new_episode = (now if sent_at is None else sent_at) >= self._episode_until
+                if new_episode:
+                    self._strikes += 1
+                wait = info.get('retry_after')
+                if wait is None:
+                    wait = min(MAX_BACKOFF, 2 ** self._strikes)
+                self.blocked_until = max(self.blocked_until, now + wait)
+                if new_episode:
+                    self._episode_until = self.blocked_until
+                    self._generation += 1
+                    if not self.requests.unlimited:
+                        # Queued callers re-reserve, so restart the queue empty and without a burst
+                        self.requests._refill(now)
+                        self.requests.level = 0.0
+                        if not self.learned:
+                            self.requests.set_rate(max(1.0, self.requests.per_minute * DECREASE_FACTOR))
+                return max(0.0, self.blocked_until - now)
+
+            if 200 <= status < 300:
+                self._strikes = 0
+                if (not self.learned and self.configured_rpm
+                        and self.requests.per_minute < self.configured_rpm
+                        and now - self._episode_until > RECOVERY_DELAY):
+                    self.requests.set_rate(min(self.configured_rpm,
+                                               self.requests.per_minute * (1 + RECOVERY_STEP)))
+        return 0.0
+
+def _env_number(name):
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+class RateLimitRegistry:
+    """Lazily creates one ProviderLimit per (provider, model)."""
+    def __init__(self, default_rpm: float, default_tpm: float = 0):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, kind, provider_name, default):
+        for name in (f"LLM_{kind}_{provider_name.upper()}", f"LLM_{kind}"):
+            value = _env_number(name)
+            if value is not None:
+                return value
+        return default
+
+    def get(self, provider, model: str) -> ProviderLimit:
+        provider_name = getattr(provider, 'value', str(provider))
+        key = (provider_name, model)
+        with self._lock:
+            limit = self._limits.get(key)
+            if limit is None:
+                limit = ProviderLimit(
+                    f"{provider_name}/{model}",
+                    self._budget("RPM", provider_name, self.default_rpm),
+                    self._budget("TPM", provider_name, self.default_tpm),
+                )
+                self._limits[key] = limit
+            return limit
+
+    def summary(self):
+        """Pairs that were throttled, as {name: 429 count}."""
+        with self._lock:
+            return {l.name: l.throttled for l in self._limits.values() if l.throttled}
@@ -0,0 +1,205 @@
+"""
+Persistent cache of LLM responses (opt-in).
+
+Responses are stored in a local SQLite database keyed by a hash of
+(provider, model, temperature, normalized prompt), so rerunning a translation
+on the same input (after a crash, or to change only the styling) answers the
+unchanged chunks locally instead of calling the provider again.
+
+Entries older than the TTL are ignored and purged, and once the database
+holds more than the size budget the least recently used entries are evicted.
+A prompt that is sent a second time within one process is treated as a
+retry: it bypasses the cache, and the fresh answer replaces the cached one.
+
+Environment:
+    LLM_CACHE=1                  enable the cache (off by default)
+    LLM_CACHE_DB=...             database path (default ~/.cache/autosub/llm_cache.db)
+    LLM_CACHE_MAX_MB=256         size budget for cached responses
+    LLM_CACHE_TTL_DAYS=30        entry lifetime (0 = never expire)
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_ENABLED = os.environ.get("LLM_CACHE", "0") == "1"
+CACHE_DB = os.environ.get("LLM_CACHE_DB") or os.path.join(os.path.expanduser("~"), ".cache", "autosub", "llm_cache.db")
+CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "256"))
+CACHE_TTL_DAYS = float(os.environ.get("LLM_CACHE_TTL_DAYS", "30"))
+
+# Eviction frees down to this fraction of the budget, so it does not run on every insert
+EVICT_TO = 0.9
+
+_TRAILING_WS_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+
+def normalize_prompt(prompt: str) -> str:
+    """Line endings and trailing whitespace do not change the answer; everything else does."""
+    return _TRAILING_WS_RE.sub('', prompt.replace('\r\n', '\n')).strip()
+
+def cache_key(provider, model: str, temperature, prompt: str) -> str:
+    provider = getattr(provider, 'value', provider)
+    payload = json.dumps([provider, model, temperature, normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS responses (
+        key TEXT PRIMARY KEY,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+    """
+
+    def __init__(self, db_path=CACHE_DB, max_bytes=CACHE_MAX_MB * 1024 * 1024, ttl_days=CACHE_TTL_DAYS):
+        self.db_path = db_path
+        self.max_bytes = int(max_bytes)
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self._lock = threading.Lock()
+        self._seen = set()  # keys answered (from cache or live) in this process
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+        self.purge_expired()
+        with self._lock:
+            self._bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, provider, model: str, temperature, prompt: str):
+        """Cached response text, or None on a miss, an expired entry or a retried prompt."""
+        return self.lookup([(provider, model, temperature)], prompt)
+
+    def lookup(self, targets, prompt: str):
+        """
+        First cached response for any of `targets` ((provider, model, temperature)
+        tuples, in preference order). Counts as one hit or miss.
+        """
+        keys = [cache_key(p, m, t, prompt) for p, m, t in targets]
+        now = time.time()
+        with self._lock:
+            if any(key in self._seen for key in keys):
+                self.bypassed += 1
+                return None
+            for key in keys:
+                row = self.conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl and now - row[1] > self.ttl):
+                    continue
+                with self.conn:
+                    self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._seen.update(keys)
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, provider, model: str, temperature, prompt: str, response: str):
+        if not response:
+            return
+        key = cache_key(provider, model, temperature, prompt)
+        size = len(response.encode('utf-8')) + len(key)
+        now = time.time()
+        provider = getattr(provider, 'value', provider)
+        with self._lock:
+            self._seen.add(key)
+            with self.conn:
+                old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses(key, provider, model, response, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, provider, model, response, size, now, now),
+                )
+            self._bytes += size - (old[0] if old else 0)
+            self.stores += 1
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the cache is back under EVICT_TO of its budget."""
+        # Other processes may have written meanwhile: recount before deciding
+        self._bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = self._bytes - int(self.max_bytes * EVICT_TO)
+        if excess <= 0:
+            return
+        victims, freed = [], 0
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        with self.conn:
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self._bytes -= freed
+        self.evictions += len(victims)
+
+    def purge_expired(self) -> int:
+        if not self.ttl:
+            return 0
+        with self._lock, self.conn:
+            cur = self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        return cur.rowcount
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+            self._bytes = 0
+            self._seen.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {'entries': entries, 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                    'bypassed': self.bypassed, 'stores': self.stores, 'evictions': self.evictions}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_CACHE = None
+def get_cache():
+    """Process-wide response cache, or None when disabled or unavailable."""
+    global _CACHE
+    if not CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        try:
+            _CACHE = ResponseCache()
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM response cache unavailable: {e}")
+            return None
+    return _CACHE
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Persistent LLM response cache")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    sub.add_parser('stats')
+    sub.add_parser('purge')
+    sub.add_parser('clear')
+    args = parser.parse_args()
+
+    cache = ResponseCache()
+    if args.cmd == 'purge':
+        print(f"🧹 Removed {cache.purge_expired()} expired response(s).")
+    elif args.cmd == 'clear':
+        cache.clear()
+        print("🧹 Cache cleared.")
+    print(cache.stats())
+
+if __name__ == "__main__":
+    main()
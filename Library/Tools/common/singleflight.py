@@ -0,0 +1,156 @@
+"""
+Coalescing of identical in-flight LLM requests ("singleflight").
+
+When a request arrives while an identical one (same prompt, model and
+fallback setting) is already in flight, the caller waits for the first
+call's result instead of making its own. Within a process this covers
+threads and asyncio tasks alike; with a broker advertised by a parent
+process (see llm_broker.py) it also covers sibling processes.
+
+Environment:
+    LLM_COALESCE=0               disable coalescing
+"""
+import os
+import json
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+
+from response_cache import normalize_prompt
+
+COALESCE_ENABLED = os.environ.get("LLM_COALESCE", "1") != "0"
+
+def flight_key(prompt: str, model_name, fallback: bool) -> str:
+    payload = json.dumps([model_name, bool(fallback), normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SingleFlight:
+    def __init__(self, broker=None):
+        self.broker = broker
+        self._calls = {}  # key -> concurrent.futures.Future of the leading call
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0  # waited on a call in this process
+        self.coalesced_remote = 0  # waited on a call in another process
+
+    def _join(self, key):
+        """Returns (future, is_leader)."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = concurrent.futures.Future()
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    # --- Cross-process ---
+
+    def _remote_claim(self, key):
+        """(connection, role) from the broker, or None when there is none or it is unreachable."""
+        if self.broker is None:
+            return None
+        try:
+            return self.broker.claim(key)
+        except Exception as e:
+            print(f"⚠️ LLM broker unreachable, coalescing within this process only: {e}")
+            self.broker = None
+            return None
+
+    def _remote_wait(self, conn):
+        """Waits for another process's answer. Returns (True, text) or (False, None) to call ourselves."""
+        try:
+            reply = conn.recv()
+        except (EOFError, OSError):
+            reply = ("retry",)
+        finally:
+            conn.close()
+        if reply[0] == "done":
+            self.coalesced_remote += 1
+            return True, reply[1]
+        if reply[0] == "failed":
+            self.coalesced_remote += 1
+            raise Exception(reply[1])
+        return False, None
+
+    @staticmethod
+    def _remote_publish(conn, result=None, error=None):
+        if conn is None:
+            return
+        try:
+            conn.send(("failed", str(error)) if error is not None else ("done", result))
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    # --- Entry points ---
+
+    def do(self, key: str, fn):
+        """Returns fn(), or the result of an identical call already in flight."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        conn = None
+        try:
+            claim = self._remote_claim(key)
+            if claim is not None:
+                conn, role = claim
+                if role == "follower":
+                    waiting, conn = conn, None
+                    answered, result = self._remote_wait(waiting)
+                    if answered:
+                        self._finish(key, future, result)
+                        return result
+            result = fn()
+        except BaseException as e:
+            # Including cancellation: waiting threads and processes must not hang
+            self._remote_publish(conn, error=e)
+            self._finish(key, future, error=e)
+            raise
+        self._remote_publish(conn, result)
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key: str, coro_fn):
+        """Coroutine version of `do`; broker I/O runs in the broker client's threads."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        conn = None
+        loop = asyncio.get_running_loop()
+        # Not the default executor: aiohttp resolves hosts there, and waits must not starve it
+        executor = getattr(self.broker, 'claim_executor', None)
+        try:
+            claim = await loop.run_in_executor(executor, self._remote_claim, key) if self.broker is not None else None
+            if claim is not None:
+                conn, role = claim
+                if role == "follower":
+                    waiting, conn = conn, None
+                    answered, result = await loop.run_in_executor(executor, self._remote_wait, waiting)
+                    if answered:
+                        self._finish(key, future, result)
+                        return result
+            result = await coro_fn()
+        except BaseException as e:
+            # Including cancellation: waiting threads and processes must not hang
+            self._remote_publish(conn, error=e)
+            self._finish(key, future, error=e)
+            raise
+        self._remote_publish(conn, result)
+        self._finish(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced,
+                    'coalesced_remote': self.coalesced_remote, 'in_flight': len(self._calls)}
@@ -0,0 +1,215 @@
+"""
+On-disk cache of parsed subtitle tracks.
+
+Entries are keyed by absolute path and validated against file size, mtime
+and a BLAKE2b content hash. A matching size+mtime is trusted directly; if
+only the content hash matches (file touched or copied), the entry is reused
+and re-stamped. The cache directory is bounded in size and evicts least
+recently used entries first. A small in-process LRU sits in front of it.
+
+Environment:
+    AUTOSUB_SRT_CACHE=0          disable the cache
+    AUTOSUB_SRT_CACHE_DIR=...    cache directory (default ~/.cache/autosub/srt)
+    AUTOSUB_SRT_CACHE_MB=256     maximum on-disk size
+"""
+import os
+import sys
+import time
+import struct
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+
+from subtitle_track import SubtitleTrack
+
+CACHE_ENABLED = os.environ.get("AUTOSUB_SRT_CACHE", "1") != "0"
+CACHE_DIR = os.environ.get("AUTOSUB_SRT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "autosub", "srt")
+CACHE_MAX_BYTES = int(os.environ.get("AUTOSUB_SRT_CACHE_MB", "256")) * 1024 * 1024
+
+# v2: tracks parsed with unreadable cues dropped are no longer cached
+_MAGIC = b"ASTC2\0"
+# size, mtime_ns, recorded_at_ns, cue count, text bytes, content hash
+_HEADER = struct.Struct("<6sqqqqq16s")
+# Files modified this close to when they were recorded may change again within
+# the same mtime tick, so their size+mtime alone is not trusted.
+_RACY_WINDOW_NS = 2 * 1000**3
+
+def _file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+def _to_le(arr):
+    if sys.byteorder == 'big':
+        arr = array('q', arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def _from_le(buf):
+    arr = array('q')
+    arr.frombytes(buf)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+class TrackCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, memory_entries=32):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # abs path -> (size, mtime_ns, track)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, abs_path):
+        key = hashlib.blake2b(os.path.normcase(abs_path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, key + ".trk")
+
+    def load(self, path, parse_fn):
+        """
+        Returns the parsed track for `path`, from cache when the file is
+        unchanged, otherwise by calling `parse_fn(path)` and storing the result.
+        """
+        abs_path = os.path.abspath(path)
+        st = os.stat(abs_path)
+
+        with self._lock:
+            mem = self._memory.get(abs_path)
+            if mem and mem[0] == st.st_size and mem[1] == st.st_mtime_ns:
+                self._memory.move_to_end(abs_path)
+                self.hits += 1
+                return mem[2]
+
+        entry = self._entry_path(abs_path)
+        digest = None
+        try:
+            track, digest = self._read(entry, st, abs_path)
+        except (OSError, ValueError, struct.error):
+            track = None
+
+        if track is None:
+            self.misses += 1
+            # Hash before parsing so a concurrent rewrite can never be stored under the new content
+            digest = digest or _file_digest(abs_path)
+            track = parse_fn(abs_path)
+            try:
+                self._write(entry, st, digest, track)
+            except OSError:
+                pass
+        else:
+            self.hits += 1
+
+        self._remember(abs_path, st, track)
+        return track
+
+    def _remember(self, abs_path, st, track):
+        if time.time_ns() - st.st_mtime_ns <= _RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._memory[abs_path] = (st.st_size, st.st_mtime_ns, track)
+            self._memory.move_to_end(abs_path)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read(self, entry, st, abs_path):
+        """Returns (track or None, content digest if it had to be computed)."""
+        if not os.path.exists(entry):
+            return None, None
+        with open(entry, 'rb') as f:
+            header = f.read(_HEADER.size)
+            magic, size, mtime_ns, recorded_ns, n, text_len, digest = _HEADER.unpack(header)
+            if magic != _MAGIC:
+                return None, None
+
+            fresh = size == st.st_size and mtime_ns == st.st_mtime_ns and recorded_ns - mtime_ns > _RACY_WINDOW_NS
+            current = None
+            if not fresh:
+                current = _file_digest(abs_path)
+                if current != digest:
+                    return None, current
+
+            starts = _from_le(f.read(8 * n))
+            ends = _from_le(f.read(8 * n))
+            indices = _from_le(f.read(8 * n))
+            offsets = _from_le(f.read(8 * (n + 1)))
+            text = f.read(text_len).decode('utf-8')
+
+        if len(offsets) != n + 1 or (n and offsets[-1] != len(text)):
+            raise ValueError("truncated cache entry")
+
+        if not fresh:
+            # Same content under a new mtime: re-stamp so the next lookup is stat-only
+            try:
+                self._write(entry, st, digest, SubtitleTrack(starts, ends, indices, offsets, text))
+            except OSError:
+                pass
+        else:
+            # Bump mtime of the entry itself for LRU eviction
+            try: os.utime(entry)
+            except OSError: pass
+        return SubtitleTrack(starts, ends, indices, offsets, text), current
+
+    def _write(self, entry, st, digest, track):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Offsets of a sliced view are relative to the shared text; rebase to this track
+        base = track._offsets[0] if len(track._offsets) else 0
+        offsets = array('q', (o - base for o in track._offsets)) if base else array('q', track._offsets)
+        text = track._text[base:base + (offsets[-1] if len(offsets) else 0)].encode('utf-8')
+
+        n = len(track)
+        header = _HEADER.pack(_MAGIC, st.st_size, st.st_mtime_ns, time.time_ns(), n, len(text), digest)
+        tmp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.write(_to_le(array('q', track._starts)))
+            f.write(_to_le(array('q', track._ends)))
+            f.write(_to_le(array('q', track._indices)))
+            f.write(_to_le(offsets))
+            f.write(text)
+        os.replace(tmp, entry)
+        self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the directory fits `max_bytes`."""
+        try:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for e in it:
+                    if e.name.endswith(".trk"):
+                        s = e.stat()
+                        entries.append((s.st_mtime_ns, s.st_size, e.path))
+                        total += s.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".trk"):
+                    try: os.remove(os.path.join(self.cache_dir, name))
+                    except OSError: pass
+
+_CACHE = None
+def get_cache():
+    global _CACHE
+    if not _CACHE:
+        _CACHE = TrackCache()
+    return _CACHE
@@ -1,101 +1,172 @@
 
 import os
+import io
 import re
 import glob
 
+from subtitle_track import SubtitleTrack
+from interval_join import overlap_join
+import srt_cache
+from subtitle_format import write_subtitles
+
 def time_to_seconds(timestr):
     parts = timestr.replace(',', '.').split(':')
     return float(parts[0])*3600 + float(parts[1])*60 + float(parts[2])
 
+# Precompiled once: end timestamp with optional text glued onto it (00:00:10,000Text...)
+_END_TS_RE = re.compile(r"(\d{1,2}:\d{2}:\d{2}[\.,]\d{3})(.*)")
+
+def _build_cue(lines, idx_counter):
+    """
+    Turns the non-empty lines of one raw block into a cue dict, or None if
+    the block carries no timestamp. Robust against malformed blocks; raises
+    ValueError when the timestamp line cannot be read.
+    """
+    if len(lines) < 2:
+        return None
+
+    # Robust parsing for malformed blocks
+    if lines[0].isdigit() and '-->' in lines[1]:
+        idx = lines[0]
+        time = lines[1]
+        text = lines[2:]
+    elif '-->' in lines[0]:
+        idx = str(idx_counter)
+        time = lines[0]
+        text = lines[1:]
+    else:
+        for i, l in enumerate(lines):
+            if '-->' in l:
+                time = l
+                text = lines[i+1:]
+                idx = str(idx_counter)
+                break
+        else:
+            return None
+
+    # Handle cases where text might be merged into the timestamp line
+    time_parts = time.split('-->')
+    start_str = time_parts[0].strip()
+    rem = time_parts[1].strip()
+
+    m = _END_TS_RE.match(rem)
+    if m:
+        end_str = m.group(1)
+        extra_text = m.group(2).strip()
+        if extra_text:
+            text = [extra_text] + text
+    else:
+        end_str = rem
+
+    try:
+        start, end = time_to_seconds(start_str), time_to_seconds(end_str)
+    except (ValueError, IndexError):
+        raise ValueError(f"unreadable timestamp in cue {idx}: {time!r}") from None
+
+    return {
+        'index': idx,
+        'time': time,
+        'start': start,
+        'end': end,
+        'lines': text
+    }
+
+def iter_srt(path_or_fileobj, skip_bad=False):
+    """
+    Streams cues from an SRT file path or an open text file object.
+    Yields one block dict at a time ({'index', 'time', 'start', 'end', 'lines'})
+    without ever holding the whole file in memory.
+    A cue with an unreadable timestamp raises ValueError, or with `skip_bad`
+    is dropped and reported in one warning for the file.
+    """
+    if isinstance(path_or_fileobj, str):
+        with open(path_or_fileobj, 'r', encoding='utf-8') as f:
+            yield from iter_srt(f, skip_bad)
+        return
+
+    skipped = []
+
+    def build(lines, idx_counter):
+        if not skip_bad:
+            return _build_cue(lines, idx_counter)
+        try:
+            return _build_cue(lines, idx_counter)
+        except ValueError as e:
+            skipped.append(str(e))
+            return None
+
+    # State machine: collect non-empty lines until a blank line closes the block
+    pending = []
+    idx_counter = 1
+    first = True
+    for raw in path_or_fileobj:
+        if first:
+            raw = raw.lstrip('\ufeff')
+            first = False
+        line = raw[:-1] if raw.endswith('\n') else raw
+        if line.endswith('\r'):
+            line = line[:-1]
+        if not line:
+            if pending:
+                cue = build(pending, idx_counter)
+                pending = []
+                if cue:
+                    idx_counter += 1
+                    yield cue
+            continue
+        line = line.strip()
+        if line:
+            pending.append(line)
+
+    if pending:
+        cue = build(pending, idx_counter)
+        if cue:
+            yield cue
+
+    if skipped:
+        name = os.path.basename(getattr(path_or_fileobj, 'name', '')) or "SRT input"
+        print(f"⚠️ {name}: skipped {len(skipped)} cue(s), first: {skipped[0]}")
+
 def parse_srt(content_or_path):
     """
     Parses SRT content (string) or file path into a list of blocks.
     Each block is a dictionary: {'index': str, 'time': str, 'lines': list}
+    Index and time strings are returned as written in the file; use
+    load_track for the cached, normalised track.
     """
     if os.path.isfile(content_or_path):
-        with open(content_or_path, 'r', encoding='utf-8') as f:
-            content = f.read().lstrip('\ufeff')
-    else:
-        content = content_or_path
+        return list(iter_srt(content_or_path))
+    return list(iter_srt(io.StringIO(content_or_path.lstrip('\ufeff'))))
 
-    content = content.replace('\r\n', '\n')
-    blocks = re.split(r'\n\n+', content.strip())
-    parsed = []
-    
-    idx_counter = 1
-    
-    for block in blocks:
-        lines = block.split('\n')
-        lines = [l.strip() for l in lines if l.strip()]
-        if len(lines) >= 2:
-            idx = None
-            time = None
-            text = []
-
-            # Robust parsing for malformed blocks
-            if lines[0].isdigit() and '-->' in lines[1]:
-                idx = lines[0]
-                time = lines[1]
-                text = lines[2:]
-            elif '-->' in lines[0]:
-                idx = str(idx_counter)
-                time = lines[0]
-                text = lines[1:]
-            else:
-                found_time = False
-                for i, l in enumerate(lines):
-                    if '-->' in l:
-                        time = l
-                        text = lines[i+1:]
-                        idx = str(idx_counter)
-                        found_time = True
-                        break
-                if not found_time:
-                    continue
-
-            if '-->' in time:
-                # Handle cases where text might be merged into the timestamp line
-                time_parts = time.split('-->')
-                start_str = time_parts[0].strip()
-                rem = time_parts[1].strip()
-                
-                # Check if there is text joined to the end timestamp
-                # Format: 00:00:10,000Text...
-                m = re.match(r"(\d{1,2}:\d{2}:\d{2}[\.,]\d{3})(.*)", rem)
-                if m:
-                    end_str = m.group(1)
-                    extra_text = m.group(2).strip()
-                    if extra_text:
-                        text = [extra_text] + text
-                else:
-                    end_str = rem
-
-                start_sec = time_to_seconds(start_str)
-                end_sec = time_to_seconds(end_str)
-            else:
-                start_sec = 0.0
-                end_sec = 0.0
-
-            parsed.append({
-                'index': idx,
-                'time': time,
-                'start': start_sec,
-                'end': end_sec,
-                'lines': text
-            })
-            idx_counter += 1
-    return parsed
+def _parse_track(path):
+    return SubtitleTrack.from_cues(iter_srt(path))
+
+def load_track(path, skip_bad=False):
+    """
+    Parses an SRT file into a compact SubtitleTrack.
+    Served from the parsed-track cache when the file has not changed.
+    Raises ValueError on an unreadable timestamp unless `skip_bad`, which
+    drops such cues with a warning (the tolerant parse is not cached).
+    """
+    try:
+        if srt_cache.CACHE_ENABLED:
+            return srt_cache.get_cache().load(path, _parse_track)
+        return _parse_track(path)
+    except ValueError:
+        if not skip_bad:
+            raise
+    return SubtitleTrack.from_cues(iter_srt(path, skip_bad=True))
+
+def count_srt(path):
+    """Returns the number of blocks in an SRT file without building the list."""
+    if srt_cache.CACHE_ENABLED:
+        return len(load_track(path))
+    return sum(1 for _ in iter_srt(path))
 
 def write_srt(subs, path):
-    """Writes a list of subtitle blocks to a file."""
-    with open(path, 'w', encoding='utf-8') as f:
-        for i, sub in enumerate(subs):
-            f.write(f"{i+1}\n") 
-            f.write(f"{sub['time']}\n")
-            for line in sub['lines']:
-                f.write(f"{line}\n")
-            f.write("\n")
-    print(f"Wrote {len(subs)} entries to {path}")
+    """Writes an iterable of subtitle blocks (dicts or Cue views) to a file."""
+    count = write_subtitles(subs, path, "srt")
+    print(f"Wrote {count} entries to {path}")
 
 def is_chinese(text):
     """Checks if text contains Chinese characters."""
@@ -118,25 +189,12 @@ def extract_tracks(input_path, output_dir=None):
     path_en = os.path.join(output_dir, f"{base}.en.srt")
     path_cn = os.path.join(output_dir, f"{base}.zh.srt")
     
-    subs = parse_srt(input_path)
-    subs_en = []
-    subs_cn = []
+    track = load_track(input_path)
     
-    for sub in subs:
-        lines_en = [l for l in sub['lines'] if not is_chinese(l) and '[UNTRANSLATED]' not in l]
-        lines_cn = [l for l in sub['lines'] if is_chinese(l) or '[UNTRANSLATED]' in l]
-        
-        # If a block has NO English but has Chinese (or vice versa), we might want to keep the block structure?
-        # Standard practice: keep the block but with empty text? Or skip?
-        # Let's keep the block structure to maintain sync easily.
-        
-        sub_en = sub.copy()
-        sub_en['lines'] = lines_en 
-        subs_en.append(sub_en)
-        
-        sub_cn = sub.copy()
-        sub_cn['lines'] = lines_cn
-        subs_cn.append(sub_cn)
+    # Keep the block structure (even if one side ends up empty) to maintain sync easily.
+    # Timing arrays are shared between the two derived tracks; only text is rebuilt.
+    subs_en = track.with_lines(lambda c: [l for l in c.lines if not is_chinese(l) and '[UNTRANSLATED]' not in l])
+    subs_cn = track.with_lines(lambda c: [l for l in c.lines if is_chinese(l) or '[UNTRANSLATED]' in l])
         
     write_srt(subs_en, path_en)
     write_srt(subs_cn, path_cn)
@@ -150,13 +208,13 @@ def split_to_chunks(input_path, chunk_size=30, output_dir=None):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    subs = parse_srt(input_path)
+    subs = load_track(input_path)
     total_chunks = (len(subs) + chunk_size - 1) // chunk_size
     
     created_files = []
     
     for i in range(total_chunks):
-        chunk = subs[i*chunk_size : (i+1)*chunk_size]
+        chunk = subs[i*chunk_size : (i+1)*chunk_size] # View, no copy
         filename = os.path.join(output_dir, f"chunk_{i:03d}.srt")
         write_srt(chunk, filename)
         created_files.append(filename)
@@ -170,19 +228,33 @@ def merge_chunks(chunks_dir, output_path, pattern="chunk_*.srt"):
         print(f"No files found matching {pattern} in {chunks_dir}")
         return False
 
-    all_subs = []
-    # We must trust that chunks are ordered correctly by filename
-    for fp in files:
-        subs = parse_srt(fp)
-        all_subs.extend(subs)
-        
-    # Renumbering
-    for i, sub in enumerate(all_subs):
-        sub['index'] = str(i+1)
-        
-    write_srt(all_subs, output_path)
+    def stream_all():
+        # We must trust that chunks are ordered correctly by filename
+        for fp in files:
+            yield from iter_srt(fp)
+
+    # write_srt renumbers sequentially as it streams
+    write_srt(stream_all(), output_path)
     return True
 
+# Separator that cannot occur in subtitle text, so one regex pass can clean many entries at once
+_BATCH_SEP = '\x00'
+_WS_RE = re.compile(r'\s+')
+# Remove "(English)" or "（English）" annotations after a translation
+_PAREN_RE = re.compile(r'\s*[\(\（][^\)\）\x00]*[\)\）]')
+
+def clean_joined_translations(texts):
+    """
+    Normalises whitespace and strips parenthesised annotations from a list of
+    joined translation strings in a single batched regex pass.
+    """
+    if not texts:
+        return []
+    blob = _BATCH_SEP.join(t.replace(_BATCH_SEP, ' ') for t in texts)
+    blob = _WS_RE.sub(' ', blob)
+    blob = _PAREN_RE.sub('', blob)
+    return [t.strip() for t in blob.split(_BATCH_SEP)]
+
 def merge_tracks(path_master, path_secondary, output_path):
     """
     Merges two SRT files using time-based overlap detection (Smart Merge).
@@ -192,17 +264,10 @@ def merge_tracks(path_master, path_secondary, output_path):
     CRITICAL CHANGE: This function now drives from the secondary (source) track to ensure no lines are dropped.
     If a translated block is missing, the original line is kept with an empty translation field.
     """
-    try:
-        from tqdm import tqdm
-    except ImportError:
-        def tqdm(iterable, desc=None, unit=None):
-            print(f"Processing... {desc}")
-            return iterable
-            
     print(f"Loading Master (Translation): {path_master}")
-    subs_master = parse_srt(path_master)
+    subs_master = load_track(path_master)
     print(f"Loading Secondary (Source): {path_secondary}")
-    subs_secondary = parse_srt(path_secondary)
+    subs_secondary = load_track(path_secondary)
     
     print("\\n--- Synchronization Safety Check ---")
     len_m = len(subs_master)
@@ -214,8 +279,8 @@ def merge_tracks(path_master, path_secondary, output_path):
         print("Driving merge from Secondary (Source) to prevent data loss.")
     
     if len_m > 0 and len_s > 0:
-        duration_m = subs_master[-1]['end'] - subs_master[0]['start'] if 'end' in subs_master[-1] else 0
-        duration_s = subs_secondary[-1]['end'] - subs_secondary[0]['start'] if 'end' in subs_secondary[-1] else 0
+        duration_m = subs_master.duration()
+        duration_s = subs_secondary.duration()
         print(f"Duration: Master={duration_m:.2f}s, Secondary={duration_s:.2f}s")
         
         if abs(duration_m - duration_s) > 5.0:
@@ -223,82 +288,39 @@ def merge_tracks(path_master, path_secondary, output_path):
             
     print("------------------------------------\\n")
     
-    merged = []
-    
-    # We iterate the SECONDARY (Source) track to ensure we don't lose any original lines
-    # We look for overlapping MASTER (Translated) blocks
+    # We drive from the SECONDARY (Source) track to ensure we don't lose any original lines,
+    # matching every Source block to its overlapping MASTER (Translated) blocks in one interval join.
+    # Match rules: overlap > 30% of the Master block's duration, or > 0.5s.
+    matches = overlap_join(
+        subs_secondary.starts_ms, subs_secondary.ends_ms,
+        subs_master.starts_ms, subs_master.ends_ms,
+        min_ratio=0.3, min_overlap_ms=500
+    )
+    joined = [" ".join(l.strip() for j in hits for l in subs_master[j].lines) for hits in matches]
     
-    start_search_idx = 0
-    total_master = len(subs_master)
+    # Single batched cleaning pass (whitespace + "Chinese (English)" removal)
+    translations = clean_joined_translations(joined)
     
-    for i, s_block in enumerate(tqdm(subs_secondary, desc="Smart Merging Blocks", unit="block")):
-        s_start = s_block['start']
-        s_end = s_block['end']
-        
-        # Move search window forward on Master track
-        while start_search_idx < total_master and subs_master[start_search_idx]['end'] < s_start:
-            start_search_idx += 1
-            
-        matched_text = [] # Usually Master text
-        
-        # Iterate from safe start index
-        for j in range(start_search_idx, total_master):
-            m_block = subs_master[j]
-            
-            # Stop if Master block starts after Secondary block ends
-            if m_block['start'] > s_end:
-                break
-            
-            # Overlap calculation
-            overlap_start = max(s_start, m_block['start'])
-            overlap_end = min(s_end, m_block['end'])
-            overlap_duration = max(0, overlap_end - overlap_start)
-            
-            m_duration = m_block['end'] - m_block['start']
-            
-            # Match rules: significant overlap
-            if m_duration > 0 and (overlap_duration / m_duration > 0.3):
-                matched_text.extend(m_block['lines'])
-            elif overlap_duration > 0.5: 
-                 matched_text.extend(m_block['lines'])
-        
-        # Deduplicate -> " ".join -> clean 
-        joined_trans = " ".join([l.strip() for l in matched_text]).replace('\n', ' ')
-        joined_trans = re.sub(r'\s+', ' ', joined_trans).strip()
-        
-        # CLEANING: Remove "Chinese (English)" pattern
-        # Remove (English) or （English）
-        joined_trans = re.sub(r'\s*[\(\（][^\)\）]*[\)\）]', '', joined_trans).strip()
-        
-        # Construct merged block
-        # Translation on top? No, usually Translation is Master, Source is Secondary.
-        # Check standard: usually we want CN on Top, EN on bottom? 
-        # Wait, the previous logic did: Master lines + Secondary lines.
-        # If Master was Top, Secondary was Bottom.
-        
-        # Here we drive from Secondary. So we have Secondary lines.
-        # We found matched Master lines (Translation).
-        
-        # Let's put Translation (Master) FIRST, then Source (Secondary).
-        new_lines = []
-        if joined_trans:
-            new_lines.append(joined_trans)
-        else:
-            # Mark missing translation explictly for gap-filling tools
-            new_lines.append("[UNTRANSLATED]")
-            
-        new_lines.extend(s_block['lines'])
-        
-        merged.append({
-            'index': str(i+1),
-            'time': s_block['time'], # Use Source timing which is reliable
-            'lines': new_lines
-        })
+    # Translation (Master) FIRST, then Source (Secondary). Source timing is reliable, so keep it.
+    # Missing translations are marked explicitly for gap-filling tools.
+    merged = subs_secondary.with_lines(
+        {i: [t or "[UNTRANSLATED]"] + s_block.lines
+         for i, (t, s_block) in enumerate(zip(translations, subs_secondary))}
+    )
+    missing = sum(1 for t in translations if not t)
+    print(f"Smart-merged {len(merged)} blocks ({missing} without translation).")
             
     write_srt(merged, output_path)
 
 def get_srt_duration(path):
     """Returns the total duration of an SRT file in seconds."""
-    subs = parse_srt(path)
-    if not subs: return 0
-    return subs[-1]['end'] - subs[0]['start']
+    if srt_cache.CACHE_ENABLED:
+        return load_track(path).duration()
+    first_start = None
+    last_end = None
+    for sub in iter_srt(path):
+        if first_start is None:
+            first_start = sub['start']
+        last_end = sub['end']
+    if first_start is None: return 0
+    return last_end - first_start
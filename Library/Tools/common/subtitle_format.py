@@ -0,0 +1,114 @@
+"""
+Shared subtitle serializer.
+
+All SRT / VTT / ASS timestamps are produced here from integer milliseconds
+through precomputed digit tables, and cue output is assembled in memory and
+written in large chunks instead of one write call per line.
+"""
+
+_D2 = [f"{i:02d}" for i in range(100)]
+_D3 = [f"{i:03d}" for i in range(1000)]
+
+# Flush threshold (characters) for buffered writers
+CHUNK_CHARS = 1 << 20
+
+def seconds_to_ms(t):
+    """Converts float seconds to integer milliseconds, rounding to nearest."""
+    return int(round(t * 1000))
+
+def format_timestamp(ms, style="srt"):
+    """
+    Formats integer milliseconds as a subtitle timestamp.
+    style: 'srt' (HH:MM:SS,mmm), 'vtt' (HH:MM:SS.mmm) or 'ass' (H:MM:SS.cc).
+    """
+    ms = int(ms)
+    if ms < 0:
+        ms = 0
+    s, frac = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    if style == "ass":
+        return f"{h}:{_D2[m]}:{_D2[s]}.{_D2[frac // 10]}"
+    hh = _D2[h] if h < 100 else str(h)
+    sep = "." if style == "vtt" else ","
+    return f"{hh}:{_D2[m]}:{_D2[s]}{sep}{_D3[frac]}"
+
+def format_srt_time(ms):
+    return format_timestamp(ms, "srt")
+
+def cue_bounds_ms(cue):
+    """Returns (start_ms, end_ms) for a Cue view or a legacy block dict, or None."""
+    if hasattr(cue, 'start_ms'):
+        return cue.start_ms, cue.end_ms
+    if 'start' in cue and 'end' in cue:
+        return seconds_to_ms(cue['start']), seconds_to_ms(cue['end'])
+    return None
+
+class SubtitleWriter:
+    """
+    Buffered cue writer for an open text file. Cues are numbered sequentially
+    and flushed to the file in large chunks.
+    """
+    def __init__(self, f, style="srt", chunk_chars=CHUNK_CHARS):
+        self.f = f
+        self.style = style
+        self.chunk_chars = chunk_chars
+        self.count = 0
+        self._parts = []
+        self._size = 0
+        if style == "vtt":
+            self._push("WEBVTT\n\n")
+
+    def _push(self, s):
+        self._parts.append(s)
+        self._size += len(s)
+        if self._size >= self.chunk_chars:
+            self.flush()
+
+    def add(self, start_ms, end_ms, lines, time_line=None):
+        """Appends one cue. `time_line` overrides the formatted timing line."""
+        self.count += 1
+        if time_line is None:
+            time_line = f"{format_timestamp(start_ms, self.style)} --> {format_timestamp(end_ms, self.style)}"
+        if isinstance(lines, str):
+            body = f"{lines}\n" if lines else ""
+        else:
+            body = "".join(f"{l}\n" for l in lines)
+        self._push(f"{self.count}\n{time_line}\n{body}\n")
+
+    def add_cue(self, cue):
+        """Appends a Cue view or legacy block dict."""
+        bounds = cue_bounds_ms(cue)
+        if bounds is None:
+            self.add(0, 0, cue['lines'], time_line=cue['time'])
+        else:
+            self.add(bounds[0], bounds[1], cue['lines'])
+
+    def flush(self):
+        if self._parts:
+            self.f.write("".join(self._parts))
+            self._parts = []
+            self._size = 0
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_subtitles(cues, path, style="srt"):
+    """Writes an iterable of cues to `path` in one buffered pass. Returns the cue count."""
+    with open(path, 'w', encoding='utf-8') as f, SubtitleWriter(f, style) as w:
+        iter_raw = getattr(cues, 'iter_raw', None)
+        if iter_raw is not None:
+            # SubtitleTrack: read the arrays directly instead of building Cue views
+            for start_ms, end_ms, text in iter_raw():
+                w.add(start_ms, end_ms, text)
+        else:
+            for cue in cues:
+                w.add_cue(cue)
+    return w.count
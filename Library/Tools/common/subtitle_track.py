@@ -0,0 +1,201 @@
+from array import array
+
+from subtitle_format import format_srt_time, seconds_to_ms
+
+class Cue:
+    """
+    Lightweight view onto one cue of a SubtitleTrack. Holds no text of its own.
+    Supports dict-style access ('index', 'time', 'start', 'end', 'lines') so
+    code written against the old list-of-dict blocks keeps working.
+    """
+    __slots__ = ('_track', '_pos')
+
+    def __init__(self, track, pos):
+        self._track = track
+        self._pos = pos
+
+    @property
+    def index(self):
+        return str(self._track._indices[self._pos])
+
+    @property
+    def start_ms(self):
+        return self._track._starts[self._pos]
+
+    @property
+    def end_ms(self):
+        return self._track._ends[self._pos]
+
+    @property
+    def start(self):
+        return self.start_ms / 1000.0
+
+    @property
+    def end(self):
+        return self.end_ms / 1000.0
+
+    @property
+    def time(self):
+        return f"{format_srt_time(self.start_ms)} --> {format_srt_time(self.end_ms)}"
+
+    @property
+    def text(self):
+        t = self._track
+        return t._text[t._offsets[self._pos]:t._offsets[self._pos + 1]]
+
+    @property
+    def lines(self):
+        text = self.text
+        return text.split('\n') if text else []
+
+    # --- dict adapter ---
+    _KEYS = ('index', 'time', 'start', 'end', 'lines')
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __contains__(self, key):
+        return key in self._KEYS
+
+    def keys(self):
+        return self._KEYS
+
+    def copy(self):
+        return {k: getattr(self, k) for k in self._KEYS}
+
+    def __repr__(self):
+        return f"Cue({self.index}, {self.time!r}, {self.lines!r})"
+
+class SubtitleTrack:
+    """
+    Compact, array-backed subtitle track.
+
+    Start/end times live in contiguous int64 millisecond arrays, and all cue
+    text is packed into a single string addressed by an offset array. Slicing
+    returns a view that shares the underlying buffers instead of copying them.
+    """
+    __slots__ = ('_starts', '_ends', '_indices', '_offsets', '_text')
+
+    def __init__(self, starts, ends, indices, offsets, text):
+        self._starts = starts
+        self._ends = ends
+        self._indices = indices
+        self._offsets = offsets
+        self._text = text
+
+    # --- Construction ---
+
+    @classmethod
+    def from_cues(cls, cues):
+        """
+        Builds a track from any iterable of block dicts (or Cue views)
+        carrying 'index', 'start', 'end' (seconds) and 'lines'.
+        """
+        starts = array('q')
+        ends = array('q')
+        indices = array('q')
+        offsets = array('q', [0])
+        parts = []
+        pos = 0
+        for n, cue in enumerate(cues, 1):
+            starts.append(seconds_to_ms(cue['start']))
+            ends.append(seconds_to_ms(cue['end']))
+            idx = str(cue.get('index', ''))
+            indices.append(int(idx) if idx.isdigit() else n)
+            text = '\n'.join(cue['lines'])
+            parts.append(text)
+            pos += len(text)
+            offsets.append(pos)
+        return cls(starts, ends, indices, offsets, ''.join(parts))
+
+    @classmethod
+    def empty(cls):
+        return cls(array('q'), array('q'), array('q'), array('q', [0]), '')
+
+    # --- Sequence protocol ---
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        for i in range(len(self._starts)):
+            yield Cue(self, i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            lo, hi, step = key.indices(len(self))
+            if step != 1:
+                return SubtitleTrack.from_cues(Cue(self, i) for i in range(lo, hi, step))
+            hi = max(lo, hi)
+            # memoryview slices share the parent buffers (no copy)
+            return SubtitleTrack(
+                memoryview(self._starts)[lo:hi],
+                memoryview(self._ends)[lo:hi],
+                memoryview(self._indices)[lo:hi],
+                memoryview(self._offsets)[lo:hi + 1],
+                self._text,
+            )
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("cue index out of range")
+        return Cue(self, key)
+
+    # --- Bulk accessors ---
+
+    @property
+    def starts_ms(self):
+        return self._starts
+
+    @property
+    def ends_ms(self):
+        return self._ends
+
+    def iter_raw(self):
+        """Yields (start_ms, end_ms, text) tuples straight from the arrays."""
+        text = self._text
+        offsets = self._offsets
+        for i, (s, e) in enumerate(zip(self._starts, self._ends)):
+            yield s, e, text[offsets[i]:offsets[i + 1]]
+
+    def duration(self):
+        """Seconds between the first cue start and the last cue end."""
+        if not len(self):
+            return 0
+        return (self._ends[-1] - self._starts[0]) / 1000.0
+
+    # --- Derivation ---
+
+    def with_lines(self, replacements):
+        """
+        Returns a new track with the lines of selected cues replaced.
+        `replacements` maps cue position -> list of lines (or a callable
+        taking a Cue and returning its new lines). Timing arrays are shared.
+        """
+        if callable(replacements):
+            new_lines = (replacements(c) for c in self)
+        else:
+            new_lines = (replacements.get(i, c.lines) for i, c in enumerate(self))
+        offsets = array('q', [0])
+        parts = []
+        pos = 0
+        for lines in new_lines:
+            text = '\n'.join(lines)
+            parts.append(text)
+            pos += len(text)
+            offsets.append(pos)
+        return SubtitleTrack(self._starts, self._ends, self._indices, offsets, ''.join(parts))
+
+    # --- Adapters ---
+
+    def to_blocks(self):
+        """Materialises the legacy list-of-dict representation."""
+        return [c.copy() for c in self]
+
+    def __repr__(self):
+        return f"SubtitleTrack({len(self)} cues, {self.duration():.2f}s)"
@@ -0,0 +1,143 @@
+"""
+Crash-safe journal of a translation run.
+
+smart_translate appends every chunk's parsed translations to a JSONL file
+next to the input (`<input>.journal.jsonl`) as soon as the chunk returns,
+flushed and fsynced, and the post-processing retries append to the same
+file. If the run is killed, the next run on that input loads the journal
+and only sends the blocks it does not cover.
+
+The first line identifies the run: a BLAKE2b hash of the input file and the
+settings that shape the translation (model, style, mode). A journal left by
+a different input or different settings is started over. A torn last line
+(killed mid-write) is ignored. The journal is removed once the translation
+has been saved.
+
+Environment:
+    AUTOSUB_JOURNAL=0            no journal (an interrupted run starts over)
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+
+JOURNAL_ENABLED = os.environ.get("AUTOSUB_JOURNAL", "1") != "0"
+JOURNAL_SUFFIX = ".journal.jsonl"
+VERSION = 1
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def journal_path(input_path: str) -> str:
+    return input_path + JOURNAL_SUFFIX
+
+class TranslationJournal:
+    """
+    Append-only {block ID: translation} log. Later entries win, so a retry
+    that improves a block simply appends it again.
+    """
+    def __init__(self, path: str, header: dict):
+        self.path = path
+        self.header = {'journal': VERSION, **header}
+        self._lock = threading.Lock()
+        self._file = None
+        self.entries = 0
+        self.resumed = {}
+
+    def load(self) -> Dict[str, str]:
+        """
+        Translations recorded by an earlier run with the same header, and
+        opens the journal for appending (a mismatching one is replaced).
+        """
+        blocks = {}
+        valid = 0  # bytes up to the last complete, parseable line
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        lines = data.split(b"\n")
+        try:
+            header = json.loads(lines[0]) if data else None
+        except ValueError:
+            header = None
+        if header == self.header:
+            valid = len(lines[0]) + 1
+            # The last element is "" after a complete line, or a torn write
+            for line in lines[1:-1]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                blocks.update(entry.get('blocks', {}))
+                self.entries += 1
+                valid += len(line) + 1
+        self._open(valid)
+        self.resumed = blocks
+        return blocks
+
+    def _open(self, valid: int):
+        if valid:
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(valid)
+            self._file.seek(valid)
+        else:
+            self._file = open(self.path, 'wb')
+            self._append(self.header)
+
+    def _append(self, obj: dict):
+        self._file.write(json.dumps(obj, ensure_ascii=False).encode('utf-8') + b"\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, blocks: Dict[str, str], source: str = "chunk"):
+        """Durably appends the translations of one finished chunk."""
+        if not blocks:
+            return
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._append({'source': source, 'blocks': blocks})
+                self.entries += 1
+            except OSError as e:
+                print(f"⚠️ Journal write failed, continuing without it: {e}")
+                self._close()
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def discard(self):
+        """Closes and deletes the journal (the run's output is safely written)."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def open_journal(input_path: str, **settings) -> Optional[TranslationJournal]:
+    """Journal for translating `input_path` with `settings`, or None if disabled/unwritable."""
+    if not JOURNAL_ENABLED:
+        return None
+    try:
+        journal = TranslationJournal(journal_path(input_path),
+                                     {'source': _file_digest(input_path), **settings})
+        journal.load()
+        return journal
+    except OSError as e:
+        print(f"⚠️ Translation journal unavailable ({e}). An interrupted run will start over.")
+        return None
@@ -0,0 +1,404 @@
+"""
+Translation memory built from finished projects.
+
+Every translated line under Projects/*/ (a `.cn.srt` paired with its English
+source, or a `.bi.srt`) is indexed in a local SQLite database with an FTS5
+full-text index over the normalized source text. Lookups are exact first
+(normalized text equality, most frequent translation wins) and then, when
+AUTOSUB_TM_FUZZY is set, fuzzy (FTS5 candidates re-scored by character
+similarity). Lines shorter than EXACT_MIN_TOKENS / FUZZY_MIN_TOKENS are
+never reused: "yeah" or "right" depend on their context.
+
+A fuzzy hit is reused as is, so near-identical lines that differ in what
+they say must not match: "I paid 30 dollars" vs "I paid 80 dollars" or
+"we should not ship" vs "we should now ship" score above 0.95. A fuzzy
+candidate is only taken when its numbers and negation words are the same
+as the query's. Fuzzy reuse is off unless AUTOSUB_TM_FUZZY is set.
+
+Files written by smart_translate are recorded with the style and
+translation mode they were made with. A lookup reuses only lines made
+with the same style and mode; a lookup that names neither (gap filling)
+reuses only files without a recorded style, i.e. found by a scan.
+Callers pass their own project folder as `exclude_dir`, so a re-run never
+reads back its own earlier output.
+
+The index is updated incrementally: files are re-read only when their size
+or mtime changed, and removed projects are dropped on the next scan.
+
+Environment:
+    AUTOSUB_TM=0                 disable the translation memory
+    AUTOSUB_TM_DB=...            database path (default ~/.cache/autosub/translation_memory.db)
+    AUTOSUB_TM_ROOTS=...         Projects folders to index (os.pathsep separated)
+    AUTOSUB_TM_FUZZY=0           minimum similarity for a fuzzy hit, e.g. 0.92 (0 = exact hits only)
+"""
+import os
+import re
+import sys
+import glob
+import sqlite3
+import threading
+from difflib import SequenceMatcher
+
+import srt_utils
+from interval_join import best_overlap
+
+TM_ENABLED = os.environ.get("AUTOSUB_TM", "1") != "0"
+TM_DB = os.environ.get("AUTOSUB_TM_DB") or os.path.join(os.path.expanduser("~"), ".cache", "autosub", "translation_memory.db")
+TM_FUZZY = float(os.environ.get("AUTOSUB_TM_FUZZY", "0"))
+
+# Short lines are mostly noise: their translation depends on the surrounding
+# context ("right" as agreement vs. direction), and fuzzy matches on them are
+# too loose ("yeah, right" vs "yeah, alright")
+EXACT_MIN_TOKENS = 3
+FUZZY_MIN_TOKENS = 4
+FUZZY_CANDIDATES = 20
+# Words that flip a line's meaning; "t" is what normalize() leaves of n't
+NEGATIONS = frozenset(("not", "no", "never", "nor", "neither", "none", "nobody", "nothing",
+                       "nowhere", "cannot", "without", "t"))
+
+_NORM_RE = re.compile(r'[^\w]+', re.UNICODE)
+# smart_translate writes X.cn.srt, or X.cn_v2.srt when one already exists
+_CN_RE = re.compile(r'^(.*)\.cn(?:_v\d+)?\.srt$', re.IGNORECASE)
+
+def default_roots():
+    """Projects folders used by autosub in the current mode (bundled or dev)."""
+    env = os.environ.get("AUTOSUB_TM_ROOTS")
+    if env:
+        return [p for p in env.split(os.pathsep) if p]
+    if getattr(sys, 'frozen', False):
+        return [os.path.join(os.path.expanduser("~"), "Documents", "AutoSub", "Projects")]
+    tools_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root = os.path.dirname(tools_dir)
+    if os.path.basename(root).lower() == "library":
+        root = os.path.dirname(root)
+    return [os.path.join(root, "Projects")]
+
+def normalize(text):
+    """Lowercases and strips punctuation/extra whitespace for matching."""
+    return _NORM_RE.sub(' ', text.lower()).strip()
+
+def facts(norm):
+    """The numbers (in order) and negation words of a normalized line; a fuzzy hit must keep both."""
+    tokens = norm.split()
+    return ([t for t in tokens if any(c.isdigit() for c in t)],
+            sorted(t for t in tokens if t in NEGATIONS))
+
+def _bi_pairs(path):
+    """(source, target) pairs from a bilingual SRT (Chinese and English lines in one cue)."""
+    for cue in srt_utils.load_track(path):
+        lines = cue.lines
+        if any('[UNTRANSLATED]' in l or '[TRANSLATION_FAILED]' in l for l in lines):
+            continue
+        cn = " ".join(l.strip() for l in lines if srt_utils.is_chinese(l))
+        en = " ".join(l.strip() for l in lines if not srt_utils.is_chinese(l))
+        if cn and en:
+            yield en, cn
+
+def _cn_pairs(cn_path, src_path):
+    """(source, target) pairs from a translated track aligned to its source by timing."""
+    cn = srt_utils.load_track(cn_path)
+    src = srt_utils.load_track(src_path)
+    match = best_overlap(cn.starts_ms, cn.ends_ms, src.starts_ms, src.ends_ms, min_overlap_ms=0)
+    for cue, j in zip(cn, match):
+        if j < 0:
+            continue
+        target = " ".join(l.strip() for l in cue.lines).strip()
+        source = " ".join(l.strip() for l in src[j].lines).strip()
+        if target and source and srt_utils.is_chinese(target) and not srt_utils.is_chinese(source):
+            yield source, target
+
+def _source_for(cn_path):
+    """English source next to a `.cn.srt`, or None."""
+    base = _CN_RE.match(cn_path).group(1)
+    for cand in (base + ".en.srt", base + ".srt"):
+        if os.path.exists(cand):
+            return cand
+    return None
+
+def discover(roots):
+    """
+    Yields (kind, path, source_path) for every indexable file under `roots`.
+    A `.cn.srt` with a known source is preferred over the `.bi.srt` of the
+    same project, which is a time-merged copy of the same lines.
+    """
+    for root in roots:
+        for project in sorted(glob.glob(os.path.join(root, "*"))):
+            if not os.path.isdir(project):
+                continue
+            paired = set()
+            for cn in sorted(glob.glob(os.path.join(project, "*.cn*.srt"))):
+                if not _CN_RE.match(cn):
+                    continue
+                src = _source_for(cn)
+                if src:
+                    paired.add(_CN_RE.match(cn).group(1))
+                    yield "cn", cn, src
+            for bi in sorted(glob.glob(os.path.join(project, "*.bi.srt"))):
+                if bi[:-len(".bi.srt")] not in paired:
+                    yield "bi", bi, None
+
+class TranslationMemory:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            style TEXT,
+            trans_mode TEXT
+        );
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY,
+            file TEXT NOT NULL,
+            norm TEXT NOT NULL,
+            source TEXT NOT NULL,
+            target TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS segments_norm ON segments(norm);
+        CREATE INDEX IF NOT EXISTS segments_file ON segments(file);
+    """
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+            norm, content='segments', content_rowid='id'
+        );
+        CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+            INSERT INTO segments_fts(rowid, norm) VALUES (new.id, new.norm);
+        END;
+        CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+            INSERT INTO segments_fts(segments_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+        END;
+    """
+
+    def __init__(self, db_path=TM_DB, roots=None, fuzzy_threshold=TM_FUZZY):
+        self.db_path = db_path
+        self.roots = roots if roots is not None else default_roots()
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self._scanned = False
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # Databases created before style/trans_mode were recorded
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for column in ("style", "trans_mode"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} TEXT")
+        try:
+            self.conn.executescript(self.FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: exact lookups only
+            self.has_fts = False
+        self.conn.commit()
+
+    # --- Indexing ---
+
+    def update(self, roots=None):
+        """
+        Brings the index in line with the Projects folders. Only new or
+        changed files are re-read. Returns (files indexed, files removed).
+        """
+        roots = roots if roots is not None else self.roots
+        found = {}
+        for kind, path, src in discover(roots):
+            found[os.path.abspath(path)] = (kind, src)
+
+        with self._lock:
+            known = dict((p, (s, m)) for p, s, m in self.conn.execute("SELECT path, size, mtime_ns FROM files"))
+        root_prefixes = tuple(os.path.join(os.path.abspath(r), "") for r in roots)
+
+        indexed = 0
+        for path, (kind, src) in found.items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                self._index_file(path, kind, src, st)
+                indexed += 1
+            except Exception as e:
+                print(f"⚠️ Translation memory: skipped {os.path.basename(path)}: {e}")
+
+        removed = [p for p in known if p not in found and p.startswith(root_prefixes)]
+        if removed:
+            with self._lock, self.conn:
+                for p in removed:
+                    self.conn.execute("DELETE FROM segments WHERE file = ?", (p,))
+                    self.conn.execute("DELETE FROM files WHERE path = ?", (p,))
+
+        self._scanned = True
+        return indexed, len(removed)
+
+    def add_file(self, path, source_path=None, style=None, trans_mode=None):
+        """
+        Indexes one finished file (a `.cn.srt` with its source, or a `.bi.srt`),
+        recording the style and translation mode it was made with.
+        """
+        path = os.path.abspath(path)
+        kind = "bi" if source_path is None else "cn"
+        self._index_file(path, kind, source_path, os.stat(path), style, trans_mode)
+
+    def _index_file(self, path, kind, src, st, style=None, trans_mode=None):
+        pairs = _cn_pairs(path, src) if kind == "cn" else _bi_pairs(path)
+        rows = [(path, normalize(s), s, t) for s, t in pairs]
+        rows = [r for r in rows if r[1]]
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM segments WHERE file = ?", (path,))
+            self.conn.executemany("INSERT INTO segments(file, norm, source, target) VALUES (?, ?, ?, ?)", rows)
+            # A rescan does not know the style; keep what add_file recorded
+            self.conn.execute(
+                "INSERT INTO files(path, size, mtime_ns, style, trans_mode) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "style = COALESCE(excluded.style, files.style), "
+                "trans_mode = COALESCE(excluded.trans_mode, files.trans_mode)",
+                (path, st.st_size, st.st_mtime_ns, style, trans_mode),
+            )
+
+    def ensure_scanned(self):
+        if not self._scanned:
+            self.update()
+
+    # --- Lookup ---
+
+    @staticmethod
+    def _filters(style=None, trans_mode=None, exclude_dir=None):
+        """SQL conditions (on segments s / files m) and their parameters."""
+        sql, params = "", []
+        # An unscoped lookup only sees files without a recorded style/mode
+        if style is not None:
+            sql += " AND m.style = ?"
+            params.append(style)
+        else:
+            sql += " AND m.style IS NULL"
+        if trans_mode is not None:
+            sql += " AND m.trans_mode = ?"
+            params.append(trans_mode)
+        else:
+            sql += " AND m.trans_mode IS NULL"
+        if exclude_dir:
+            prefix = os.path.join(os.path.abspath(exclude_dir), "")
+            sql += " AND substr(s.file, 1, ?) != ?"
+            params += [len(prefix), prefix]
+        return sql, params
+
+    def lookup_exact(self, text, style=None, trans_mode=None, exclude_dir=None):
+        norm = normalize(text)
+        if len(norm.split()) < EXACT_MIN_TOKENS:
+            return None
+        where, params = self._filters(style, trans_mode, exclude_dir)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT s.target FROM segments s JOIN files m ON m.path = s.file WHERE s.norm = ?" + where +
+                " GROUP BY s.target ORDER BY COUNT(*) DESC, MAX(s.id) DESC LIMIT 1",
+                [norm] + params,
+            ).fetchone()
+        return row[0] if row else None
+
+    def lookup_fuzzy(self, text, threshold=None, style=None, trans_mode=None, exclude_dir=None):
+        """Returns (target, similarity) of the closest indexed line, or None."""
+        threshold = self.fuzzy_threshold if threshold is None else threshold
+        norm = normalize(text)
+        tokens = norm.split()
+        if not self.has_fts or threshold <= 0 or len(tokens) < FUZZY_MIN_TOKENS:
+            return None
+        query = " OR ".join(f'"{t}"' for t in dict.fromkeys(tokens))
+        where, params = self._filters(style, trans_mode, exclude_dir)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT s.norm, s.target FROM segments_fts f JOIN segments s ON s.id = f.rowid "
+                "JOIN files m ON m.path = s.file WHERE segments_fts MATCH ?" + where +
+                " ORDER BY bm25(segments_fts) LIMIT ?",
+                [query] + params + [FUZZY_CANDIDATES],
+            ).fetchall()
+        best = None
+        query_facts = facts(norm)
+        for cand_norm, target in rows:
+            if facts(cand_norm) != query_facts:
+                continue
+            sm = SequenceMatcher(None, norm, cand_norm, autojunk=False)
+            if sm.real_quick_ratio() < threshold or sm.quick_ratio() < threshold:
+                continue
+            ratio = sm.ratio()
+            if ratio >= threshold and (best is None or ratio > best[1]):
+                best = (target, ratio)
+        return best
+
+    def lookup(self, text, fuzzy=True, style=None, trans_mode=None, exclude_dir=None):
+        """
+        Returns the remembered translation of `text`, or None. Hits come only
+        from files made with `style` and `trans_mode` (None: files with none
+        recorded); lines from under `exclude_dir` are ignored.
+        """
+        self.ensure_scanned()
+        target = self.lookup_exact(text, style, trans_mode, exclude_dir)
+        if target is not None:
+            self.hits += 1
+            return target
+        if fuzzy:
+            found = self.lookup_fuzzy(text, style=style, trans_mode=trans_mode, exclude_dir=exclude_dir)
+            if found:
+                self.fuzzy_hits += 1
+                return found[0]
+        self.misses += 1
+        return None
+
+    def lookup_many(self, texts, fuzzy=True, style=None, trans_mode=None, exclude_dir=None):
+        """Looks up a list of source lines. Returns {position: translation} for hits."""
+        found = (self.lookup(x, fuzzy, style, trans_mode, exclude_dir) for x in texts)
+        return {i: t for i, t in enumerate(found) if t is not None}
+
+    def stats(self):
+        with self._lock:
+            files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            segments = self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {'files': files, 'segments': segments, 'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_MEMORY = None
+def get_memory():
+    """Process-wide translation memory, or None when disabled or unavailable."""
+    global _MEMORY
+    if not TM_ENABLED:
+        return None
+    if _MEMORY is None:
+        try:
+            _MEMORY = TranslationMemory()
+        except sqlite3.Error as e:
+            print(f"⚠️ Translation memory unavailable: {e}")
+            return None
+    return _MEMORY
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Translation memory over finished projects")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_up = sub.add_parser('update'); p_up.add_argument('roots', nargs='*')
+    p_look = sub.add_parser('lookup'); p_look.add_argument('text'); p_look.add_argument('--no-fuzzy', action='store_true')
+    p_look.add_argument('--style'); p_look.add_argument('--trans-mode')
+    sub.add_parser('stats')
+    args = parser.parse_args()
+
+    tm = TranslationMemory()
+    if args.cmd == 'update':
+        indexed, removed = tm.update(args.roots or None)
+        print(f"📚 Indexed {indexed} file(s), removed {removed}.")
+        print(tm.stats())
+    elif args.cmd == 'lookup':
+        print(tm.lookup(args.text, fuzzy=not args.no_fuzzy, style=args.style, trans_mode=args.trans_mode))
+    else:
+        print(tm.stats())
+
+if __name__ == "__main__":
+    main()
@@ -5,43 +5,19 @@ import re
 import os
 import argparse
 
-def srt_timestamp_to_ass(timestamp):
-    try:
-        h, m, s_ms = timestamp.split(':')
-        s, ms = s_ms.split(',')
-        ms = int(ms) // 10
-        return f"{int(h)}:{m}:{s}.{ms:02d}"
-    except:
-        return "0:00:00.00"
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+import srt_utils
+from subtitle_format import format_timestamp
 
 def parse_srt(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read().lstrip('\ufeff')
-    content = content.replace('\r\n', '\n')
-    blocks = re.split(r'\n\n+|(?<=\d)\n\n+(?=\d)', content.strip())
     parsed = []
     
-    for block in blocks:
-        lines = [l.strip() for l in block.split('\n') if l.strip()]
-        if len(lines) < 2: continue
-        
-        first_idx = 0
-        if not lines[0].isdigit() and '-->' in lines[0]:
-            first_idx = 0 
-        elif lines[0].isdigit():
-            first_idx = 1
-            
-        if first_idx >= len(lines): continue
-        time_line = lines[first_idx]
-        text_lines = lines[first_idx+1:]
-        
-        if '-->' not in time_line: continue
-        
-        try:
-            s, e = time_line.split(' --> ')
-            start = srt_timestamp_to_ass(s.strip())
-            end = srt_timestamp_to_ass(e.split(' ')[0].strip())
-        except: continue
+    # Cues whose timestamps do not parse are dropped (with a warning), so
+    # one bad cue is skipped instead of failing the whole file
+    for cue in srt_utils.load_track(file_path, skip_bad=True):
+        text_lines = cue.lines
+        start = format_timestamp(cue.start_ms, "ass")
+        end = format_timestamp(cue.end_ms, "ass")
         
         cn_parts = []
         en_parts = []
@@ -408,6 +384,8 @@ Style: TextTop,{base_font},{base_size},{base_color},&H000000FF,&H00000000,&H0000
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
+    # Events are assembled in memory and written in one go
+    events = []
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(header)
         for p in parsed:
@@ -580,8 +558,9 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
             drawing_code = f"{{\\an7\\pos(0,0)\\p1\\c&H101010&\\3c&H101010&\\alpha&H30&}}m {abs_x_l} {abs_y_t} l {abs_x_r} {abs_y_t} l {abs_x_r} {abs_y_b} l {abs_x_l} {abs_y_b} {{\\p0}}"
 
             if config.bg_box:
-                f.write(f"Dialogue: 0,{p['s']},{p['e']},BoxBase,,0,0,0,,{drawing_code}\n")
-            f.write(f"Dialogue: 1,{p['s']},{p['e']},TextTop,,0,0,0,,{final_content}\n")
+                events.append(f"Dialogue: 0,{p['s']},{p['e']},BoxBase,,0,0,0,,{drawing_code}\n")
+            events.append(f"Dialogue: 1,{p['s']},{p['e']},TextTop,,0,0,0,,{final_content}\n")
+        f.write("".join(events))
 
 def get_versioned_filename(filepath):
     """Appends _v1, _v2 etc if file exists."""
@@ -40,6 +40,11 @@ try:
 except ImportError:
     pass
 
+try:
+    import translation_memory
+except ImportError:
+    translation_memory = None
+
 def get_default_output_dir(input_file):
     return os.path.dirname(os.path.abspath(input_file))
 
@@ -58,19 +63,14 @@ def process_split(args):
     print(f"Output Directory: {output_dir}")
 
     source_en_path = os.path.join(output_dir, "source.en.srt")
-    subs = srt_utils.parse_srt(input_path)
-    has_chinese = any(srt_utils.is_chinese(line) for sub in subs for line in sub['lines'])
+    subs = srt_utils.load_track(input_path)
+    has_chinese = any(srt_utils.is_chinese(line) for sub in subs for line in sub.lines)
     
     if has_chinese:
         print("Detected Chinese characters. Assuming Bilingual/CN input.")
         print(f"Extracting English track to {source_en_path}...")
         
-        subs_en = []
-        for sub in subs:
-            lines_en = [l for l in sub['lines'] if not srt_utils.is_chinese(l)]
-            new_sub = sub.copy()
-            new_sub['lines'] = lines_en
-            subs_en.append(new_sub)
+        subs_en = subs.with_lines(lambda sub: [l for l in sub.lines if not srt_utils.is_chinese(l)])
         srt_utils.write_srt(subs_en, source_en_path)
     else:
         print("Assuming Monolingual English input.")
@@ -161,10 +161,10 @@ def validate_chunks(chunks_dir):
         if not os.path.exists(cn_file): continue
         checked += 1
         try:
-            subs_src = srt_utils.parse_srt(src_file)
-            subs_cn = srt_utils.parse_srt(cn_file)
-            if len(subs_src) != len(subs_cn):
-                print(f"❌ Mismatch in {os.path.basename(src_file)}: Orig={len(subs_src)}, Trans={len(subs_cn)}")
+            count_src = srt_utils.count_srt(src_file)
+            count_cn = srt_utils.count_srt(cn_file)
+            if count_src != count_cn:
+                print(f"❌ Mismatch in {os.path.basename(src_file)}: Orig={count_src}, Trans={count_cn}")
                 issues += 1
         except Exception as e:
             print(f"Error parsing {src_file}: {e}")
@@ -241,6 +241,28 @@ def run_fill(input_path):
             })
 
     if not gaps: return 0
+
+    # Fill what the translation memory already knows; only the rest goes to the LLM
+    tm = translation_memory.get_memory() if translation_memory else None
+    remembered = 0
+    if tm is not None:
+        try:
+            # Unscoped: only scanned files (no recorded style), never this project
+            hits = tm.lookup_many([g['src_text'] for g in gaps], exclude_dir=os.path.dirname(input_path))
+        except Exception as e:
+            print(f"⚠️ Translation memory lookup failed: {e}")
+            hits = {}
+        for pos, trans_text in hits.items():
+            item = gaps[pos]
+            subs[item['sub_index']]['lines'][item['gap_inline_index']] = trans_text
+        gaps = [g for pos, g in enumerate(gaps) if pos not in hits]
+        remembered = len(hits)
+        if remembered:
+            print(f"📚 Translation memory filled {remembered} gap(s).")
+    if not gaps:
+        srt_utils.write_srt(subs, input_path)
+        return remembered
+
     print(f"⚡ Found {len(gaps)} gaps. Executing batched fill...")
     
     BATCH_SIZE = 5
@@ -253,11 +275,13 @@ def run_fill(input_path):
         prompt = f"Translate English to Simplified Chinese.\n{items_str}\nOutput Format:\nItem ID: [Translation]\n"
         tasks.append({'batch_id': b_idx, 'items': batch, 'prompt': prompt})
 
+    modified = remembered > 0
     try:
-        if not HAS_GENAI: return -1
+        if not HAS_GENAI:
+            if modified: srt_utils.write_srt(subs, input_path)
+            return remembered if modified else -1
         client = gemini_utils.GeminiClient()
         results = client.generate_batch(tasks, os.environ.get("GEMINI_MODEL", "gemini-3-flash"))
-        modified = False
         for res in results:
             batch_out = res.get('result')
             if not batch_out: continue
@@ -273,19 +297,22 @@ def run_fill(input_path):
                         modified = True
         if modified:
             srt_utils.write_srt(subs, input_path)
-            return len([i for i in results if i.get('result')]) # Approximate
+            return remembered + len([i for i in results if i.get('result')]) # Approximate
     except Exception as e:
         print(f"❌ Fill failed: {e}")
+        if modified:
+            srt_utils.write_srt(subs, input_path)
+            return remembered
     return 0
 
 def process_fill(args):
     run_fill(args.input_file)
 
 def run_comparison(src_path, trans_path):
-    subs_src = srt_utils.parse_srt(src_path)
-    subs_trans = srt_utils.parse_srt(trans_path)
-    if len(subs_src) != len(subs_trans):
-        print(f"⚠️ Mismatch: Source={len(subs_src)}, Trans={len(subs_trans)}")
+    count_src = srt_utils.count_srt(src_path)
+    count_trans = srt_utils.count_srt(trans_path)
+    if count_src != count_trans:
+        print(f"⚠️ Mismatch: Source={count_src}, Trans={count_trans}")
     else:
         print("✅ Block counts match.")
 
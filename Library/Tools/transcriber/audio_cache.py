@@ -0,0 +1,160 @@
+"""
+Decoded-audio artifact: the source's audio as 16 kHz mono float32 PCM, extracted once per project.
+
+Previously every consumer decoded the container itself:
+- get_duration ran ffmpeg and parsed its banner;
+- faster-whisper demuxed and resampled the whole video;
+- every re-run did it all again.
+For 4K sources most of that work is reading video packets that are thrown
+away.
+
+ensure_pcm extracts the first audio stream once into `<name>.16k.f32` in
+the project folder. ffmpeg runs with -vn, so no video is decoded. A
+`<name>.16k.json` sidecar records the source's size, mtime and a sampled
+fingerprint. A matching size+mtime is trusted. For a touched or copied
+source the fingerprint is recomputed, and the artifact is reused if it
+matches.
+
+The fingerprint is a BLAKE2b hash of FINGERPRINT_BLOCKS evenly spaced 1 MiB
+blocks, including the first and last. Hashing a multi-GB 4K source in full
+would read it a second time on the critical path. Container headers and
+indexes sit at the start or end of the file, so a re-encode or remux is
+still caught.
+
+The artifact is float32 so that every reader maps it without a conversion
+copy. It takes 64 KB per second, about 230 MB per hour of audio. It is
+kept with the project and can be deleted at any time; the next run
+extracts it again.
+
+open_pcm memory-maps the file as a float32 array, which faster-whisper
+takes as is. The transcriber, the VAD pass, the parallel workers and the
+duration probe all read that one decode. Each parallel worker maps the same
+file, and the OS shares the pages.
+
+Environment:
+    AUTOSUB_AUDIO_CACHE=0        decode from the source every time
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+
+CACHE_ENABLED = os.environ.get("AUTOSUB_AUDIO_CACHE", "1") != "0"
+SAMPLE_RATE = 16000
+SAMPLE_BYTES = 4  # float32
+PCM_SUFFIX = ".16k.f32"
+META_SUFFIX = ".16k.json"
+
+# Blocks read by _fingerprint; small files are hashed whole
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK = 1 << 20
+
+def _fingerprint(path):
+    """BLAKE2b of the size and FINGERPRINT_BLOCKS evenly spaced blocks of the file."""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        if size <= FINGERPRINT_BLOCKS * FINGERPRINT_BLOCK:
+            for chunk in iter(lambda: f.read(FINGERPRINT_BLOCK), b''):
+                h.update(chunk)
+        else:
+            step = (size - FINGERPRINT_BLOCK) / (FINGERPRINT_BLOCKS - 1)
+            for k in range(FINGERPRINT_BLOCKS):
+                f.seek(int(k * step))
+                h.update(f.read(FINGERPRINT_BLOCK))
+    return h.hexdigest()
+
+def pcm_paths(source, project_dir):
+    """(pcm path, sidecar path) of `source` in `project_dir`."""
+    base = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(project_dir, base + PCM_SUFFIX), os.path.join(project_dir, base + META_SUFFIX)
+
+def is_pcm(path):
+    return str(path).endswith(PCM_SUFFIX)
+
+def _write_meta(meta_path, meta):
+    tmp = meta_path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+def cached_pcm(source, project_dir):
+    """The artifact's path if it was extracted from this source's current content, else None."""
+    if not CACHE_ENABLED or not project_dir:
+        return None
+    pcm_path, meta_path = pcm_paths(source, project_dir)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        st = os.stat(source)
+        if os.path.getsize(pcm_path) != meta['samples'] * SAMPLE_BYTES or meta['rate'] != SAMPLE_RATE:
+            return None
+        if st.st_size == meta['size'] and st.st_mtime_ns == meta['mtime_ns']:
+            return pcm_path
+        if st.st_size == meta['size'] and _fingerprint(source) == meta['fingerprint']:
+            # Touched or copied, same content: re-stamp so the next lookup is cheap
+            meta.update(mtime_ns=st.st_mtime_ns)
+            _write_meta(meta_path, meta)
+            return pcm_path
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def extract_pcm(source, pcm_path, ffmpeg="ffmpeg"):
+    """Decodes the first audio stream of `source` to raw PCM at `pcm_path`; raises RuntimeError on failure."""
+    tmp = pcm_path + ".part"
+    cmd = [ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y", "-i", source,
+           "-map", "0:a:0", "-vn", "-sn", "-dn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+           "-c:a", "pcm_f32le", "-f", "f32le", tmp]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, encoding='utf-8',
+                            errors='replace', creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0)
+    if result.returncode != 0 or not os.path.exists(tmp):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"ffmpeg exit code {result.returncode}")
+    os.replace(tmp, pcm_path)
+
+def ensure_pcm(source, project_dir, ffmpeg="ffmpeg", log=print):
+    """
+    Path of the decoded audio of `source`, extracting it on first use. None if
+    disabled or extraction failed (callers then read the source directly).
+    """
+    if not CACHE_ENABLED or not project_dir:
+        return None
+    pcm_path = cached_pcm(source, project_dir)
+    if pcm_path:
+        log(f"♻️ Reusing decoded audio: {os.path.basename(pcm_path)}")
+        return pcm_path
+
+    pcm_path, meta_path = pcm_paths(source, project_dir)
+    start = time.time()
+    try:
+        st = os.stat(source)
+        fingerprint = _fingerprint(source)
+        extract_pcm(source, pcm_path, ffmpeg)
+        samples = os.path.getsize(pcm_path) // SAMPLE_BYTES
+        _write_meta(meta_path, {'source': os.path.abspath(source), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                'fingerprint': fingerprint, 'rate': SAMPLE_RATE, 'samples': samples})
+    except (OSError, RuntimeError) as e:
+        log(f"⚠️ Could not extract audio ({e}); decoding from the source.")
+        return None
+    log(f"🎧 Decoded audio once: {samples / SAMPLE_RATE:.0f}s in {time.time() - start:.1f}s -> {os.path.basename(pcm_path)}")
+    return pcm_path
+
+def open_pcm(pcm_path):
+    """The artifact as a read-only float32 array backed by the file."""
+    import numpy as np
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.float32)  # mmap cannot map an empty file
+    return np.memmap(pcm_path, dtype='<f4', mode='r')
+
+def audio_input(path):
+    """What WhisperModel.transcribe should read: the mapped samples of an artifact, else the media path."""
+    return open_pcm(path) if is_pcm(path) else path
+
+def pcm_duration(pcm_path):
+    return os.path.getsize(pcm_path) / SAMPLE_BYTES / SAMPLE_RATE
@@ -0,0 +1,156 @@
+"""
+VAD-partitioned parallel transcription on CPU.
+
+One model.transcribe call decodes a file as a single stream, so a long
+recording on a many-core CPU keeps only a few cores busy. Parallel mode
+takes these steps:
+1. Decode the audio and run it through the Silero VAD once.
+2. Cut it at the middle of silences into spans with balanced speech time.
+3. Transcribe the spans in a pool of worker processes. Each worker has its
+   own WhisperModel with explicit cpu_threads/num_workers, so the pool
+   does not oversubscribe the cores.
+4. Shift segment and word timestamps back onto the file's timeline and
+   yield them in order, so chunk_segments sees the same stream as from a
+   single call.
+A span decodes only the speech the shared VAD pass found in it
+(clip_timestamps), so VAD is not repeated per span. Given an audio_cache
+artifact, the workers map its span of the file instead of receiving copies.
+
+The language is detected once, on the first speech, and every span uses it.
+Each worker holds its own model copy (about 1 GB for large-v3-turbo int8).
+GPU transcription keeps the single stream.
+
+Environment:
+    AUTOSUB_WHISPER_WORKERS=1        worker processes for CPU transcription (1 = single stream)
+    AUTOSUB_WHISPER_CPU_THREADS=0    threads per worker (0 = cores / workers)
+"""
+import os
+import multiprocessing
+
+import audio_cache
+from transcribe_server import TranscriptionInfo, unpack_segment
+
+WORKERS = max(1, int(os.environ.get("AUTOSUB_WHISPER_WORKERS", "1")))
+CPU_THREADS = max(0, int(os.environ.get("AUTOSUB_WHISPER_CPU_THREADS", "0")))
+SAMPLE_RATE = audio_cache.SAMPLE_RATE
+# More spans than workers, so one slow span does not leave the other cores idle at the end
+SPANS_PER_WORKER = 3
+# Shorter spans lose too much context at their edges
+MIN_SPAN_SECONDS = 60
+LANGUAGE_SAMPLE_SECONDS = 30
+
+def speech_regions(audio):
+    """(start, end) sample ranges of speech, from the VAD faster-whisper uses for vad_filter."""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    return [(t['start'], t['end']) for t in get_speech_timestamps(audio, VadOptions())]
+
+def partition(regions, total_samples, parts, min_samples=MIN_SPAN_SECONDS * SAMPLE_RATE):
+    """
+    Splits the timeline into at most `parts` spans of about equal speech time,
+    cutting only in the middle of silences. Returns [(start, end, regions)]
+    covering [0, total_samples); spans are at least `min_samples` long where possible.
+    """
+    if not regions:
+        return []
+    parts = max(1, min(parts, total_samples // max(1, min_samples)))
+    remaining = sum(end - start for start, end in regions)
+    spans = []
+    span_start, current, speech = 0, [], 0
+    for k, (start, end) in enumerate(regions):
+        current.append((start, end))
+        speech += end - start
+        left = parts - len(spans)
+        if left > 1 and k + 1 < len(regions) and speech >= remaining / left:
+            cut = (end + regions[k + 1][0]) // 2
+            if cut - span_start >= min_samples:
+                spans.append((span_start, cut, current))
+                remaining -= speech
+                span_start, current, speech = cut, [], 0
+    spans.append((span_start, total_samples, current))
+    return spans
+
+# --- Worker processes ---
+
+_model = None
+
+def _init_worker(model_path, download_root, compute_type, cpu_threads):
+    global _model
+    from faster_whisper import WhisperModel
+    _model = WhisperModel(model_path, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads,
+                          num_workers=1, download_root=download_root)
+
+def _detect_language(audio):
+    # transcribe() detects the language before returning its lazy generator
+    _, info = _model.transcribe(audio, vad_filter=False)
+    return info.language, info.language_probability
+
+def _transcribe_span(job):
+    """Packed segments of one span, with times on the file's timeline."""
+    offset, audio, regions, options = job
+    if isinstance(audio, tuple):
+        # (artifact path, start, end): every worker maps the same decoded file
+        path, start, end = audio
+        audio = audio_cache.open_pcm(path)[start:end]
+    shift = offset / SAMPLE_RATE
+    clips = [t / SAMPLE_RATE for start, end in regions for t in (start - offset, end - offset)]
+    segments, _ = _model.transcribe(audio, vad_filter=False, clip_timestamps=clips, **options)
+    return [(s.start + shift, s.end + shift, s.text,
+             [(w.start + shift, w.end + shift, w.word, w.probability) for w in (s.words or ())])
+            for s in segments]
+
+# --- Driver ---
+
+def worker_threads(workers, cpu_threads=CPU_THREADS):
+    return cpu_threads or max(1, (os.cpu_count() or 1) // workers)
+
+def transcribe_parallel(file_path, model_path, download_root=None, workers=WORKERS, options=None,
+                        cpu_threads=CPU_THREADS, compute_type="int8", log=print):
+    """
+    (segments, info) like WhisperModel.transcribe. `segments` yields segments
+    in timeline order as the spans finish; closing it stops the pool.
+    """
+    if audio_cache.is_pcm(file_path):
+        audio = audio_cache.open_pcm(file_path)
+    else:
+        from faster_whisper.audio import decode_audio
+        audio = decode_audio(file_path, sampling_rate=SAMPLE_RATE)
+    regions = speech_regions(audio)
+    spans = partition(regions, len(audio), workers * SPANS_PER_WORKER)
+    threads = worker_threads(workers, cpu_threads)
+    speech = sum(end - start for start, end in regions) / SAMPLE_RATE
+    log(f"⚡ Parallel transcription: {len(spans)} span(s), {speech:.0f}s of speech, "
+        f"{workers} worker(s) x {threads} thread(s)")
+
+    # The VAD pass above replaces vad_filter in every span
+    options = {k: v for k, v in (options or {}).items() if k not in ('vad_filter', 'vad_parameters')}
+    pool = multiprocessing.get_context("spawn").Pool(workers, _init_worker,
+                                                     (model_path, download_root, compute_type, threads))
+    try:
+        language, probability = options.get('language'), 1.0
+        if not language and regions:
+            sample, total = [], 0
+            for start, end in regions:
+                sample.append(audio[start:end])
+                total += end - start
+                if total >= LANGUAGE_SAMPLE_SECONDS * SAMPLE_RATE:
+                    break
+            import numpy as np
+            language, probability = pool.apply(_detect_language, (np.concatenate(sample),))
+            options['language'] = language
+    except BaseException:
+        pool.terminate()
+        raise
+    info = TranscriptionInfo(language, probability, len(audio) / SAMPLE_RATE)
+    if audio_cache.is_pcm(file_path):
+        jobs = [(start, (file_path, start, end), span_regions, options) for start, end, span_regions in spans]
+    else:
+        jobs = [(start, audio[start:end], span_regions, options) for start, end, span_regions in spans]
+
+    def segments():
+        try:
+            for packed in pool.imap(_transcribe_span, jobs):
+                for p in packed:
+                    yield unpack_segment(p)
+        finally:
+            pool.terminate()
+    return segments(), info
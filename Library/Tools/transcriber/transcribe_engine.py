@@ -6,15 +6,9 @@ import time
 import ctypes
 import re
 import subprocess
-try:
-    from faster_whisper import WhisperModel
-except ImportError:
-    # Attempt to force reload site packages if we are in a transitionary environment state
-    import site
-    from importlib import reload
-    reload(site)
-    from faster_whisper import WhisperModel
 import io
+import itertools
+import collections
 
 # Force UTF-8 for stdout/stderr to handle emojis in logs on Windows
 if sys.platform == "win32":
@@ -31,6 +25,13 @@ if sys.platform == "win32":
 
 import multiprocessing
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common"))
+from subtitle_format import SubtitleWriter, seconds_to_ms, format_srt_time
+import transcribe_server
+import parallel_transcribe
+import audio_cache
+from word_timeline import WordTimeline, WORDS_SUFFIX, words_path
+
 # Windows compatibility for packaged apps
 multiprocessing.freeze_support()
 
@@ -111,15 +112,45 @@ def detect_content_type(segments_list):
     return style
 
 
-def chunk_segments(segments_list, content_type=None):
+# Style is decided from the opening of the stream, before any cue is written
+STYLE_SAMPLE_SECONDS = 60
+STYLE_SAMPLE_SEGMENTS = 20
+# Words the "stretch" logic may peek past the current word
+LOOKAHEAD_WORDS = 5
+SENTENCE_END = '.?!。？！'
+
+def lock_style(segments, content_type=None):
+    """
+    Returns (style, segments). Without an explicit `content_type`, the first
+    minute (or 20 segments) decides the pacing profile; the returned iterator
+    replays those segments before the rest of the stream.
+    """
+    segments = iter(segments)
+    if content_type:
+        return content_type, segments
+    head = []
+    for s in segments:
+        head.append(s)
+        if s.end > STYLE_SAMPLE_SECONDS or len(head) > STYLE_SAMPLE_SEGMENTS:
+            break
+    return detect_content_type(head), itertools.chain(head, segments)
+
+def _ends_sentence(text):
+    text = text.strip()
+    return bool(text) and text[-1] in SENTENCE_END
+
+def chunk_segments(segments, content_type=None):
     """
     Groups Whisper word-level timestamps into subtitle chunks.
     Automatically selects chunking profile based on content type if not specified.
     Uses look-ahead to avoid splitting the last few words of a sentence into the 
     next segment (Sentence Completion Stretch).
+
+    `segments` may be a live generator: words are pulled through a window of
+    LOOKAHEAD_WORDS + 1, and each chunk is yielded as soon as it is final, so
+    memory does not grow with the length of the recording.
     """
-    if content_type is None:
-        content_type = detect_content_type(segments_list)
+    content_type, segments = lock_style(segments, content_type)
 
     p = CHUNK_PROFILES[content_type]
     max_chars     = p['max_chars']
@@ -129,17 +160,15 @@ def chunk_segments(segments_list, content_type=None):
     min_words     = p['min_words']
     min_yield_chars = p['min_yield_chars']
 
-    chunk_id = 1
-    
-    def word_streamer(segs):
-        for seg in segs:
-            if hasattr(seg, 'words') and seg.words:
-                for w in seg.words:
-                    yield w
+    words = (w for seg in segments if getattr(seg, 'words', None) for w in seg.words)
+    # window[0] is the next unconsumed word, window[1:] the look-ahead
+    window = collections.deque(itertools.islice(words, LOOKAHEAD_WORDS + 1))
 
-    all_words = list(word_streamer(segments_list))
-    if not all_words:
-        return
+    def take():
+        word = window.popleft()
+        for w in itertools.islice(words, 1):
+            window.append(w)
+        return word
 
     def smart_join(t1, t2):
         if not t1: return t2
@@ -147,27 +176,26 @@ def chunk_segments(segments_list, content_type=None):
             return t1 + t2
         return t1 + ' ' + t2
 
-    i = 0
-    while i < len(all_words):
-        current_chunk_words = [all_words[i]]
-        current_start = all_words[i].start
-        current_text = all_words[i].word
-        
-        current_idx = i
-        i += 1 # Advance to next word for accumulation loop
+    chunk_id = 1
+    while window:
+        first = take()
+        current_start = first.start
+        current_end = first.end
+        current_text = first.word
+        word_count = 1
         
-        while i < len(all_words):
-            word = all_words[i]
+        while window:
+            word = window[0]
             word_text = word.word
             
-            gap = word.start - all_words[i-1].end
+            gap = word.start - current_end
             
             # Basic flags
             would_exceed_chars = len(current_text) + len(word_text.strip()) > max_chars
             would_exceed_duration = (word.end - current_start) > max_duration
             is_large_gap = gap > gap_threshold
-            is_sentence_end = word_text.strip()[-1] in '.?!。？！' if word_text.strip() else False
-            has_min_words = len(current_chunk_words) >= min_words
+            is_sentence_end = _ends_sentence(word_text)
+            has_min_words = word_count >= min_words
             has_min_context = len(current_text) > min_context
             
             # --- THE "STRETCH" LOGIC ---
@@ -181,16 +209,9 @@ def chunk_segments(segments_list, content_type=None):
                     if len(current_text) + len(word_text.strip()) < max_chars * 1.4:
                         found_near_end = True
                 
-                # Second check: Peek up to 5 words ahead
-                if not found_near_end:
-                    for j in range(1, 6):
-                        if i + j < len(all_words):
-                            w_peek = all_words[i+j]
-                            if w_peek.word.strip()[-1] in '.?!。？！':
-                                # Sentence ends within next 5 words! 
-                                if len(current_text) < max_chars * 1.4:
-                                    found_near_end = True
-                                    break
+                # Second check: Peek up to LOOKAHEAD_WORDS ahead
+                if not found_near_end and len(current_text) < max_chars * 1.4:
+                    found_near_end = any(_ends_sentence(window[j].word) for j in range(1, len(window)))
                 
                 if found_near_end:
                     would_exceed_chars = False # Defer the break
@@ -207,28 +228,23 @@ def chunk_segments(segments_list, content_type=None):
                 if len(current_text.strip()) < min_yield_chars and not (would_exceed_chars or would_exceed_duration):
                     pass # Don't break, keep accumulating
                 else:
-                    # BREAK HERE
-                    # The current word 'word' belongs to the NEXT chunk (unless specifically included)
-                    # No, in Whisper the logic is simpler: if should_break is triggered by 'word', 
-                    # 'word' is usually excluded from the current chunk.
-                    # EXCEPT if is_sentence_end triggered it, we want the punctuation word IN the chunk.
-                    
-                    if is_sentence_end and (should_break and not would_exceed_chars and not would_exceed_duration):
-                        # Include the punctuation word
-                        current_chunk_words.append(word)
+                    # The breaking word opens the next chunk, except a sentence end
+                    # (outside the hard limits) which keeps its punctuation here.
+                    if is_sentence_end and not would_exceed_chars and not would_exceed_duration:
+                        take()
                         current_text = smart_join(current_text, word_text)
-                        i += 1
+                        current_end = word.end
                     
                     break
             
             # Accumulate
-            current_chunk_words.append(word)
+            take()
             current_text = smart_join(current_text, word_text)
-            i += 1
+            current_end = word.end
+            word_count += 1
         
         # Yield the completed chunk
-        end_time = current_chunk_words[-1].end
-        yield SegmentChunk(current_start, end_time, current_text.strip(), chunk_id)
+        yield SegmentChunk(current_start, current_end, current_text.strip(), chunk_id)
         chunk_id += 1
 
 # Models are stored in the user's .cache folder by default (~/.cache/faster-whisper)
@@ -274,8 +290,11 @@ def get_ffmpeg_path():
 
 FFMPEG_EXE = get_ffmpeg_path()
 
-def get_duration(file_path):
+def get_duration(file_path, project_dir=None):
     if not os.path.exists(file_path): return 0
+    # Already decoded for this project: the artifact's length is the duration
+    pcm_path = audio_cache.cached_pcm(file_path, project_dir)
+    if pcm_path: return audio_cache.pcm_duration(pcm_path)
     # Try using detected ffmpeg
     cmd = [FFMPEG_EXE, "-i", file_path, "-hide_banner"]
     try:
@@ -300,6 +319,160 @@ def show_notification(title, message):
         ctypes.windll.user32.MessageBoxW(0, message, title, 0x40 | 0x1) 
     except: pass
 
+# Options of every transcription, local or on the resident server
+TRANSCRIBE_OPTIONS = {
+    'beam_size': 5,
+    'vad_filter': True,
+    'initial_prompt': "Claude Code, Anthropic, AI Agent",
+    'word_timestamps': True,
+}
+
+def get_whisper_model_class():
+    # Imported on first use: a run served by the resident transcription server never loads it
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        # Attempt to force reload site packages if we are in a transitionary environment state
+        import site
+        from importlib import reload
+        reload(site)
+        from faster_whisper import WhisperModel
+    return WhisperModel
+
+def get_model_search_dirs():
+    dirs = []
+    if LOCAL_MODELS: dirs.append(LOCAL_MODELS)
+    if DOCS_MODELS: dirs.append(DOCS_MODELS)
+    
+    # Standard locations & Environment variables
+    for env in ["HF_HOME", "HUGGINGFACE_HUB_CACHE", "AUTOSUB_MODELS"]:
+        val = os.environ.get(env)
+        if val: dirs.append(val)
+    
+    dirs.append(STD_CACHE)
+    
+    # Proactive discovery for custom system setups (like SystemMoves)
+    for drive in ['D', 'E', 'F', 'G', 'C']:
+        alt = f"{drive}:\\SystemMoves\\faster-whisper"
+        if os.path.exists(alt) and alt not in dirs:
+            dirs.append(alt)
+    
+    return [d for d in dirs if d is not None and os.path.exists(d)]
+
+def find_model(raw_model_name, log=print):
+    """
+    Smart Model Discovery: (model path or name, download_root) for WhisperModel.
+    """
+    search_dirs = get_model_search_dirs()
+    model_folder_name = f"models--Systran--faster-whisper-{raw_model_name}"
+    
+    # Target identification
+    actual_model_path_or_name = raw_model_name
+    best_download_root = search_dirs[0] if search_dirs else None
+
+    for d in search_dirs:
+        # 1. Exact HF Hub folder structure
+        if os.path.exists(os.path.join(d, model_folder_name)):
+            best_download_root = d
+            log(f"✅ Found model cache in: {d}")
+            break
+        
+        # 2. Direct size folder (manual download)
+        direct_path = os.path.join(d, raw_model_name)
+        if os.path.exists(os.path.join(direct_path, "model.bin")):
+            actual_model_path_or_name = direct_path
+            best_download_root = d
+            log(f"✅ Found direct model folder in: {d}")
+            break
+    return actual_model_path_or_name, best_download_root
+
+def detect_device():
+    # Use CUDA if available, else CPU
+    return "cuda" if ctypes.windll.kernel32.GetModuleHandleW("nvcuda.dll") else "cpu"
+
+def load_model(raw_model_name, compute_type="auto", log=print):
+    """
+    Loads a WhisperModel on CUDA if available, else CPU. Returns (model, device).
+    """
+    WhisperModel = get_whisper_model_class()
+    device = detect_device()
+    log(f"Device: {device}")
+    actual_model_path_or_name, best_download_root = find_model(raw_model_name, log)
+
+    try:
+        log(f"Attempting to load model '{raw_model_name}' on {device}...")
+        return WhisperModel(actual_model_path_or_name, device=device, compute_type=compute_type, download_root=best_download_root), device
+    except Exception as e:
+        if device != "cuda":
+            raise
+        log(f"⚠️ CUDA initialization failed, falling back to CPU: {e}")
+        return WhisperModel(actual_model_path_or_name, device="cpu", compute_type="int8", download_root=best_download_root), "cpu"
+
+def transcribe_segments(file_path, raw_model_name, workers=1, cpu_threads=0):
+    """
+    (segments, info, device) for a media file or its audio_cache artifact. On CPU with workers > 1 the file is split at
+    silences and transcribed by a process pool (see parallel_transcribe.py);
+    otherwise segments come from the resident transcription server when one
+    can be used (see transcribe_server.py), else from a model loaded here.
+    """
+    if workers > 1:
+        if detect_device() == "cpu":
+            model_path, download_root = find_model(raw_model_name)
+            segments, info = parallel_transcribe.transcribe_parallel(
+                file_path, model_path, download_root, workers=workers, options=TRANSCRIBE_OPTIONS, cpu_threads=cpu_threads)
+            return segments, info, "cpu"
+        print("ℹ️ Parallel transcription is CPU-only; using a single stream on CUDA.")
+
+    client = transcribe_server.connect_server()
+    if client is not None:
+        try:
+            return client.transcribe(file_path, raw_model_name, options=TRANSCRIBE_OPTIONS)
+        except (OSError, EOFError) as e:
+            print(f"⚠️ Transcription server unreachable ({e}); loading the model in this process.")
+
+    try:
+        model, device = load_model(raw_model_name)
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        sys.exit(1)
+    segments, info = model.transcribe(audio_cache.audio_input(file_path), **TRANSCRIBE_OPTIONS)
+    return segments, info, device
+
+def write_srt(srt_path, segments, content_type=None):
+    """
+    Writes the chunked cues of `segments` to `srt_path`. Returns the cue count.
+    The cues go to `srt_path`.part first, so an existing SRT is only replaced
+    by a complete one.
+    """
+    count = 0
+    part_path = srt_path + ".part"
+    with open(part_path, "w", encoding="utf-8") as f, SubtitleWriter(f) as writer:
+        for segment in chunk_segments(segments, content_type=content_type):
+            writer.add(seconds_to_ms(segment.start), seconds_to_ms(segment.end), segment.text.strip())
+            count += 1
+    os.replace(part_path, srt_path)
+    return count
+
+def rechunk(words_file, srt_path, content_type=None):
+    """
+    Rebuilds an SRT from a saved word timeline (no audio, no model).
+    Uses the style detected at transcription unless `content_type` is given.
+    """
+    start = time.perf_counter()
+    timeline = WordTimeline.load(words_file)
+    style, segments = lock_style(timeline.segments(), content_type or timeline.meta.get('style'))
+    cues = write_srt(srt_path, segments, content_type=style)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"✅ Rechunked {len(timeline)} words into {cues} cues ('{style}') in {elapsed_ms:.0f} ms -> {srt_path}")
+    return cues
+
+def get_cli_arg(flag, default=None):
+    if flag in sys.argv:
+        idx = sys.argv.index(flag)
+        if idx + 1 < len(sys.argv):
+            return sys.argv[idx + 1]
+    return default
+
 def get_project_folder(file_path):
     base = os.path.splitext(os.path.basename(file_path))[0]
     clean = re.sub(r'[^a-zA-Z0-9]', '_', base)
@@ -314,7 +487,8 @@ def get_project_folder(file_path):
 
 def main():
     if len(sys.argv) < 3:
-        print("Usage: python transcribe_engine.py <mode> <file_path> [--model model_name]")
+        print("Usage: python transcribe_engine.py <mode> <file_path> [--model model_name] [--workers N] [--cpu-threads N]")
+        print("       python transcribe_engine.py rechunk <file_path | name.words.bin> [--output dir] [--style formal|spoken] [--max-chars N] [--gap-threshold S]")
         sys.exit(1)
         
     mode = sys.argv[1]
@@ -331,6 +505,16 @@ def main():
                 selected_model = sys.argv[idx + 1]
         except: pass
         
+    workers = parallel_transcribe.WORKERS
+    cpu_threads = parallel_transcribe.CPU_THREADS
+    for flag in ("--workers", "--cpu-threads"):
+        if flag in sys.argv:
+            try:
+                value = int(sys.argv[sys.argv.index(flag) + 1])
+                if flag == "--workers": workers = max(1, value)
+                else: cpu_threads = max(0, value)
+            except (IndexError, ValueError): pass
+        
     if "--output" in sys.argv:
         try:
             idx = sys.argv.index("--output")
@@ -339,10 +523,42 @@ def main():
         except: pass
             
     if mode == "estimate":
-        dur = get_duration(file_path)
+        dur = get_duration(file_path, custom_output_dir)
         est = estimate_processing_time(dur)
         print(json.dumps({"duration": dur, "estimated_seconds": est}))
         
+    elif mode == "rechunk":
+        # <file_path> is the media file (its word timeline is looked up in --output or
+        # the project folder) or the .words.bin itself; the SRT is rewritten next to it
+        if file_path.endswith(WORDS_SUFFIX):
+            words_file = file_path
+        else:
+            project_dir = custom_output_dir or get_project_folder(file_path)
+            words_file = os.path.join(project_dir, os.path.splitext(os.path.basename(file_path))[0] + WORDS_SUFFIX)
+        if not os.path.exists(words_file):
+            print(f"Error: no word timeline at {words_file} (transcribe the file once with 'run').")
+            sys.exit(1)
+
+        style = get_cli_arg("--style")
+        if style and style not in CHUNK_PROFILES:
+            print(f"Error: unknown style '{style}' (choose from {', '.join(CHUNK_PROFILES)})")
+            sys.exit(1)
+        # One-off profile overrides, e.g. --max-chars 60 --gap-threshold 1.0
+        for flag, key, cast in (("--max-chars", 'max_chars', int), ("--max-duration", 'max_duration', float),
+                                ("--gap-threshold", 'gap_threshold', float)):
+            value = get_cli_arg(flag)
+            if value is not None:
+                try:
+                    value = cast(value)
+                except ValueError:
+                    value = 0
+                if value <= 0:
+                    print(f"Error: {flag} needs a positive number, got '{get_cli_arg(flag)}'")
+                    sys.exit(1)
+                for profile in CHUNK_PROFILES.values():
+                    profile[key] = value
+        rechunk(words_file, words_file[:-len(WORDS_SUFFIX)] + ".srt", content_type=style)
+
     elif mode == "run":
         if not os.path.exists(file_path):
             print(f"Error: File {file_path} not found.")
@@ -371,8 +587,11 @@ def main():
         print(f"Model: {raw_model_name}")
         print(f"Starting transcription...")
         
+        # Decoded once per project; the duration probe, VAD and the transcriber all read it
+        audio_path = audio_cache.ensure_pcm(file_path, output_dir, FFMPEG_EXE)
+        
         # Get duration for progress calculation
-        total_duration = get_duration(file_path)
+        total_duration = audio_cache.pcm_duration(audio_path) if audio_path else get_duration(file_path)
         
         # Setup specific UI for progress
         no_gui = "--no-gui" in sys.argv
@@ -417,121 +636,40 @@ def main():
         start_time = time.time()
         
         try:
-            # Use CUDA if available, else CPU
-            device = "cuda" if ctypes.windll.kernel32.GetModuleHandleW("nvcuda.dll") else "cpu"
-            print(f"Device: {device}")
-
-            # --- Smart Model Discovery ---
-            model_found_root = None
-            def get_search_dirs():
-                dirs = []
-                if LOCAL_MODELS: dirs.append(LOCAL_MODELS)
-                if DOCS_MODELS: dirs.append(DOCS_MODELS)
-                
-                # Standard locations & Environment variables
-                for env in ["HF_HOME", "HUGGINGFACE_HUB_CACHE", "AUTOSUB_MODELS"]:
-                    val = os.environ.get(env)
-                    if val: dirs.append(val)
-                
-                dirs.append(STD_CACHE)
-                
-                # Proactive discovery for custom system setups (like SystemMoves)
-                for drive in ['D', 'E', 'F', 'G', 'C']:
-                    alt = f"{drive}:\\SystemMoves\\faster-whisper"
-                    if os.path.exists(alt) and alt not in dirs:
-                        dirs.append(alt)
-                
-                return [d for d in dirs if d is not None and os.path.exists(d)]
-
-            search_dirs = get_search_dirs()
-            model_folder_name = f"models--Systran--faster-whisper-{raw_model_name}"
-            
-            # Target identification
-            actual_model_path_or_name = raw_model_name
-            best_download_root = search_dirs[0] if search_dirs else None
-
-            for d in search_dirs:
-                # 1. Exact HF Hub folder structure
-                if os.path.exists(os.path.join(d, model_folder_name)):
-                    best_download_root = d
-                    print(f"✅ Found model cache in: {d}")
-                    break
-                
-                # 2. Direct size folder (manual download)
-                direct_path = os.path.join(d, raw_model_name)
-                if os.path.exists(os.path.join(direct_path, "model.bin")):
-                    actual_model_path_or_name = direct_path
-                    best_download_root = d
-                    print(f"✅ Found direct model folder in: {d}")
-                    break
-
-            try:
-                print(f"Attempting to load model '{raw_model_name}' on {device}...")
-                model = WhisperModel(actual_model_path_or_name, device=device, compute_type="auto", download_root=best_download_root)
-            except Exception as e:
-                if device == "cuda":
-                    print(f"⚠️ CUDA initialization failed, falling back to CPU: {e}")
-                    model = WhisperModel(actual_model_path_or_name, device="cpu", compute_type="int8", download_root=best_download_root)
-                else:
-                    print(f"❌ Error loading model: {e}")
-                    sys.exit(1)
-
-            segments, info = model.transcribe(file_path, beam_size=5, vad_filter=True, initial_prompt="Claude Code, Anthropic, AI Agent", word_timestamps=True)
+            segments, info, device = transcribe_segments(audio_path or file_path, raw_model_name, workers, cpu_threads)
             
             print("Detected language '%s' with probability %f" % (info.language, info.language_probability))
 
-            # Perform transcription with a real-time progress indicator and early pacing detection
+            # Cues are chunked and written while Whisper is still decoding: nothing holds
+            # the whole transcript, and <name>.srt.part can be tailed as it grows. The
+            # finished file replaces <name>.srt only at the end, so a crash never leaves
+            # a truncated .srt that later runs would take for a finished transcription.
             print(f"🎙️ Transcribing & Analyzing Pacing (using {device})...")
-            segments_list = []
-            detected_style = None
-            
-            duration = info.duration
-            last_p = -1
-            
-            for s in segments:
-                segments_list.append(s)
-                
-                # --- Early Pacing Detection ---
-                # We don't need the whole video. 60s or 20 segments is enough to decide.
-                if not detected_style and (s.end > 60 or len(segments_list) > 20):
-                    detected_style = detect_content_type(segments_list)
-                    print(f"✨ Style locked: '{detected_style}' (base on first {s.end:.0f}s)")
-                
-                if duration > 0:
-                    p = int((s.end / duration) * 100)
-                    if p > last_p and p >= 0:
-                        print(f"Progress: {p}% ({s.end:.0f}/{duration:.0f}s)", flush=True)
-                        last_p = p
+            # Word timestamps kept for `rechunk`
+            timeline = WordTimeline()
+            segments = map(timeline.append_segment, segments)
 
-            # Final safety check if video is extremely short
-            if not detected_style:
-                detected_style = detect_content_type(segments_list)
-
-            print(f"✅ Transcription complete. {len(segments_list)} segments collected.")
+            # --- Early Pacing Detection ---
+            # We don't need the whole video. 60s or 20 segments is enough to decide.
+            detected_style, segments = lock_style(segments)
+            print(f"✨ Style locked: '{detected_style}'")
 
             srt_path = os.path.join(output_dir, os.path.splitext(os.path.basename(file_path))[0] + ".srt")
-            
-            with open(srt_path, "w", encoding="utf-8") as f:
-                # Pass the early detected style to chunk_segments
-                for segment in chunk_segments(segments_list, content_type=detected_style):
-                    # Format timestamp
-                    start = segment.start
-                    end = segment.end
+            part_path = srt_path + ".part"
+            with open(part_path, "w", encoding="utf-8") as f, SubtitleWriter(f) as writer:
+                total_ms = seconds_to_ms(total_duration)
+                for segment in chunk_segments(segments, content_type=detected_style):
+                    # Timestamps go through the shared integer-millisecond formatter
+                    start_ms = seconds_to_ms(segment.start)
+                    end_ms = seconds_to_ms(segment.end)
                     text = segment.text.strip()
                     
-                    def fmt(t):
-                        hours = int(t // 3600)
-                        minutes = int((t % 3600) // 60)
-                        seconds = int(t % 60)
-                        milliseconds = int((t - int(t)) * 1000)
-                        return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
-                    
-                    # print(f"[{fmt(start)} --> {fmt(end)}] {text}")  # REMOVED per user request to clean up progress area
-                    f.write(f"{segment.id}\n{fmt(start)} --> {fmt(end)}\n{text}\n\n")
+                    writer.add(start_ms, end_ms, text)
+                    writer.flush()
                     
                     # Update Progress
-                    pct = (end / total_duration) * 100 if total_duration > 0 else 0
-                    progress_msg = f"Progress: {pct:.1f}% ({fmt(end)} / {fmt(total_duration)})"
+                    pct = (segment.end / total_duration) * 100 if total_duration > 0 else 0
+                    progress_msg = f"Progress: {pct:.1f}% ({format_srt_time(end_ms)} / {format_srt_time(total_ms)})"
                     print(progress_msg, flush=True)
                     
                     if root and total_duration > 0:
@@ -541,6 +679,12 @@ def main():
                             root.update()
                         except:
                             root = None # Stop trying to update if UI is closed/failed
+
+            os.replace(part_path, srt_path)
+            print(f"✅ Transcription complete. {len(timeline.seg_start)} segments, {writer.count} cues.")
+            timeline.meta = {'language': info.language, 'duration': info.duration, 'style': detected_style,
+                             'model': raw_model_name, 'source': os.path.basename(file_path)}
+            timeline.save(words_path(srt_path))
             
             if root:
                 root.destroy()
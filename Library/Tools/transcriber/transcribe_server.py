@@ -0,0 +1,518 @@
+"""
+Resident transcription server: keeps WhisperModel instances loaded between videos.
+
+Without it every `transcribe_engine.py run` imports faster_whisper, scans the
+model folders and loads the model from disk again, which costs tens of
+seconds per video. The server (`python transcribe_server.py serve`) loads
+each model/compute type once and keeps up to AUTOSUB_WHISPER_INSTANCES
+instances of it. A job waits for a free instance, so a GPU never holds more
+copies than that.
+
+`transcribe_engine.py run` finds the server through the environment or the
+state file. If none is running it starts one in the background, which exits
+after AUTOSUB_TRANSCRIBE_IDLE seconds without jobs, so the next video (or the
+next autosub run) reuses the loaded model. If the server cannot be reached,
+run loads the model itself as before. autosub_batch starts a server for the
+whole batch and preloads the batch model while the first videos download.
+
+Protocol (multiprocessing.connection, one connection per exchange):
+    ("transcribe", file_path, model, compute_type, options) ->   (file_path may be an audio_cache artifact)
+        ("log", text)*, ("info", language, probability, duration, device),
+        ("segment", packed segment, progress percent)*, then ("done", seconds)
+        or ("error", message). Closing the connection cancels the job.
+    ("load", model, compute_type) -> ("log", text)*, then ("done", seconds) or ("error", message)
+    ("status",) -> dict
+    ("shutdown",) -> ("ok",)
+
+Environment:
+    AUTOSUB_TRANSCRIBE_SERVER=0          load the model in every run process (no server)
+    AUTOSUB_TRANSCRIBE_SERVER_ADDR=...   listener address (exported by the owner for its children)
+    AUTOSUB_TRANSCRIBE_SERVER_KEY=...    hex auth key
+    AUTOSUB_WHISPER_INSTANCES=1          loaded instances per model/compute type
+    AUTOSUB_TRANSCRIBE_IDLE=900          seconds without jobs before a background server exits (0 = never)
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import secrets
+import tempfile
+import threading
+import subprocess
+from collections import namedtuple
+from multiprocessing.connection import Listener, Client
+
+import audio_cache
+
+SERVER_ENABLED = os.environ.get("AUTOSUB_TRANSCRIBE_SERVER", "1") != "0"
+SERVER_ENV = "AUTOSUB_TRANSCRIBE_SERVER_ADDR"
+SERVER_KEY_ENV = "AUTOSUB_TRANSCRIBE_SERVER_KEY"
+MAX_INSTANCES = max(1, int(os.environ.get("AUTOSUB_WHISPER_INSTANCES", "1")))
+IDLE_TIMEOUT = float(os.environ.get("AUTOSUB_TRANSCRIBE_IDLE", "900"))
+# Where a running server records its address; clients without the environment find it here
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "autosub")
+STATE_FILE = os.path.join(STATE_DIR, "transcribe_server.json")
+LOG_FILE = os.path.join(STATE_DIR, "transcribe_server.log")
+SPAWN_LOCK = os.path.join(STATE_DIR, "transcribe_server.lock")
+SPAWN_TIMEOUT = 30
+SERVER_SCRIPT = os.path.abspath(__file__)
+
+# What crosses the connection instead of faster_whisper's Segment/Word objects
+# (the attributes chunk_segments and detect_content_type read)
+Word = namedtuple('Word', 'start end word probability')
+Segment = namedtuple('Segment', 'start end text words')
+TranscriptionInfo = namedtuple('TranscriptionInfo', 'language language_probability duration')
+
+def pack_segment(s):
+    words = [(w.start, w.end, w.word, w.probability) for w in (s.words or ())]
+    return (s.start, s.end, s.text, words)
+
+def unpack_segment(packed):
+    start, end, text, words = packed
+    return Segment(start, end, text, [Word(*w) for w in words])
+
+def normalize_model_name(model):
+    # The library expects just the size or a path
+    if model.startswith("faster-whisper-"):
+        return model.replace("faster-whisper-", "", 1)
+    return model
+
+def _new_address():
+    if sys.platform == "win32":
+        return rf"\\.\pipe\autosub-whisper-{os.getpid()}-{secrets.token_hex(4)}"
+    return os.path.join(tempfile.mkdtemp(prefix="autosub-whisper-"), "server.sock")
+
+class _Pool:
+    """Loaded instances of one model/compute type."""
+    def __init__(self):
+        self.idle = []      # (model, device) ready for a job
+        self.count = 0      # loaded or loading
+        self.device = None
+        self.jobs = 0
+        self.load_seconds = 0.0
+
+class TranscribeServer:
+    """
+    Server holding loaded models. `start()` serves from daemon threads;
+    `serve_forever()` blocks until `close()`, a shutdown request or
+    `idle_timeout` seconds without jobs (0 = never).
+    """
+    def __init__(self, max_instances: int = MAX_INSTANCES, idle_timeout: float = 0, address=None):
+        self.address = address or _new_address()
+        self.authkey = secrets.token_bytes(16)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self.max_instances = max(1, int(max_instances))
+        self.idle_timeout = idle_timeout
+        self._pools = {}  # (model, compute_type) -> _Pool
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._state_file = None
+        self.started = time.time()
+        self.active = 0
+        self.jobs = 0
+        self.last_job = time.monotonic()
+
+    def start(self):
+        threading.Thread(target=self._serve, name="whisper-server", daemon=True).start()
+        return self
+
+    def export(self, env=None, state_file=STATE_FILE):
+        """Advertises the server to child processes and to later runs."""
+        env = os.environ if env is None else env
+        env[SERVER_ENV] = self.address
+        env[SERVER_KEY_ENV] = self.authkey.hex()
+        if state_file:
+            try:
+                os.makedirs(os.path.dirname(state_file), exist_ok=True)
+                fd = os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    json.dump({'address': self.address, 'key': self.authkey.hex(), 'pid': os.getpid()}, f)
+                self._state_file = state_file
+            except OSError:
+                pass
+
+    def serve_forever(self):
+        while not self._closed.wait(1.0):
+            with self._cond:
+                idle = self.active == 0 and time.monotonic() - self.last_job > self.idle_timeout
+            if self.idle_timeout and idle:
+                print(f"💤 No jobs for {self.idle_timeout:.0f}s, exiting.", flush=True)
+                break
+        self.close()
+
+    def close(self):
+        if self._state_file:
+            # Only our own record: a newer server may have replaced it
+            try:
+                with open(self._state_file, encoding="utf-8") as f:
+                    ours = json.load(f).get('address') == self.address
+                if ours:
+                    os.remove(self._state_file)
+            except (OSError, ValueError):
+                pass
+            self._state_file = None
+        self._closed.set()
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        if sys.platform != "win32":
+            shutil.rmtree(os.path.dirname(self.address), ignore_errors=True)
+
+    def _serve(self):
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # Listener closed, or a client failed authentication
+                if self._closed.is_set():
+                    return
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            msg = conn.recv()
+            kind = msg[0]
+            if kind == "transcribe":
+                self._transcribe(conn, *msg[1:])
+            elif kind == "load":
+                self._preload(conn, *msg[1:])
+            elif kind == "status":
+                conn.send(self.status())
+            elif kind == "shutdown":
+                conn.send(("ok",))
+                self._closed.set()
+        except (EOFError, OSError):
+            pass  # client gone
+        finally:
+            conn.close()
+
+    # --- Models ---
+
+    def _checkout(self, key, log):
+        """A loaded (model, device) for `key`, loading one if the pool has room."""
+        with self._cond:
+            pool = self._pools.setdefault(key, _Pool())
+            if not pool.idle and pool.count >= self.max_instances:
+                log(f"⏳ Waiting for a free {key[0]} instance...")
+            while not pool.idle and pool.count >= self.max_instances:
+                self._cond.wait()
+            if pool.idle:
+                return pool.idle.pop()
+            pool.count += 1
+
+        import transcribe_engine
+        start = time.monotonic()
+        try:
+            model, device = transcribe_engine.load_model(key[0], compute_type=key[1], log=log)
+        except BaseException:
+            with self._cond:
+                pool.count -= 1
+                self._cond.notify_all()
+            raise
+        seconds = time.monotonic() - start
+        log(f"📦 Loaded {key[0]} on {device} in {seconds:.1f}s (kept loaded for later jobs)")
+        with self._cond:
+            pool.device = device
+            pool.load_seconds += seconds
+        return model, device
+
+    def _checkin(self, key, instance):
+        with self._cond:
+            self._pools[key].idle.append(instance)
+            self._cond.notify_all()
+
+    def _preload(self, conn, model, compute_type="auto"):
+        key = (normalize_model_name(model), compute_type)
+        log = lambda text: conn.send(("log", text))
+        start = time.monotonic()
+        try:
+            with self._cond:
+                pool = self._pools.get(key)
+                loaded = pool is not None and pool.count > 0
+            if not loaded:
+                self._checkin(key, self._checkout(key, log))
+        except Exception as e:
+            conn.send(("error", f"Error loading model: {e}"))
+            return
+        conn.send(("done", time.monotonic() - start))
+
+    # --- Jobs ---
+
+    def _transcribe(self, conn, file_path, model, compute_type="auto", options=None):
+        key = (normalize_model_name(model), compute_type)
+        log = lambda text: conn.send(("log", text))
+        with self._cond:
+            self.active += 1
+            self.jobs += 1
+        start = time.monotonic()
+        instance = None
+        try:
+            instance = self._checkout(key, log)
+            whisper, device = instance
+            segments, info = whisper.transcribe(audio_cache.audio_input(file_path), **(options or {}))
+            conn.send(("info", info.language, info.language_probability, info.duration, device))
+            try:
+                for s in segments:
+                    progress = s.end / info.duration * 100 if info.duration else 0.0
+                    conn.send(("segment", pack_segment(s), progress))
+            finally:
+                # A cancelled job stops decoding here, before the instance is reused
+                close = getattr(segments, 'close', None)
+                if close:
+                    close()
+            conn.send(("done", time.monotonic() - start))
+        except (EOFError, OSError):
+            pass  # client gone: the job is cancelled
+        except Exception as e:
+            try:
+                conn.send(("error", str(e)))
+            except OSError:
+                pass
+        finally:
+            with self._cond:
+                self.active -= 1
+                self.last_job = time.monotonic()
+                if instance is not None:
+                    self._pools[key].jobs += 1
+            if instance is not None:
+                self._checkin(key, instance)
+
+    # --- Status ---
+
+    def status(self):
+        with self._cond:
+            return {
+                'pid': os.getpid(),
+                'uptime': round(time.time() - self.started, 1),
+                'active': self.active,
+                'jobs': self.jobs,
+                'max_instances': self.max_instances,
+                'idle_timeout': self.idle_timeout,
+                'models': {f"{model}/{compute}": {'device': pool.device, 'instances': pool.count,
+                                                  'idle': len(pool.idle), 'jobs': pool.jobs,
+                                                  'load_seconds': round(pool.load_seconds, 1)}
+                           for (model, compute), pool in self._pools.items()},
+            }
+
+class TranscribeClient:
+    """Connection factory for a running server."""
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+
+    def connect(self):
+        return Client(self.address, authkey=self.authkey)
+
+    def request(self, msg):
+        conn = self.connect()
+        try:
+            conn.send(msg)
+            return conn.recv()
+        finally:
+            conn.close()
+
+    def export(self, env=None):
+        """Advertises this server to child processes."""
+        env = os.environ if env is None else env
+        env[SERVER_ENV] = self.address
+        env[SERVER_KEY_ENV] = self.authkey.hex()
+
+    def alive(self) -> bool:
+        try:
+            self.request(("status",))
+            return True
+        except Exception:
+            return False
+
+    def status(self):
+        return self.request(("status",))
+
+    def shutdown(self):
+        try:
+            self.request(("shutdown",))
+        except Exception:
+            pass
+
+    def load(self, model: str, compute_type: str = "auto", log=print) -> float:
+        """Loads `model` on the server ahead of its first job; returns the seconds it took."""
+        conn = self.connect()
+        try:
+            conn.send(("load", model, compute_type))
+            while True:
+                msg = conn.recv()
+                if msg[0] == "log":
+                    log(msg[1])
+                elif msg[0] == "error":
+                    raise RuntimeError(msg[1])
+                else:
+                    return msg[1]
+        finally:
+            conn.close()
+
+    def transcribe(self, file_path: str, model: str, compute_type: str = "auto", options=None, log=print):
+        """
+        (segments, info, device) like WhisperModel.transcribe plus the device:
+        returns once the server has loaded the model and detected the language,
+        then `segments` yields Segment tuples as the server decodes them.
+        """
+        conn = self.connect()
+        try:
+            conn.send(("transcribe", os.path.abspath(file_path), model, compute_type, options or {}))
+            while True:
+                msg = conn.recv()
+                if msg[0] == "log":
+                    log(msg[1])
+                elif msg[0] == "error":
+                    raise RuntimeError(msg[1])
+                elif msg[0] == "info":
+                    break
+        except BaseException:
+            conn.close()
+            raise
+        _, language, probability, duration, device = msg
+        return self._segments(conn, log), TranscriptionInfo(language, probability, duration), device
+
+    @staticmethod
+    def _segments(conn, log):
+        try:
+            while True:
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    raise RuntimeError("transcription server stopped during the job")
+                if msg[0] == "segment":
+                    yield unpack_segment(msg[1])
+                elif msg[0] == "log":
+                    log(msg[1])
+                elif msg[0] == "error":
+                    raise RuntimeError(msg[1])
+                elif msg[0] == "done":
+                    return
+        finally:
+            conn.close()
+
+def server_from_env():
+    """TranscribeClient for the server advertised by a parent process, or None."""
+    address = os.environ.get(SERVER_ENV)
+    key = os.environ.get(SERVER_KEY_ENV)
+    if not address or not key:
+        return None
+    try:
+        return TranscribeClient(address, bytes.fromhex(key))
+    except ValueError:
+        return None
+
+def _server_from_state_file(path=STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        return TranscribeClient(state['address'], bytes.fromhex(state['key']))
+    except (OSError, ValueError, KeyError):
+        return None
+
+def find_server():
+    """A running server (advertised in the environment or the state file), or None."""
+    for client in (server_from_env(), _server_from_state_file()):
+        if client is not None and client.alive():
+            return client
+    return None
+
+def spawn_server(idle_timeout: float = IDLE_TIMEOUT):
+    """Starts a background server (one at a time across processes) and returns its client, or None."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    try:
+        # Another process may be starting one right now; stale locks expire
+        if time.time() - os.path.getmtime(SPAWN_LOCK) > SPAWN_TIMEOUT:
+            os.remove(SPAWN_LOCK)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(SPAWN_LOCK, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        owner = True
+    except FileExistsError:
+        owner = False
+
+    try:
+        if owner:
+            cmd = [sys.executable, SERVER_SCRIPT, "serve", "--idle", str(idle_timeout)]
+            with open(LOG_FILE, "a", encoding="utf-8") as log:
+                if sys.platform == "win32":
+                    flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+                    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, creationflags=flags)
+                else:
+                    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        deadline = time.monotonic() + SPAWN_TIMEOUT
+        while time.monotonic() < deadline:
+            client = _server_from_state_file()
+            if client is not None and client.alive():
+                return client
+            time.sleep(0.2)
+        return None
+    finally:
+        if owner:
+            try:
+                os.remove(SPAWN_LOCK)
+            except OSError:
+                pass
+
+def connect_server(spawn: bool = True):
+    """The running server, else a newly started one if `spawn`; None when disabled or unavailable."""
+    if not SERVER_ENABLED or getattr(sys, 'frozen', False):
+        return None
+    client = find_server()
+    if client is None and spawn:
+        print("🚀 Starting resident transcription server...", flush=True)
+        client = spawn_server()
+        if client is None:
+            print(f"⚠️ Transcription server did not start (see {LOG_FILE}).")
+    return client
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Resident Whisper transcription server")
+    parser.add_argument('cmd', choices=['serve', 'status', 'stop'])
+    parser.add_argument('--idle', type=float, default=IDLE_TIMEOUT, help="Exit after N seconds without jobs (0 = never)")
+    parser.add_argument('--instances', type=int, default=MAX_INSTANCES, help="Loaded instances per model/compute type")
+    parser.add_argument('--preload', default=None, help="Model to load at startup")
+    parser.add_argument('--json', action='store_true', help="Print the raw status")
+    args = parser.parse_args()
+
+    if args.cmd == 'serve':
+        if find_server() is not None:
+            print("✅ A transcription server is already running.")
+            return
+        server = TranscribeServer(max_instances=args.instances, idle_timeout=args.idle).start()
+        server.export()
+        print(f"🎙️ Transcription server (pid {os.getpid()}) listening, {args.instances} instance(s) per model", flush=True)
+        if args.preload:
+            client = TranscribeClient(server.address, server.authkey)
+            threading.Thread(target=client.load, args=(args.preload,), daemon=True).start()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.close()
+        return
+
+    client = find_server()
+    if client is None:
+        print("❌ No transcription server running.")
+        sys.exit(1)
+    if args.cmd == 'stop':
+        client.shutdown()
+        print("🛑 Transcription server stopped.")
+        return
+    status = client.status()
+    if args.json:
+        print(json.dumps(status, indent=2, ensure_ascii=False))
+        return
+    print(f"🎙️ Transcription server (pid {status['pid']}, up {status['uptime']:.0f}s): "
+          f"{status['active']} job(s) running, {status['jobs']} total")
+    for name, m in status['models'].items():
+        print(f"   {name:<32} {m['device'] or 'loading':>6}  {m['instances']} loaded, {m['idle']} idle  "
+              f"{m['jobs']} job(s)  load {m['load_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Word-level timestamp artifact written during transcription.
+
+chunk_segments builds cues from Whisper's word timestamps, which used to be
+lost once the .srt was written. Changing CHUNK_PROFILES or the speech
+style therefore meant transcribing again. `run` now saves them next to the
+SRT as `<name>.words.bin`. `transcribe_engine.py rechunk` rebuilds the SRT
+from that file without touching the audio.
+
+Layout (little-endian):
+    header    magic, word count, segment count, metadata length
+    metadata  JSON: language, duration, detected style, model
+    words     start float64[n], end float64[n], probability float32[n],
+              text offsets uint32[n + 1] into the text store
+    segments  start float64[m], end float64[m], end word index uint32[m]
+    text      UTF-8 words, concatenated
+Times are stored as the float64 values Whisper produced, so a rechunk makes
+exactly the cues a fresh run would.
+"""
+import os
+import sys
+import json
+import struct
+from array import array
+
+from transcribe_server import Segment, Word
+
+WORDS_SUFFIX = ".words.bin"
+
+_MAGIC = b"ASWT1\0"
+_HEADER = struct.Struct("<6sIII")
+
+def _to_le(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def _read(typecode, buf, offset, count):
+    arr = array(typecode)
+    end = offset + arr.itemsize * count
+    arr.frombytes(buf[offset:end])
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr, end
+
+def words_path(srt_path):
+    return os.path.splitext(srt_path)[0] + WORDS_SUFFIX
+
+class WordTimeline:
+    """Words and segment boundaries of one transcription, as flat arrays."""
+    def __init__(self):
+        self.word_start = array('d')
+        self.word_end = array('d')
+        self.word_prob = array('f')
+        self.text_offsets = array('I', [0])
+        self.text = bytearray()
+        self.seg_start = array('d')
+        self.seg_end = array('d')
+        self.seg_word_end = array('I')
+        self.meta = {}
+
+    def __len__(self):
+        return len(self.word_start)
+
+    def append_segment(self, segment):
+        """Records `segment` and returns it, so the timeline can sit in a segment stream."""
+        for w in (getattr(segment, 'words', None) or ()):
+            self.word_start.append(w.start)
+            self.word_end.append(w.end)
+            self.word_prob.append(w.probability)
+            self.text += w.word.encode('utf-8')
+            self.text_offsets.append(len(self.text))
+        self.seg_start.append(segment.start)
+        self.seg_end.append(segment.end)
+        self.seg_word_end.append(len(self.word_start))
+        return segment
+
+    def segments(self):
+        """Yields Segment/Word tuples with the attributes chunk_segments and detect_content_type read."""
+        text = bytes(self.text)
+        offsets, starts, ends, probs = self.text_offsets, self.word_start, self.word_end, self.word_prob
+        first = 0
+        for seg_start, seg_end, last in zip(self.seg_start, self.seg_end, self.seg_word_end):
+            words = [Word(starts[i], ends[i], text[offsets[i]:offsets[i + 1]].decode('utf-8'), probs[i])
+                     for i in range(first, last)]
+            yield Segment(seg_start, seg_end, "".join(w.word for w in words), words)
+            first = last
+
+    def save(self, path):
+        meta = json.dumps(self.meta, ensure_ascii=False).encode('utf-8')
+        tmp = path + ".part"
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(self.word_start), len(self.seg_start), len(meta)))
+            f.write(meta)
+            for arr in (self.word_start, self.word_end, self.word_prob, self.text_offsets,
+                        self.seg_start, self.seg_end, self.seg_word_end):
+                f.write(_to_le(arr))
+            f.write(self.text)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            buf = f.read()
+        magic, n, m, meta_len = _HEADER.unpack_from(buf)
+        if magic != _MAGIC:
+            raise ValueError(f"{os.path.basename(path)} is not a word timeline")
+        timeline = cls()
+        offset = _HEADER.size
+        timeline.meta = json.loads(buf[offset:offset + meta_len].decode('utf-8'))
+        offset += meta_len
+        timeline.word_start, offset = _read('d', buf, offset, n)
+        timeline.word_end, offset = _read('d', buf, offset, n)
+        timeline.word_prob, offset = _read('f', buf, offset, n)
+        timeline.text_offsets, offset = _read('I', buf, offset, n + 1)
+        timeline.seg_start, offset = _read('d', buf, offset, m)
+        timeline.seg_end, offset = _read('d', buf, offset, m)
+        timeline.seg_word_end, offset = _read('I', buf, offset, m)
+        timeline.text = bytearray(buf[offset:offset + timeline.text_offsets[-1]])
+        return timeline